@@ -0,0 +1,184 @@
+# analysis.py
+# CPU-heavy analyses, kept free of Flask so they can run inside the job process pool.
+
+import os
+import traceback
+import uuid
+from contextlib import ExitStack, contextmanager
+
+import numpy as np
+import pyproj
+import rasterio
+
+from dem_arrays import read_dem
+from instrumentation import span
+from inundation import simulate as simulate_inundation
+from jobs import AnalysisError
+from subsystems import REGISTRY
+from terrain import compute_derivatives
+
+# pysheds/numba take seconds to import; only the flow-routing analyses load them.
+hydrology = REGISTRY.lazy('hydrology')
+
+
+def _no_progress(fraction, message=None):
+    pass
+
+
+def _point_cells(points, transform, crs):
+    transformer = pyproj.Transformer.from_crs("EPSG:4326", crs, always_xy=True)
+    xs, ys = transformer.transform([p['lon'] for p in points], [p['lat'] for p in points])
+    return [tuple(int(v) for v in rasterio.transform.rowcol(transform, x, y)) for x, y in zip(xs, ys)]
+
+
+def _write_like(path, data, transform, crs, nodata):
+    with rasterio.open(path, 'w', driver='GTiff', width=data.shape[1], height=data.shape[0], count=1, dtype='float32',
+                       crs=crs, transform=transform, nodata=nodata, tiled=True, compress='deflate') as dst:
+        dst.write(data.astype('float32'), 1)
+
+
+def _snapped_cells(points, accumulation, transform, crs):
+    cells = []
+    for p, (row, col) in zip(points, _point_cells(points, transform, crs)):
+        snapped = hydrology.snap_to_channel(accumulation, row, col)
+        if snapped is None: print(f"Warning: Could not snap point {p}: outside the DEM"); continue
+        cells.append(snapped)
+    return cells
+
+
+@contextmanager
+def _dem(dem_path, dem_arrays):
+    # Shared, already-decoded elevations (NaN for nodata) when the caller passes the cross-process cache,
+    # borrowed so the array cannot be evicted while the analysis still reads it.
+    with ExitStack() as stack:
+        with span('read_dem'): dem = read_dem(dem_path) if dem_arrays is None else stack.enter_context(dem_arrays.borrow(dem_path))
+        yield dem
+
+
+def channelized_flood(dem_path, inflow_points, cache_dir, hydro_dir, dem_arrays=None, cache_filename=None, progress=_no_progress):
+    try:
+        products = hydrology.HydrologyCache(hydro_dir).get(dem_path, progress=lambda f, m=None: progress(f * 0.7, m))
+        progress(0.7, "Snapping inflow points")
+        with span('read_products'): flowdir = products.read('flowdir')[0]; accumulation = products.read('accumulation')[0]
+        with _dem(dem_path, dem_arrays) as dem:
+            dem_data, original_nodata, dem_transform, dem_crs = dem.data, dem.source_nodata, dem.transform, dem.crs
+
+            inflow_cells = _snapped_cells(inflow_points, accumulation, dem_transform, dem_crs)
+            if not inflow_cells:
+                raise AnalysisError("No valid inflow points after snapping.", 400)
+
+            progress(0.8, "Routing inflows")
+            rows, cols = zip(*inflow_cells)
+            with span('route'): path_rows, path_cols, _ = hydrology.trace_downstream(flowdir, rows, cols)
+
+            total_inflow_rate = sum(p.get('rate', 0) for p in inflow_points if p.get('rate', 0) > 0)
+            flood_depth = np.zeros(dem_data.shape, dtype='float32')
+            flood_depth[path_rows, path_cols] = np.log1p(np.maximum(accumulation[path_rows, path_cols], 0)) * (0.05 * (total_inflow_rate / 50) if total_inflow_rate > 0 else 0.05)
+
+            wse_raster = np.where(flood_depth > 0.01, dem_data + flood_depth, original_nodata)
+            wse_raster[np.isnan(wse_raster)] = original_nodata
+
+        progress(0.9, "Writing result")
+        cache_filename = cache_filename or f"channel_flood_{uuid.uuid4().hex[:8]}.tif"
+        with span('write_result'): _write_like(os.path.join(cache_dir, cache_filename), wse_raster, dem_transform, dem_crs, original_nodata)
+
+        return {"status": "success", "cache_filename": cache_filename}
+    except AnalysisError:
+        raise
+    except Exception as e:
+        traceback.print_exc()
+        raise AnalysisError(f"An error during channelized flood simulation: {str(e)}", 500)
+
+
+def flow_accumulation(dem_path, cache_dir, hydro_dir, progress=_no_progress):
+    try:
+        products = hydrology.HydrologyCache(hydro_dir).get(dem_path, progress=progress)
+        stats = products.meta['accumulation_stats']
+        return {"status": "success", "cache_filename": products.relative_path('accumulation', cache_dir), "stats": {"min": stats['min'], "max": max(stats['max'], stats['min'] + 1)}}
+    except Exception as e:
+        traceback.print_exc()
+        raise AnalysisError(f"An error during flow accumulation: {str(e)}", 500)
+
+
+def trace_flow_path(dem_path, inflow_points, outflow_points, cache_dir, hydro_dir, cache_filename=None, progress=_no_progress):
+    try:
+        products = hydrology.HydrologyCache(hydro_dir).get(dem_path, progress=lambda f, m=None: progress(f * 0.8, m))
+        progress(0.8, "Tracing flow paths")
+        with span('read_products'): flowdir, transform, crs, _ = products.read('flowdir'); accumulation = products.read('accumulation')[0]
+        inflow_cells = _snapped_cells(inflow_points, accumulation, transform, crs)
+        if not inflow_cells: raise AnalysisError("No valid inflow points inside the DEM.", 400)
+        stop_mask = None
+        outflow_cells = _snapped_cells(outflow_points, accumulation, transform, crs)
+        if outflow_cells:
+            stop_mask = np.zeros(flowdir.shape, dtype=bool); stop_mask[tuple(zip(*outflow_cells))] = True
+        rows, cols = zip(*inflow_cells)
+        with span('route'): path_rows, path_cols, _ = hydrology.trace_downstream(flowdir, rows, cols, stop_mask=stop_mask)
+        trace = np.full(flowdir.shape, -9999, dtype='float32')
+        # Colour the path by how much flow it carries, so tributaries and the main stem read differently.
+        trace[path_rows, path_cols] = np.log1p(np.maximum(accumulation[path_rows, path_cols], 0))
+        cache_filename = cache_filename or f"flow_trace_{uuid.uuid4().hex[:8]}.tif"
+        with span('write_result'): _write_like(os.path.join(cache_dir, cache_filename), trace, transform, crs, -9999)
+        values = trace[path_rows, path_cols]
+        stats = {"min": float(values.min()), "max": float(values.max()) if values.max() > values.min() else float(values.min()) + 1.0}
+        return {"status": "success", "cache_filename": cache_filename, "stats": stats, "path_cells": int(values.size)}
+    except AnalysisError:
+        raise
+    except Exception as e:
+        traceback.print_exc()
+        raise AnalysisError(f"An error during flow tracing: {str(e)}", 500)
+
+
+def projection_data(dem_path, points, rainfall_mm_hr, cache_dir, duration_min=60, frames=12, dem_arrays=None, cache_filename=None, progress=_no_progress):
+    try:
+        progress(0.05, "Reading DEM")
+        with _dem(dem_path, dem_arrays) as dem:
+            dem_data, original_nodata, dem_transform, dem_crs = dem.data, dem.source_nodata, dem.transform, dem.crs
+            sources = [p for p in points if p.get('rate', 0) != 0]
+            inflows = [(row, col, float(p['rate'])) for p, (row, col) in zip(sources, _point_cells(sources, dem_transform, dem_crs))] if sources else []
+
+            progress(0.1, "Simulating inundation")
+            cache_filename = cache_filename or f"flood_depth_{uuid.uuid4().hex[:8]}.tif"
+            with span('simulate'):
+                max_depth = simulate_inundation(dem_data, dem_transform, dem_crs, os.path.join(cache_dir, cache_filename), rainfall_mm_hr=rainfall_mm_hr, inflows=inflows,
+                                                duration_s=duration_min * 60.0, frames=frames, nodata=original_nodata if original_nodata is not None else -9999.0,
+                                                progress=lambda f: progress(0.1 + 0.9 * f, "Simulating inundation"))
+
+        if not max_depth > 0:
+            os.remove(os.path.join(cache_dir, cache_filename))
+            raise AnalysisError("Simulation resulted in no flooding.", 422)
+
+        return {
+            "status": "success",
+            "cache_filename": cache_filename,
+            "end_raster_id": cache_filename,
+            "frames": frames,
+            "frame_minutes": [round(duration_min * (k + 1) / frames, 2) for k in range(frames)],
+            "stats": {"min": 0, "max": max_depth}
+        }
+    except AnalysisError:
+        raise
+    except Exception as e:
+        traceback.print_exc()
+        raise AnalysisError(f"An error occurred: {str(e)}", 500)
+
+
+def slope(dem_path, dem_filename, cache_dir, cache_filename=None, progress=_no_progress):
+    cache_filename = cache_filename or f"slope_{os.path.splitext(dem_filename)[0]}.tif"; out_path = os.path.join(cache_dir, cache_filename)
+    with span('derivatives'): stats = compute_derivatives(dem_path, {out_path: 'slope_degrees'}, progress=lambda f: progress(f, "Computing slope"))[out_path] or {"min": 0, "max": 45}
+    if stats['min'] >= stats['max']: stats['max'] = stats['min'] + 1.0
+    return {"status": "success", "cache_filename": cache_filename, "stats": stats}
+
+
+def aspect(dem_path, dem_filename, cache_dir, cache_filename=None, progress=_no_progress):
+    cache_filename = cache_filename or f"aspect_{os.path.splitext(dem_filename)[0]}.tif"
+    with span('derivatives'): compute_derivatives(dem_path, {os.path.join(cache_dir, cache_filename): 'aspect'}, progress=lambda f: progress(f, "Computing aspect"))
+    return {"status": "success", "cache_filename": cache_filename, "stats": {"min": 0, "max": 360}}
+
+
+def landslide_hazard(dem_path, dem_filename, rainfall_mm, cache_dir, cache_filename=None, progress=_no_progress):
+    cache_filename = cache_filename or f"hazard_{os.path.splitext(dem_filename)[0]}_{int(rainfall_mm)}mm.tif"; out_path = os.path.join(cache_dir, cache_filename)
+    rain_term = 0.5 * np.clip(rainfall_mm / 150.0, 0, 1)
+    hazard = lambda surface: (0.5 * np.clip(surface.slope_degrees / 90, 0, 1)) + rain_term
+    with span('derivatives'): stats = compute_derivatives(dem_path, {out_path: hazard}, progress=lambda f: progress(f, "Computing hazard"))[out_path] or {"min": 0, "max": 1}
+    if stats['max'] <= stats['min']: stats['max'] = stats['min'] + 0.1
+    return {"status": "success", "cache_filename": cache_filename, "stats": stats}
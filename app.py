@@ -1,738 +1,986 @@
-# app.py
-
-import os
-import sys
-import tempfile
-import zipfile
-
-import matplotlib
-from matplotlib import pyplot as plt
-from shapely import Point
-# Use a non-interactive backend, crucial for server-side execution
-matplotlib.use('Agg')
-os.environ['MPLCONFIGDIR'] = "/tmp/matplotlib"
-# ==============================================================================
-# --- STEP 2: IMPORT ALL OTHER LIBRARIES ---
-# ==============================================================================
-
-from flask import Flask, abort, render_template, request, jsonify, Response, redirect, send_file, send_from_directory, url_for
-from flask_cors import CORS
-import glob
-import json
-import geopandas as gpd
-import pandas as pd
-import rasterio
-from rasterio.warp import reproject, Resampling, transform_bounds
-from rasterio.features import shapes
-import numpy as np
-from PIL import Image
-import io
-import mercantile
-import traceback
-import requests
-from skimage.morphology import skeletonize
-from dotenv import load_dotenv
-from shapely.ops import nearest_points, linemerge, unary_union
-from shapely.geometry import shape, box
-from mapbox_vector_tile import encode as mvt_encode
-from matplotlib import cm
-from matplotlib.colors import Normalize, LinearSegmentedColormap
-# import richdem as rd  # <-- REMOVED
-import pvlib
-import pytz
-import uuid
-from werkzeug.utils import secure_filename
-from pysheds.grid import Grid
-import pyproj
-
-# --- PDAL Check ---
-try:
-    import pdal
-    print("SUCCESS: PDAL library found.")
-except ImportError:
-    print("WARNING: PDAL library not found. Point cloud features will be disabled.")
-    pdal = None
-
-# ==============================================================================
-# --- STEP 3: FLASK APP SETUP AND CONFIGURATION ---
-# ==============================================================================
-load_dotenv()
-
-app = Flask(__name__)
-CORS(app)
-MAPTILER_API_KEY = os.environ.get("MAPTILER_API_KEY", "5EYOzE3UHralvJsxc3xw")
-NREL_API_KEY = os.environ.get("NREL_API_KEY", "jyAPNa8CEgKFHJOwMUhYYIEJZAdbfbHCIjuyXZo5")
-
-# --- PATHS CONFIGURATION ---
-BASE_DATA_PATH = os.path.join(os.getcwd(), "data", "Koushika")
-VECTOR_DATA_PATH = os.path.join(BASE_DATA_PATH, "shp")
-ELEVATION_DATA_PATH = os.path.join(BASE_DATA_PATH, "elevation")
-RASTER_DATA_PATH = os.path.join(BASE_DATA_PATH, "tif")
-POINTCLOUD_DATA_PATH = os.path.join(BASE_DATA_PATH, "point")
-CACHE_PATH = os.path.join(BASE_DATA_PATH, "cache")
-MODEL_DATA_PATH = os.path.join(BASE_DATA_PATH, "models")
-GENERIC_DATA_PATH = os.path.join(os.getcwd(), "data")
-
-for path in [VECTOR_DATA_PATH, ELEVATION_DATA_PATH, RASTER_DATA_PATH, POINTCLOUD_DATA_PATH, CACHE_PATH, MODEL_DATA_PATH, GENERIC_DATA_PATH]:
-    if not os.path.isdir(path):
-        os.makedirs(path)
-        print(f"WARNING: Created directory at: {path}")
-
-STATIC_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
-UPLOAD_FOLDER = os.path.join(STATIC_FOLDER, 'uploads')
-app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
-os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
-
-# --- HELPER FUNCTIONS ---
-def encode_terrain_rgb(data, nodata_val):
-    valid_mask = (data != nodata_val) & np.isfinite(data)
-    data[~valid_mask] = 0
-    val = (data + 10000.0) * 10.0
-    r = np.floor(val / 65536)
-    g = np.floor((val % 65536) / 256)
-    b = np.floor(val % 256)
-    return np.stack([r, g, b], axis=-1).astype(np.uint8)
-
-@app.route('/')
-def home():
-    return redirect(url_for('viewer'))
-
-@app.route('/viewer')
-def viewer():
-    return render_template('index.html')
-
-@app.route('/flood_simulation')
-def flood_simulation_launcher():
-    return render_template('flood-viewer.html')
-
-@app.route('/flood_simulation/<path:dem_id>')
-def flood_simulation(dem_id):
-    dem_path = os.path.join(ELEVATION_DATA_PATH, dem_id)
-    if not os.path.exists(dem_path):
-        abort(404, description=f"DEM file '{dem_id}' not found.")
-    return render_template('flood-viewer.html', dem_id=dem_id)
-
-@app.route('/point_viewer')
-def point_viewer_page():
-    return render_template('point.html')
-
-
-# =========================================================================
-# === FLOOD SIMULATION API ROUTES (Most will be disabled due to richdem removal) ===
-# =========================================================================
-
-@app.route('/api/run_gis_flood_simulation', methods=['POST'])
-def run_gis_flood_simulation():
-    # This function relies heavily on richdem and is now disabled.
-    return jsonify({"error": "This GIS simulation feature is currently disabled due to library incompatibility."}), 501
-
-    
-@app.route('/api/calculate_flow_accumulation', methods=['POST'])
-def calculate_flow_accumulation():
-    # This function relies heavily on richdem and is now disabled.
-    return jsonify({"error": "This flow accumulation feature is currently disabled due to library incompatibility."}), 501
-
-@app.route('/api/trace_flow_path', methods=['POST'])
-def trace_flow_path():
-    # This function relies heavily on richdem and is now disabled.
-    return jsonify({"error": "This flow trace feature is currently disabled due to library incompatibility."}), 501
-
-@app.route('/api/channelized_flood_simulation', methods=['POST'])
-def channelized_flood_simulation():
-    # This function relies on pysheds and should still work, but may have some richdem dependencies.
-    # We will keep it but add a try-except block for safety.
-    try:
-        data = request.get_json()
-        dem_id = data.get('dem_id')
-        inflow_points = data.get('inflow_points', [])
-
-        if not dem_id or not inflow_points:
-            return jsonify({"error": "DEM ID and inflow points are required."}), 400
-
-        dem_path = os.path.join(ELEVATION_DATA_PATH, dem_id)
-        if not os.path.exists(dem_path):
-            return jsonify({"error": "DEM file not found."}), 404
-
-        grid = Grid()
-        dem = grid.read_raster(dem_path)
-        original_nodata = dem.nodata
-        
-        dem_data = dem.astype('float32')
-        dem_data[dem_data == original_nodata] = np.nan
-        
-        filled_dem_data = grid.fill_depressions(dem_data)
-        flow_direction = grid.flowdir(filled_dem_data) # Using pysheds flow direction
-        
-        flow_direction_mask = flow_direction > 0
-        inflow_coords = []
-        for p in inflow_points:
-            try:
-                snapped_coord = grid.snap_to_mask(flow_direction_mask, (p['lon'], p['lat']))
-                inflow_coords.append(snapped_coord)
-            except Exception as e:
-                print(f"Warning: Could not snap point {p}: {e}")
-                continue
-        
-        if not inflow_coords:
-            return jsonify({"error": "No valid inflow points after snapping."}), 400
-            
-        x_coords, y_coords = zip(*inflow_coords)
-        acc = grid.accumulation(flow_direction, x=x_coords, y=y_coords)
-
-        total_inflow_rate = sum(p.get('rate', 0) for p in inflow_points if p.get('rate', 0) > 0)
-        flood_depth = np.log1p(acc) * (0.05 * (total_inflow_rate / 50) if total_inflow_rate > 0 else 0.05)
-        
-        wse_raster = np.where(flood_depth > 0.01, dem_data + flood_depth, original_nodata)
-        wse_raster[np.isnan(wse_raster)] = original_nodata
-        wse_raster = wse_raster.astype('float32')
-
-        cache_filename = f"channel_flood_{uuid.uuid4().hex[:8]}.tif"
-        grid.to_raster(wse_raster, os.path.join(CACHE_PATH, cache_filename))
-
-        return jsonify({"status": "success", "cache_filename": cache_filename})
-
-    except Exception as e:
-        traceback.print_exc()
-        return jsonify({"error": f"An error during channelized flood simulation: {str(e)}"}), 500
-
-@app.route('/api/export_channel_flood', methods=['POST'])
-def export_channel_flood():
-    # This should be fine as it relies on rasterio and shapely.
-    data = request.get_json(); cache_filename = data.get('cache_filename')
-    if not cache_filename: return jsonify({"error": "Cache filename is required."}), 400
-    raster_path = os.path.join(CACHE_PATH, cache_filename)
-    if not os.path.exists(raster_path): return jsonify({"error": "Cached raster file not found."}), 404
-    try:
-        with rasterio.open(raster_path) as src: wse_raster = src.read(1); profile = src.profile; nodata_val = src.nodata
-        flood_mask = (wse_raster != nodata_val) & np.isfinite(wse_raster)
-        if not np.any(flood_mask): return jsonify({"error": "The raster contains no flood data to export."}), 422
-        skeleton = skeletonize(flood_mask)
-        features = [{'type': 'Feature', 'geometry': shape(g).boundary.__geo_interface__, 'properties': {}} for g, v in shapes(skeleton.astype(np.uint8), mask=skeleton, transform=profile['transform']) if v == 1]
-        if not features: return jsonify({"error": "Could not vectorize the flood path."}), 500
-        final_gdf = gpd.GeoDataFrame([1], geometry=[linemerge(unary_union(gpd.GeoDataFrame.from_features(features, crs=profile['crs']).geometry))], crs=profile['crs'])
-        with tempfile.TemporaryDirectory() as tmpdir:
-            shp_path = os.path.join(tmpdir, 'flood_centerline.shp'); final_gdf.to_file(shp_path, driver='ESRI Shapefile')
-            memory_file = io.BytesIO()
-            with zipfile.ZipFile(memory_file, 'w', zipfile.ZIP_DEFLATED) as zf:
-                for f in glob.glob(os.path.join(tmpdir, 'flood_centerline.*')): zf.write(f, os.path.basename(f))
-            memory_file.seek(0)
-            return send_file(memory_file, mimetype='application/zip', as_attachment=True, download_name='channel_flood_centerline.zip')
-    except Exception as e:
-        traceback.print_exc(); return jsonify({"error": f"An error during shapefile export: {str(e)}"}), 500
-
-
-@app.route('/api/projection_data', methods=['POST'])
-def get_projection_data():
-    data = request.get_json(); dem_id = data.get('dem_id'); points = data.get('points', []); rainfall_mm_hr = float(data.get('rainfall_mm_hr', 0.0))
-    if not dem_id: return jsonify({"error": "dem_id is required."}), 400
-    dem_path = os.path.join(ELEVATION_DATA_PATH, dem_id)
-    if not os.path.exists(dem_path): return jsonify({"error": "DEM file not found."}), 404
-    try:
-        with rasterio.open(dem_path) as src:
-            dem_transform = src.transform
-            dem_crs = src.crs
-            dem_data = src.read(1).astype('float32')
-            original_nodata = src.nodata
-
-        dem_data[dem_data == original_nodata] = np.nan
-        rd_dem = rd.rdarray(dem_data, no_data=np.nan)
-        rd_dem.geotransform = dem_transform.to_gdal()
-
-        filled_dem = rd.FillDepressions(rd_dem, in_place=False)
-        aspect = rd.TerrainAttribute(filled_dem, attrib='aspect')
-
-        aspect_map = {
-            (337.5, 360): (0, 1), (0, 22.5): (0, 1), (22.5, 67.5): (-1, 1),
-            (67.5, 112.5): (-1, 0), (112.5, 157.5): (-1, -1), (157.5, 202.5): (0, -1),
-            (202.5, 247.5): (1, -1), (247.5, 292.5): (1, 0), (292.5, 337.5): (1, 1),
-        }
-        def get_dir_from_aspect(angle):
-            if angle < 0: return (0, 0)
-            for r, d in aspect_map.items():
-                if r[0] <= angle < r[1]: return d
-            return (0, 0)
-
-        water_additions = np.zeros_like(filled_dem, dtype=np.float32)
-        water_additions[np.isfinite(filled_dem)] += (rainfall_mm_hr * (10 / 60.0)) / 1000.0
-        
-        transformer = pyproj.Transformer.from_crs("EPSG:4326", dem_crs, always_xy=True)
-
-        for p in points:
-            rate = p.get('rate', 0)
-            if rate <= 0: continue # Only process inflows
-            
-            dem_x, dem_y = transformer.transform(p['lon'], p['lat'])
-            row, col = rasterio.transform.rowcol(dem_transform, dem_x, dem_y)
-            curr_r, curr_c = int(row), int(col)
-            
-            path_len = 0
-            while path_len < 10000:
-                if not (0 <= curr_r < water_additions.shape[0] and 0 <= curr_c < water_additions.shape[1]): break
-                water_additions[curr_r, curr_c] += (rate * 0.0001) / (path_len + 1)
-                angle = aspect[curr_r, curr_c]
-                dr, dc = get_dir_from_aspect(angle)
-                if dr == 0 and dc == 0: break
-                curr_r += dr; curr_c += dc
-                path_len += 1
-                    
-        # === FIX: Use 0 for non-flooded areas instead of nodata ===
-        # This ensures the animation colormap has a base and renders correctly.
-        flood_depth_raster = np.where(water_additions > 0.01, water_additions, 0)
-        # Re-apply the proper nodata mask from the original DEM
-        flood_depth_raster[np.isnan(dem_data)] = original_nodata
-        
-        cache_filename = f"flood_depth_{uuid.uuid4().hex[:8]}.tif"
-        output_depth = rd.rdarray(flood_depth_raster.astype(np.float32), no_data=original_nodata)
-        output_depth.geotransform = dem_transform.to_gdal()
-        rd.SaveGDAL(os.path.join(CACHE_PATH, cache_filename), output_depth)
-        
-        valid_pixels = flood_depth_raster[flood_depth_raster > 0]
-        stats = {
-            "min": 0,
-            "max": float(np.max(valid_pixels)) if valid_pixels.size > 0 else 0.1,
-        }
-            
-        if not valid_pixels.size > 0: return jsonify({"error": "Simulation resulted in no flooding."}), 422
-        
-        return jsonify({ 
-            "status": "success", 
-            "cache_filename": cache_filename,
-            "end_raster_id": cache_filename,
-            "stats": stats 
-        })
-    except Exception as e:
-        traceback.print_exc(); return jsonify({"error": f"An error occurred: {str(e)}"}), 500
-
-
-def get_river_geometry(target_crs):
-    search_terms = ['stream', 'river']; river_path = None
-    for term in search_terms:
-        found = glob.glob(os.path.join(VECTOR_DATA_PATH, f'**/*{term}*.shp'), recursive=True)
-        if found: river_path = found[0]; break
-    if not river_path: return None
-    try:
-        gdf = gpd.read_file(river_path)
-        gdf = gdf[gdf.is_valid & ~gdf.is_empty]
-        return unary_union(gdf.to_crs(target_crs).geometry) if not gdf.empty else None
-    except Exception as e:
-        print(f"Error processing river file {river_path}: {e}"); return None
-
-@app.route('/api/precalculated_flood_zones')
-def get_precalculated_flood_zones():
-    geojson_path = os.path.join(GENERIC_DATA_PATH, 'flood_data.geojson')
-    if not os.path.exists(geojson_path):
-        with open(geojson_path, 'w') as f: json.dump({"type": "FeatureCollection", "features": []}, f)
-    with open(geojson_path, 'r') as f: return jsonify(json.load(f))
-
-@app.route('/api/get_live_rainfall')
-def get_live_rainfall():
-    lat = request.args.get('lat', type=float); lon = request.args.get('lon', type=float)
-    if lat is None or lon is None: return jsonify({"error": "Latitude and Longitude are required."}), 400
-    try:
-        response = requests.get("https://api.open-meteo.com/v1/forecast", params={"latitude": lat, "longitude": lon, "current": "precipitation"}, timeout=10)
-        response.raise_for_status()
-        return jsonify({"success": True, "current_precipitation_mmhr": float(response.json().get('current', {}).get('precipitation', 0.0))})
-    except requests.exceptions.RequestException as e:
-        return jsonify({"error": f"Could not fetch weather data: {e}"}), 502
-
-@app.route('/solar_dashboard')
-def solar_dashboard_page(): return render_template('solar-dashboard.html')
-
-@app.route('/api/solar_irradiance', methods=['GET'])
-def get_solar_irradiance_data():
-    lat = float(request.args.get('lat', 10.3833)); lon = float(request.args.get('lon', 78.8333))
-    api_key = os.environ.get("OPENWEATHER_API_KEY")
-    if not api_key: return jsonify({"error": "OpenWeather API key not configured."}), 500
-    try:
-        one_call_url = f"https://api.openweathermap.org/data/3.0/onecall?lat={lat}&lon={lon}&exclude=minutely,daily,alerts&units=metric&appid={api_key}"
-        response = requests.get(one_call_url); response.raise_for_status(); weather_data = response.json()
-        hourly_data = weather_data['hourly']; tz = weather_data['timezone']
-        times = pd.to_datetime([h['dt'] for h in hourly_data], unit='s').tz_localize('UTC').tz_convert(tz)
-        df = pd.DataFrame({'temp_air': [h['temp'] for h in hourly_data], 'pressure': [h['pressure'] * 100 for h in hourly_data], 'dew_point': [h.get('dew_point', h['temp'] - 5) for h in hourly_data], 'clouds': [h['clouds'] for h in hourly_data],}, index=times)
-        solpos = pvlib.solarposition.get_solarposition(times, lat, lon)
-        clear_sky = pvlib.clearsky.simplified_solis(apparent_zenith=solpos['apparent_zenith'], aod700=0.1, precipitable_water=pvlib.atmosphere.gueymard94_pw(df['temp_air'], df['dew_point']), pressure=df['pressure'], dni_extra=pvlib.irradiance.get_extra_radiation(times))
-        clear_sky.rename(columns={'dni': 'dni_clear', 'ghi': 'ghi_clear', 'dhi': 'dhi_clear'}, inplace=True)
-        cloudy_sky = pvlib.cloudcover.dirint(ghi=clear_sky['ghi_clear'], solar_zenith=solpos['apparent_zenith'], temp_dew=df['dew_point'], pressure=df['pressure'])
-        cloudy_sky['dhi_cloudy'] = clear_sky['dhi_clear']
-        cloudy_sky['ghi_cloudy'] = cloudy_sky['dni'] * np.cos(np.radians(solpos['apparent_zenith'])) + cloudy_sky['dhi_cloudy']
-        cloudy_sky.rename(columns={'dni': 'dni_cloudy'}, inplace=True)
-        final_df = pd.concat([clear_sky, cloudy_sky], axis=1); final_df[final_df < 0] = 0
-        return jsonify(json.loads(final_df.to_json(orient='table', date_format='iso'))['data'])
-    except Exception as e:
-        traceback.print_exc(); return jsonify({"error": f"Solar calculation error: {str(e)}"}), 500
-
-@app.route('/upload-model', methods=['POST'])
-def upload_model():
-    if 'files' not in request.files: return jsonify({'success': False, 'message': 'No file part'}), 400
-    files = request.files.getlist('files')
-    if not files or files[0].filename == '': return jsonify({'success': False, 'message': 'No files selected'}), 400
-    model_id = str(uuid.uuid4()); model_upload_path = os.path.join(app.config['UPLOAD_FOLDER'], model_id)
-    os.makedirs(model_upload_path)
-    try:
-        for file in files:
-            if file: file.save(os.path.join(model_upload_path, secure_filename(file.filename)))
-        return jsonify({'success': True, 'modelId': model_id, 'message': 'Files uploaded.'})
-    except Exception as e:
-        traceback.print_exc(); return jsonify({'success': False, 'message': str(e)}), 500
-
-@app.route('/inspector/<model_id>')
-def inspector(model_id):
-    model_dir = os.path.join(app.config['UPLOAD_FOLDER'], model_id)
-    if not os.path.isdir(model_dir): abort(404, "Model not found")
-    obj_filename = next((f for f in os.listdir(model_dir) if f.lower().endswith('.obj')), None)
-    mtl_filename = next((f for f in os.listdir(model_dir) if f.lower().endswith('.mtl')), None)
-    if not obj_filename: return "No .obj file found.", 404
-    return render_template('obj.html', model_id=model_id, model_obj_path=f"/static/uploads/{model_id}/{obj_filename}", model_mtl_path=f"/static/uploads/{model_id}/{mtl_filename}" if mtl_filename else "")
-
-@app.route('/api/elevation_layers')
-def list_elevation_layers():
-    if not os.path.isdir(ELEVATION_DATA_PATH): return jsonify([])
-    layers = []
-    for fname in sorted(os.listdir(ELEVATION_DATA_PATH)):
-        if fname.lower().endswith(('.tif', '.tiff')):
-            try:
-                with rasterio.open(os.path.join(ELEVATION_DATA_PATH, fname)) as src:
-                    stats = src.statistics(1)
-                    layers.append({"id": fname, "name": os.path.splitext(fname)[0].replace('_', ' ').title(), "stats": {'min': stats.min, 'max': stats.max}})
-            except Exception as e: print(f"Error processing DEM {fname}: {e}")
-    return jsonify(layers)
-
-@app.route('/api/vector_layers')
-def list_vector_layers():
-    if not os.path.isdir(VECTOR_DATA_PATH): return jsonify([])
-    files = glob.glob(os.path.join(VECTOR_DATA_PATH, '**', '*.shp'), recursive=True) + glob.glob(os.path.join(VECTOR_DATA_PATH, '**', '*.zip'), recursive=True)
-    return jsonify(sorted([{"id": os.path.basename(f), "name": os.path.splitext(os.path.basename(f))[0].replace('_', ' ').replace('-', ' ').title()} for f in files], key=lambda x: x['name']))
-
-@app.route('/api/raster_layers')
-def list_raster_layers():
-    if not os.path.isdir(RASTER_DATA_PATH): return jsonify([])
-    layers = []
-    for fname in sorted(os.listdir(RASTER_DATA_PATH)):
-        if fname.lower().endswith(('.tif', '.tiff')):
-            try:
-                with rasterio.open(os.path.join(RASTER_DATA_PATH, fname)) as src:
-                    stats = []
-                    for i in range(1, src.count + 1):
-                        band = src.read(i, masked=True)
-                        min_val, max_val = (np.percentile(band[~band.mask], [2, 98])) if band.count() > 0 else (0, 0)
-                        stats.append({'min': float(min_val), 'max': float(max_val)})
-                    layers.append({"id": fname, "name": os.path.splitext(fname)[0].replace('_', ' ').title(), "bands": src.count, "stats": stats})
-            except Exception as e: print(f"Could not process raster {fname}: {e}")
-    return jsonify(layers)
-
-@app.route('/api/pointcloud_layers')
-def list_pointcloud_layers():
-    if not os.path.isdir(POINTCLOUD_DATA_PATH): return jsonify([])
-    all_files = []
-    for pattern in ['*.las', '*.laz']:
-        all_files.extend(glob.glob(os.path.join(POINTCLOUD_DATA_PATH, pattern)))
-    return jsonify([{"id": os.path.basename(f), "name": os.path.splitext(os.path.basename(f))[0]} for f in sorted(all_files)])
-
-def preprocess_point_cloud(filename):
-    pc_path = os.path.join(POINTCLOUD_DATA_PATH, filename)
-    base_name = os.path.splitext(filename)[0]
-    meta_path = os.path.join(CACHE_PATH, f"{base_name}.json")
-
-    if os.path.exists(meta_path):
-        with open(meta_path, 'r') as f:
-            return json.load(f)
-
-    print(f"Pre-processing {filename} for the first time...")
-    
-    try:
-        pipeline_json = [{"type": "readers.las", "filename": pc_path}]
-        pipeline = pdal.Pipeline(json.dumps(pipeline_json))
-        
-        count = pipeline.execute()
-        if count == 0:
-            raise RuntimeError("PDAL returned no points from the file. It may be empty or invalid.")
-            
-        points = pipeline.arrays[0]
-        
-        bbox_raw = {
-            "minx": float(np.min(points['X'])), "maxx": float(np.max(points['X'])),
-            "miny": float(np.min(points['Y'])), "maxy": float(np.max(points['Y'])),
-            "minz": float(np.min(points['Z'])), "maxz": float(np.max(points['Z'])),
-        }
-        
-        center_x = (bbox_raw['maxx'] + bbox_raw['minx']) / 2
-        center_y = (bbox_raw['maxy'] + bbox_raw['miny']) / 2
-        center_z = (bbox_raw['maxz'] + bbox_raw['minz']) / 2
-
-        positions = np.vstack((points['X'] - center_x, points['Y'] - center_y, points['Z'] - center_z)).astype(np.float32).T
-        positions.tofile(os.path.join(CACHE_PATH, f"{base_name}_positions.bin"))
-
-        color_attributes = []
-        classification_available = False
-
-        if 'Red' in points.dtype.names:
-            rgb = np.vstack((points['Red']/65535, points['Green']/65535, points['Blue']/65535)).astype(np.float32).T
-            rgb.tofile(os.path.join(CACHE_PATH, f"{base_name}_color_rgb.bin"))
-            color_attributes.append('rgb')
-
-        if 'Classification' in points.dtype.names:
-            classification_available = True
-            class_colors_map = { 1: (200, 200, 200), 2: (165, 80, 40), 3: (0, 255, 0), 4: (0, 150, 0), 5: (0, 100, 0), 6: (255, 0, 0), 9: (0, 0, 255) }
-            default_color = (200, 200, 200)
-            classification_color = (np.array([class_colors_map.get(c, default_color) for c in points['Classification']]) / 255.0).astype(np.float32)
-            classification_color.tofile(os.path.join(CACHE_PATH, f"{base_name}_color_classification.bin"))
-            color_attributes.append('classification')
-            
-            # --- NEW: Save the raw classification values for filtering ---
-            classification_raw = points['Classification'].astype(np.uint8)
-            classification_raw.tofile(os.path.join(CACHE_PATH, f"{base_name}_classification_raw.bin"))
-        
-        z_values = points['Z']
-        norm = Normalize(vmin=z_values.min(), vmax=z_values.max())
-        cmap = plt.get_cmap('viridis')
-        elevation = cmap(norm(z_values))[:, :3].astype(np.float32)
-        elevation.tofile(os.path.join(CACHE_PATH, f"{base_name}_color_elevation.bin"))
-        color_attributes.append('elevation')
-        
-        final_meta = {
-            "point_count": count,
-            "bbox": {
-                "min": [bbox_raw['minx'], bbox_raw['miny'], bbox_raw['minz']],
-                "max": [bbox_raw['maxx'], bbox_raw['maxy'], bbox_raw['maxz']],
-            },
-            "color_attributes": color_attributes,
-            "classification_available": classification_available,
-            "files": {
-                "positions": f"{base_name}_positions.bin",
-                "colors": {attr: f"{base_name}_color_{attr}.bin" for attr in color_attributes},
-                "classification_raw": f"{base_name}_classification_raw.bin" if classification_available else None
-            }
-        }
-        with open(meta_path, 'w') as f:
-            json.dump(final_meta, f)
-            
-        return final_meta
-
-    except Exception as e:
-        traceback.print_exc()
-        raise RuntimeError(f"Failed during pre-processing: {str(e)}")
-
-
-@app.route('/api/get_pointcloud_metadata/<path:filename>')
-def get_pointcloud_metadata(filename):
-    try:
-        metadata = preprocess_point_cloud(filename)
-        return jsonify(metadata)
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
-
-@app.route('/api/get_pointcloud_data/<path:filename>')
-def get_pointcloud_binary_data(filename):
-    if not os.path.exists(os.path.join(CACHE_PATH, filename)):
-        abort(404, "Pre-processed data file not found.")
-    return send_from_directory(CACHE_PATH, filename)
-
-@app.route('/api/layer_bounds/<layer_type>/<path:layer_filename>')
-def get_layer_bounds(layer_type, layer_filename):
-    try:
-        path = None; source_path_map = {'dem': ELEVATION_DATA_PATH, 'raster': RASTER_DATA_PATH, 'pointcloud': POINTCLOUD_DATA_PATH}
-        if layer_type in source_path_map: path = os.path.join(source_path_map[layer_type], layer_filename)
-        if layer_type == 'raster' and not os.path.exists(path): path = os.path.join(CACHE_PATH, layer_filename)
-        elif layer_type == 'vector':
-            files = glob.glob(os.path.join(VECTOR_DATA_PATH, '**', layer_filename), recursive=True)
-            if not files: return jsonify({"error": "Vector file not found"}), 404
-            gdf = gpd.read_file(f"zip://{files[0]}" if files[0].lower().endswith('.zip') else files[0])
-            return jsonify({"bounds": list(gdf.to_crs("EPSG:4326").total_bounds)})
-        elif layer_type == 'pointcloud' and pdal:
-            if not path or not os.path.exists(path):
-                return jsonify({"error": "Point cloud file not found on server"}), 404
-            try:
-                info = pdal.Pipeline(json.dumps([{"type":"readers.las","filename":path}])).quickinfo['readers.las']
-                b = info['bounds']
-                bounds = gpd.GeoDataFrame(geometry=[box(b['minx'],b['miny'],b['maxx'],b['maxy'])], crs=info['srs']['wkt']).to_crs("EPSG:4326").total_bounds
-                return jsonify({"bounds": list(bounds)})
-            except Exception as pdal_error:
-                error_message = f"PDAL failed to read '{layer_filename}'. The file may be corrupt or in an unsupported format. PDAL error: {str(pdal_error)}"
-                print(f"ERROR: {error_message}")
-                traceback.print_exc()
-                return jsonify({"error": error_message}), 500
-        if path and os.path.exists(path):
-            with rasterio.open(path) as src: return jsonify({"bounds": list(transform_bounds(src.crs, "EPSG:4326", *src.bounds))})
-        return jsonify({"error": "File not found or layer type is invalid"}), 404
-    except Exception as e:
-        traceback.print_exc(); return jsonify({"error": str(e)}), 500
-
-
-@app.route('/api/vector_layer/<string:layer_filename>')
-def serve_vector_layer(layer_filename):
-    try:
-        files = glob.glob(os.path.join(VECTOR_DATA_PATH, '**', layer_filename), recursive=True)
-        if not files: return jsonify({"error": f"Vector file not found: {layer_filename}"}), 404
-        gdf = gpd.read_file(f"zip://{files[0]}" if files[0].lower().endswith('.zip') else files[0])
-        for col in gdf.select_dtypes(include=['object']).columns: gdf[col] = gdf[col].fillna("")
-        if 'builtup' in layer_filename.lower():
-            h_field = next((f for f in ["height", "Height", "HEIGHT", "relh", "building_h", "LOD"] if f in gdf.columns), None)
-            if h_field: gdf[h_field] = pd.to_numeric(gdf[h_field], errors='coerce').fillna(10.0)
-        return jsonify(json.loads(gdf.to_crs(epsg=4326).to_json()))
-    except Exception as e:
-        traceback.print_exc(); return jsonify({"error": str(e)}), 500
-
-@app.route('/api/raster_tile/<path:layer_filename>/<int:z>/<int:x>/<int:y>.png')
-def serve_raster_overlay_tile(layer_filename, z, x, y):
-    path = os.path.join(CACHE_PATH, layer_filename)
-    if not os.path.exists(path): path = os.path.join(RASTER_DATA_PATH, layer_filename)
-    if not os.path.exists(path): return "File not found", 404
-    try:
-        with rasterio.open(path) as src:
-            merc_b = mercantile.xy_bounds(x, y, z); dst_tf = rasterio.transform.from_bounds(*merc_b, width=256, height=256); nodata = src.nodata if src.nodata is not None else -9999
-            if 'r' in request.args:
-                p_mins = [float(v) for v in request.args.get('p_mins', '0,0,0').split(',')]; p_maxs = [float(v) for v in request.args.get('p_maxs', '1,1,1').split(',')]
-                bands = [int(request.args.get('r')), int(request.args.get('g')), int(request.args.get('b'))]; rgb = np.zeros((3, 256, 256), dtype=np.uint8)
-                for i in range(3):
-                    band_data = np.full((256, 256), nodata, dtype=np.float32)
-                    reproject(source=rasterio.band(src, bands[i]), destination=band_data, src_transform=src.transform, src_crs=src.crs, src_nodata=nodata, dst_transform=dst_tf, dst_crs='EPSG:3857', dst_nodata=nodata, resampling=Resampling.bilinear)
-                    band_data = np.clip(((band_data - p_mins[i]) / (p_maxs[i] - p_mins[i] + 1e-9)) * 255, 0, 255).astype(np.uint8)
-                    rgb[i] = band_data
-                img = Image.fromarray(np.moveaxis(rgb, 0, -1), 'RGB')
-            else:
-                vmin = float(request.args.get('min', 0)); vmax = float(request.args.get('max', 1)); cmap_name = request.args.get('colormap', 'Spectral_r')
-                arr = np.full((256, 256), nodata, dtype=np.float32)
-                reproject(source=rasterio.band(src, 1), destination=arr, src_transform=src.transform, src_crs=src.crs, src_nodata=nodata, dst_transform=dst_tf, dst_crs='EPSG:3857', dst_nodata=nodata, resampling=Resampling.bilinear)
-                mask = (arr == nodata) | ~np.isfinite(arr); norm = Normalize(vmin=vmin, vmax=vmax, clip=True)
-                if cmap_name == 'flood_custom':
-                    bp_norm = min(1.0, max(0.0, (0.5 - vmin) / (vmax - vmin))) if vmax > vmin else 0.5
-                    cmap = LinearSegmentedColormap.from_list("custom_flood_cmap", [(0.0, "#a6cee3"), (bp_norm, "#a6cee3"), (1.0, "#1f78b4")])
-                elif cmap_name == 'slope': cmap = LinearSegmentedColormap.from_list("slope_cmap", ["#2ca25f", "#ffffbf", "#fee08b", "#fdae61", "#f46d43", "#d73027", "#a50026"])
-                elif cmap_name == 'ocean': cmap = cm.get_cmap('ocean')
-                else: cmap = cm.get_cmap(cmap_name)
-                rgba = (cmap(norm(arr)) * 255).astype(np.uint8); rgba[mask] = [0, 0, 0, 0]; img = Image.fromarray(rgba, 'RGBA')
-            buf = io.BytesIO(); img.save(buf, 'PNG'); buf.seek(0)
-            return Response(buf.getvalue(), mimetype='image/png')
-    except Exception as e:
-        traceback.print_exc(); img = Image.new('RGBA', (256, 256), (0,0,0,0)); buf = io.BytesIO(); img.save(buf, 'PNG'); buf.seek(0)
-        return Response(buf.getvalue(), mimetype='image/png')
-
-@app.route('/api/layer_bounds_polygon/<path:dem_id>')
-def get_layer_bounds_polygon(dem_id):
-    path = os.path.join(ELEVATION_DATA_PATH, dem_id)
-    if not os.path.exists(path): return jsonify({"error": "DEM not found"}), 404
-    try:
-        with rasterio.open(path) as src: b = src.bounds; geom = box(b.left, b.bottom, b.right, b.top)
-        return jsonify(json.loads(gpd.GeoDataFrame([1], geometry=[geom], crs=src.crs).to_crs(epsg=4326).to_json()))
-    except Exception as e:
-        traceback.print_exc(); return jsonify({"error": str(e)}), 500
-
-@app.route('/api/dem_tile/<path:filename>/<int:z>/<int:x>/<int:y>.png')
-def dem_tile_server(filename, z, x, y):
-    path = os.path.join(CACHE_PATH, filename)
-    if not os.path.exists(path): path = os.path.join(ELEVATION_DATA_PATH, filename)
-    if not os.path.exists(path): return "Not Found", 404
-    try:
-        with rasterio.open(path) as src:
-            merc_b = mercantile.xy_bounds(x,y,z); dst_tf = rasterio.transform.from_bounds(*merc_b, width=256, height=256); nodata = src.nodata if src.nodata is not None else -9999
-            tile = np.full((256, 256), nodata, dtype=np.float32)
-            reproject(source=rasterio.band(src, 1), destination=tile, src_transform=src.transform, src_crs=src.crs, src_nodata=nodata, dst_transform=dst_tf, dst_crs='EPSG:3857', dst_nodata=nodata, resampling=Resampling.bilinear)
-            img = Image.fromarray(encode_terrain_rgb(tile, nodata), 'RGB'); buf = io.BytesIO(); img.save(buf, 'PNG'); buf.seek(0)
-            return Response(buf.getvalue(), mimetype='image/png')
-    except Exception as e:
-        print(f"DEM tile error for {filename}: {e}"); img = Image.new('RGBA', (256,256), (0,0,0,0)); buf = io.BytesIO(); img.save(buf, 'PNG'); buf.seek(0)
-        return Response(buf.getvalue(), mimetype='image/png')
-
-@app.route('/api/generate_profile', methods=['POST'])
-def generate_profile():
-    data = request.get_json(); dem_filename = data.get('dem_filename'); line_coords = data.get('line')
-    if not dem_filename or not line_coords or len(line_coords) < 2: return jsonify({"error": "Invalid request."}), 400
-    dem_path = os.path.join(ELEVATION_DATA_PATH, dem_filename)
-    if not os.path.exists(dem_path): return jsonify({"error": "DEM file not found."}), 404
-    try:
-        with rasterio.open(dem_path) as src:
-            to_dem_crs = pyproj.Transformer.from_crs('EPSG:4326', src.crs, always_xy=True); to_wgs84 = pyproj.Transformer.from_crs(src.crs, 'EPSG:4326', always_xy=True)
-            profile_data = []
-            for i in range(len(line_coords) - 1):
-                start_x, start_y = to_dem_crs.transform(line_coords[i][0], line_coords[i][1]); end_x, end_y = to_dem_crs.transform(line_coords[i+1][0], line_coords[i+1][1])
-                x_s, y_s = np.linspace(start_x, end_x, 100), np.linspace(start_y, end_y, 100)
-                elevs = [val[0] for val in src.sample(list(zip(x_s, y_s)))]
-                wgs84_coords = [to_wgs84.transform(x, y) for x, y in list(zip(x_s, y_s))]
-                for j in range(100):
-                    if j == 99 and i < len(line_coords) - 2: continue
-                    elev = float(elevs[j]) if elevs[j] is not None and elevs[j] != src.nodata else None
-                    profile_data.append({'lon': wgs84_coords[j][0], 'lat': wgs84_coords[j][1], 'elev': elev})
-        return jsonify({"profile_data": profile_data})
-    except Exception as e:
-        traceback.print_exc(); return jsonify({"error": str(e)}), 500
-
-@app.route('/api/calculate_slope', methods=['POST'])
-def calculate_slope():
-    data = request.get_json()
-    if not data or 'dem_filename' not in data: return jsonify({"error": "DEM filename required."}), 400
-    dem_path = os.path.join(ELEVATION_DATA_PATH, data['dem_filename'])
-    if not os.path.exists(dem_path): return jsonify({"error": "DEM not found."}), 404
-    try:
-        dem = rd.LoadGDAL(dem_path); slope = rd.TerrainAttribute(dem, attrib='slope_degrees'); valid = slope[dem != dem.no_data]
-        min_val, max_val = (np.percentile(valid, [2, 98])) if valid.size > 0 else (0, 45)
-        if min_val >= max_val: max_val = min_val + 1.0
-        cache_filename = f"slope_{os.path.splitext(data['dem_filename'])[0]}.tif"
-        rd.SaveGDAL(os.path.join(CACHE_PATH, cache_filename), slope)
-        return jsonify({"status": "success", "cache_filename": cache_filename, "stats": {"min": float(min_val), "max": float(max_val)}})
-    except Exception as e:
-        traceback.print_exc(); return jsonify({"error": str(e)}), 500
-
-@app.route('/api/calculate_aspect', methods=['POST'])
-def calculate_aspect():
-    data = request.get_json()
-    if not data or 'dem_filename' not in data: return jsonify({"error": "DEM filename required."}), 400
-    dem_path = os.path.join(ELEVATION_DATA_PATH, data['dem_filename'])
-    if not os.path.exists(dem_path): return jsonify({"error": "DEM not found."}), 404
-    try:
-        dem = rd.LoadGDAL(dem_path); aspect = rd.TerrainAttribute(dem, attrib='aspect')
-        cache_filename = f"aspect_{os.path.splitext(data['dem_filename'])[0]}.tif"
-        rd.SaveGDAL(os.path.join(CACHE_PATH, cache_filename), aspect)
-        return jsonify({"status": "success", "cache_filename": cache_filename, "stats": {"min": 0, "max": 360}})
-    except Exception as e:
-        traceback.print_exc(); return jsonify({"error": str(e)}), 500
-
-@app.route('/api/landslide_hazard', methods=['POST'])
-def landslide_hazard_analysis():
-    data = request.get_json(); dem_filename = data.get('dem_filename'); rainfall_mm = float(data.get('rainfall_mm', 50.0))
-    if not dem_filename: return jsonify({"error": "DEM filename required."}), 400
-    dem_path = os.path.join(ELEVATION_DATA_PATH, dem_filename)
-    if not os.path.exists(dem_path): return jsonify({"error": "DEM not found."}), 404
-    try:
-        dem = rd.LoadGDAL(dem_path, no_data=-9999); slope = rd.TerrainAttribute(dem, attrib='slope_degrees')
-        hazard = (0.5 * np.clip(slope / 90, 0, 1)) + (0.5 * np.clip(rainfall_mm / 150.0, 0, 1))
-        hazard[dem == -9999] = -9999; valid = hazard[hazard != -9999]
-        min_val, max_val = (np.percentile(valid, [2, 98])) if valid.size > 0 else (0, 1)
-        if max_val <= min_val: max_val = min_val + 0.1
-        cache_filename = f"hazard_{os.path.splitext(dem_filename)[0]}_{int(rainfall_mm)}mm.tif"
-        rd.SaveGDAL(os.path.join(CACHE_PATH, cache_filename), hazard)
-        return jsonify({"status": "success", "cache_filename": cache_filename, "stats": {"min": float(min_val), "max": float(max_val)}})
-    except Exception as e:
-        traceback.print_exc(); return jsonify({"error": str(e)}), 500
-
-@app.route('/api/query_elevation', methods=['POST'])
-def query_elevation():
-    data = request.get_json()
-    if not data or 'dem_filename' not in data or 'lon' not in data or 'lat' not in data: return "Invalid request", 400
-    path = os.path.join(ELEVATION_DATA_PATH, data['dem_filename'])
-    if not os.path.exists(path): return {"error": "DEM file not found"}, 404
-    try:
-        with rasterio.open(path) as src:
-            transformer = pyproj.Transformer.from_crs("EPSG:4326", src.crs, always_xy=True)
-            dem_x, dem_y = transformer.transform(data['lon'], data['lat'])
-            elev = next(src.sample([(dem_x, dem_y)]))[0]
-            elev = float(elev) if elev != src.nodata else None
-            return jsonify({"elevation": elev, "lon": data['lon'], "lat": data['lat']})
-    except Exception as e:
-        traceback.print_exc(); return jsonify({"error": "Failed to process elevation"}), 500
-
-@app.route('/api/stream_layer')
-def get_stream_layer():
-    for term in ['stream', 'river']:
-        files = glob.glob(os.path.join(VECTOR_DATA_PATH, f'**/*{term}*.shp'), recursive=True) + glob.glob(os.path.join(VECTOR_DATA_PATH, f'**/*{term}*.zip'), recursive=True)
-        if files:
-            try:
-                gdf = gpd.read_file(f"zip://{files[0]}" if files[0].lower().endswith('.zip') else files[0])
-                return jsonify(json.loads(gdf[gdf.is_valid].to_crs("EPSG:4326").to_json()))
-            except Exception as e:
-                return jsonify({"error": f"Error reading stream file: {str(e)}"}), 500
-    return jsonify({"error": "No stream or river shapefile found."}), 404
-
-if __name__ == "__main__":
-
-    app.run()
-
+# app.py
+
+import os
+import sys
+import time
+from contextlib import ExitStack, contextmanager
+from functools import lru_cache
+
+BOOT_STARTED = time.perf_counter()
+
+import matplotlib
+from shapely import Point
+# Use a non-interactive backend, crucial for server-side execution
+matplotlib.use('Agg')
+os.environ['MPLCONFIGDIR'] = "/tmp/matplotlib"
+# ==============================================================================
+# --- STEP 2: IMPORT ALL OTHER LIBRARIES ---
+# ==============================================================================
+
+from flask import Flask, abort, g, render_template, request, jsonify, Response, redirect, send_file, send_from_directory, url_for
+from flask.json.provider import DefaultJSONProvider
+from flask_cors import CORS
+import click
+import glob
+import re
+import json
+import rasterio
+from rasterio.warp import reproject, Resampling, transform_bounds
+import numpy as np
+from PIL import Image
+import io
+import mercantile
+import traceback
+import requests
+from dotenv import load_dotenv
+from shapely.ops import nearest_points, unary_union
+from shapely.geometry import shape, box
+from matplotlib.colors import Normalize, LinearSegmentedColormap
+# import richdem as rd  # <-- REMOVED
+import pytz
+import uuid
+from werkzeug.security import safe_join
+from werkzeug.utils import secure_filename
+from raster_pool import DatasetPool
+from tile_cache import TileCache
+from cog import current_cog, ingest_directories, pick_overview_level
+from vector_tiles import VectorTileIndexCache
+from vector_store import VectorLayerStore
+from layer_catalog import LayerCatalog, list_directory, raster_layer_info
+from jobs import FINISHED_STATES, JobManager
+from result_cache import CachedAnalysis, DiskBudget, EvictAfter, ResultCache
+from http_client import HttpClient
+from uploads import ChunkedUploads, UploadError
+from dem_arrays import DemArrayCache
+import instrumentation
+from instrumentation import METRICS, span
+from subsystems import REGISTRY as SUBSYSTEMS
+import sampling
+
+# --- LAZY SUBSYSTEMS ---
+# Hydrology (pysheds/numba), solar (pvlib), vector export (pyogrio/skimage), point clouds and
+# model conversion load on first use, so a worker answers tile requests seconds sooner after boot.
+# Job functions are passed to the pool as SUBSYSTEMS.deferred('module.function') and only import
+# their module inside the job process. `flask import-report` lists what loaded and what it cost.
+gpd = SUBSYSTEMS.lazy('geopandas')
+pd = SUBSYSTEMS.lazy('pandas')
+pvlib = SUBSYSTEMS.lazy('pvlib')
+flood_export = SUBSYSTEMS.lazy('flood_export')
+mesh_optimizer = SUBSYSTEMS.lazy('mesh_optimizer')
+solar = SUBSYSTEMS.lazy('solar')
+pointcloud = SUBSYSTEMS.lazy('pointcloud')
+# Point cloud layers need PDAL; a missing install is reported the first time one is opened.
+pdal = SUBSYSTEMS.lazy('pdal', optional=True)
+# Only ever called through deferred job functions; registered so warm-up and the report include them.
+SUBSYSTEMS.register('analysis', 'hydrology')
+
+# ==============================================================================
+# --- STEP 3: FLASK APP SETUP AND CONFIGURATION ---
+# ==============================================================================
+load_dotenv()
+
+app = Flask(__name__)
+CORS(app)
+MAPTILER_API_KEY = os.environ.get("MAPTILER_API_KEY", "5EYOzE3UHralvJsxc3xw")
+NREL_API_KEY = os.environ.get("NREL_API_KEY", "jyAPNa8CEgKFHJOwMUhYYIEJZAdbfbHCIjuyXZo5")
+
+# --- PATHS CONFIGURATION ---
+BASE_DATA_PATH = os.path.join(os.getcwd(), "data", "Koushika")
+VECTOR_DATA_PATH = os.path.join(BASE_DATA_PATH, "shp")
+ELEVATION_DATA_PATH = os.path.join(BASE_DATA_PATH, "elevation")
+RASTER_DATA_PATH = os.path.join(BASE_DATA_PATH, "tif")
+POINTCLOUD_DATA_PATH = os.path.join(BASE_DATA_PATH, "point")
+CACHE_PATH = os.path.join(BASE_DATA_PATH, "cache")
+MODEL_DATA_PATH = os.path.join(BASE_DATA_PATH, "models")
+GENERIC_DATA_PATH = os.path.join(os.getcwd(), "data")
+
+for path in [VECTOR_DATA_PATH, ELEVATION_DATA_PATH, RASTER_DATA_PATH, POINTCLOUD_DATA_PATH, CACHE_PATH, MODEL_DATA_PATH, GENERIC_DATA_PATH]:
+    if not os.path.isdir(path):
+        os.makedirs(path)
+        print(f"WARNING: Created directory at: {path}")
+
+STATIC_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+UPLOAD_FOLDER = os.path.join(STATIC_FOLDER, 'uploads')
+app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
+os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+
+# --- RASTER I/O CONFIGURATION ---
+# Warm dataset handles are shared across tile requests so GDAL's block cache survives between them.
+os.environ.setdefault('GDAL_CACHEMAX', '512')
+os.environ.setdefault('GDAL_DISABLE_READDIR_ON_OPEN', 'EMPTY_DIR')
+DATASET_POOL = DatasetPool(max_size=int(os.environ.get("DATASET_POOL_SIZE", 16)))
+
+# --- RENDERED TILE CACHE ---
+TILE_CACHE = TileCache(os.path.join(CACHE_PATH, "tiles"), max_bytes=int(os.environ.get("TILE_CACHE_MEMORY_MB", 64)) * 1024 * 1024,
+                       metatile_bytes=int(os.environ.get("METATILE_MEMORY_MB", 64)) * 1024 * 1024, disk_bytes=int(os.environ.get("TILE_CACHE_DISK_MB", 1024)) * 1024 * 1024)
+TILE_CACHE_MAX_AGE = int(os.environ.get("TILE_CACHE_MAX_AGE", 300))
+# Tiles are rendered in METATILE_SIZE x METATILE_SIZE blocks (a power of two; 1 renders tile by tile).
+METATILE_SIZE = int(os.environ.get("METATILE_SIZE", 4))
+if METATILE_SIZE < 1 or METATILE_SIZE & (METATILE_SIZE - 1): raise ValueError(f"METATILE_SIZE must be a power of two, got {METATILE_SIZE}")
+RASTER_TILE_PARAMS = ('min', 'max', 'colormap', 'r', 'g', 'b', 'p_mins', 'p_maxs', 't')
+
+# --- CLOUD-OPTIMIZED GEOTIFF COPIES ---
+COG_PATH = os.path.join(CACHE_PATH, "cog")
+ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN")
+
+# --- VECTOR LAYER STORE ---
+VECTOR_STORE = VectorLayerStore(VECTOR_DATA_PATH, os.path.join(CACHE_PATH, "vector"))
+
+# --- LAYER CATALOG ---
+CATALOG = LayerCatalog(os.path.join(CACHE_PATH, "catalog.sqlite"))
+CATALOG.register('elevation', lambda: list_directory(ELEVATION_DATA_PATH), raster_layer_info)
+CATALOG.register('raster', lambda: list_directory(RASTER_DATA_PATH), raster_layer_info)
+CATALOG.register('vector', lambda: {os.path.basename(f): f for f in VECTOR_STORE.list_files()}, VECTOR_STORE.info)
+# Startup warm-up of the whole catalog; layers found later are indexed on demand either way.
+if os.environ.get("CATALOG_BACKGROUND_INDEX", "1") == "1": CATALOG.start_background_refresh()
+
+# --- ANALYSIS JOBS ---
+JOBS = JobManager(os.path.join(CACHE_PATH, "jobs"), max_workers=int(os.environ.get("ANALYSIS_WORKERS", 2)))
+EXPORT_PATH = os.path.join(CACHE_PATH, "exports")
+# Raster results are content-addressed by (analysis, source files, parameters) and evicted LRU beyond the budget.
+RESULTS = ResultCache(CACHE_PATH, os.path.join(CACHE_PATH, "results.sqlite"), max_bytes=int(os.environ.get("RESULT_CACHE_MB", 2048)) * 1024 * 1024)
+HYDRO_PATH = os.path.join(CACHE_PATH, "hydro")
+# Decoded DEMs are shared by every worker and job process as memory-mapped arrays; point
+# DEM_ARRAY_PATH at /dev/shm to keep them in RAM rather than the page cache of the data disk.
+DEM_ARRAYS = DemArrayCache(os.environ.get("DEM_ARRAY_PATH", os.path.join(CACHE_PATH, "dem_arrays")), max_bytes=int(os.environ.get("DEM_ARRAY_CACHE_MB", 4096)) * 1024 * 1024)
+# Other derived files are evicted least recently used under their own budgets, by each job once it finishes.
+# Exports are kept for an hour whatever the budget, so a finished job's download link keeps working.
+COG_BUDGET = DiskBudget(COG_PATH, int(os.environ.get("COG_CACHE_MB", 4096)) * 1024 * 1024)
+EXPORT_BUDGET = DiskBudget(os.path.join(EXPORT_PATH, "flood"), int(os.environ.get("EXPORT_CACHE_MB", 1024)) * 1024 * 1024, grace=3600)
+HYDRO_BUDGET = DiskBudget(HYDRO_PATH, int(os.environ.get("HYDRO_CACHE_MB", 4096)) * 1024 * 1024, exclude=('sources',))
+DISK_BUDGETS = (COG_BUDGET, EXPORT_BUDGET, HYDRO_BUDGET, DEM_ARRAYS)
+MAX_FLOOD_DURATION_MIN = 24 * 60
+MAX_FLOOD_FRAMES = 48
+
+# --- UPSTREAM APIS ---
+# Base URLs are overridable so `flask fake-upstreams` (fake_upstreams.py) can stand in for the real services.
+HTTP = HttpClient(pool_size=int(os.environ.get("HTTP_POOL_SIZE", 16)))
+HTTP.register('open_meteo', os.environ.get("OPEN_METEO_BASE_URL", "https://api.open-meteo.com"), timeout=(3.05, 10), ttl=int(os.environ.get("RAINFALL_CACHE_TTL", 300)))
+HTTP.register('openweather', os.environ.get("OPENWEATHER_BASE_URL", "https://api.openweathermap.org"), timeout=(3.05, 15), ttl=int(os.environ.get("SOLAR_CACHE_TTL", 1800)))
+
+# --- MODEL UPLOADS ---
+# Large OBJ/MTL/IFC bundles arrive in resumable chunks; OBJ models are then converted to GLB in the job pool.
+MODEL_UPLOAD_EXTENSIONS = ('.obj', '.mtl', '.ifc', '.png', '.jpg', '.jpeg', '.bmp', '.tga', '.gif', '.webp')
+MODEL_UPLOADS = ChunkedUploads(UPLOAD_FOLDER, MODEL_UPLOAD_EXTENSIONS, max_file_bytes=int(os.environ.get("MAX_MODEL_UPLOAD_MB", 4096)) * 1024 * 1024,
+                               max_chunk_bytes=int(os.environ.get("MODEL_UPLOAD_CHUNK_MB", 16)) * 1024 * 1024)
+
+# --- ELEVATION SAMPLING ---
+MAX_SAMPLE_POINTS = 100_000
+
+# --- VECTOR TILES ---
+VECTOR_TILE_MAX_ZOOM = 14
+
+# --- INSTRUMENTATION ---
+# Every response carries a Server-Timing header with the stages it went through (open, reproject,
+# colormap, png, json, job.fill_depressions, ...); /metrics aggregates them per route with the
+# cache hit ratios. INSTRUMENTATION=0 turns the spans into no-ops.
+class TimedJSONProvider(DefaultJSONProvider):
+    def dumps(self, obj, **kwargs):
+        with span('json'): return super().dumps(obj, **kwargs)
+
+if instrumentation.ENABLED: app.json = TimedJSONProvider(app)
+
+@app.before_request
+def start_request_timing():
+    if not instrumentation.ENABLED: return
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    METRICS.request_started(route)
+    g.instrumentation = (route, time.perf_counter(), instrumentation.begin(route))
+
+@app.after_request
+def add_server_timing(response):
+    state = g.pop('instrumentation', None)
+    if state is None: return response
+    route, started, token = state; elapsed = time.perf_counter() - started
+    response.headers['Server-Timing'] = instrumentation.server_timing(instrumentation.end(token), elapsed)
+    METRICS.request_finished(route, response.status_code, elapsed)
+    return response
+
+@app.teardown_request
+def finish_failed_request_timing(exc):
+    # after_request is skipped when a view raises; still close the span context and the in-flight count.
+    state = g.pop('instrumentation', None)
+    if state is None: return
+    route, started, token = state; instrumentation.end(token)
+    METRICS.request_finished(route, 500, time.perf_counter() - started)
+
+def cache_metrics():
+    tile_hits = TILE_CACHE.hits['memory'] + TILE_CACHE.hits['disk']
+    lookups = {'tile': (tile_hits, TILE_CACHE.misses), 'result': (RESULTS.hits, RESULTS.misses), 'http': (HTTP.stats['hits'], HTTP.stats['misses'])}
+    yield ("koushika_cache_lookups_total", "counter", "Cache lookups in this worker, by cache and outcome.",
+           [({'cache': 'tile', 'result': 'hit_memory'}, TILE_CACHE.hits['memory']), ({'cache': 'tile', 'result': 'hit_disk'}, TILE_CACHE.hits['disk'])]
+           + [({'cache': name, 'result': 'hit'}, hits) for name, (hits, _) in lookups.items() if name != 'tile']
+           + [({'cache': name, 'result': 'miss'}, misses) for name, (_, misses) in lookups.items()])
+    yield ("koushika_cache_hit_ratio", "gauge", "Hits over lookups since this worker started.", [({'cache': name}, hits / (hits + misses)) for name, (hits, misses) in lookups.items() if hits + misses])
+    yield ("koushika_http_coalesced_total", "counter", "Upstream requests answered by joining an identical call already in flight.", [({}, HTTP.stats['coalesced'])])
+    yield ("koushika_metatile_lookups_total", "counter", "Tile misses by how their metatile was obtained: rendered, kept from an earlier render, or waited on one in flight.",
+           [({'result': 'rendered'}, TILE_CACHE.renders), ({'result': 'kept'}, TILE_CACHE.metatile_hits), ({'result': 'coalesced'}, TILE_CACHE.coalesced)])
+    yield ("koushika_dataset_opens_total", "counter", "rasterio datasets opened by the dataset pool.", [({}, DATASET_POOL.opens)])
+    yield ("koushika_result_cache_bytes", "gauge", "Bytes of cached analysis results on disk.", [({}, RESULTS.stats()['bytes'])])
+    yield ("koushika_disk_cache_bytes", "gauge", "Bytes of other derived data on disk, by cache.",
+           [({'cache': name}, budget.usage()) for name, budget in (('cog', COG_BUDGET), ('export', EXPORT_BUDGET), ('hydrology', HYDRO_BUDGET), ('dem_arrays', DEM_ARRAYS.budget))])
+
+METRICS.register(cache_metrics)
+
+# --- HELPER FUNCTIONS ---
+def encode_terrain_rgb(data, nodata_val):
+    data[(data == nodata_val) | ~np.isfinite(data)] = 0
+    # Mapbox Terrain-RGB: the 0.1 m steps above -10000 m, split into bytes with integer shifts.
+    val = np.floor((data + 10000.0) * 10.0).astype(np.int64)
+    rgb = np.empty(data.shape + (3,), dtype=np.uint8)
+    rgb[..., 0] = val >> 16; rgb[..., 1] = val >> 8; rgb[..., 2] = val
+    return rgb
+
+@lru_cache(maxsize=None)
+def empty_tile_png(mode='RGBA'):
+    buf = io.BytesIO(); Image.new(mode, (256, 256)).save(buf, 'PNG')
+    return buf.getvalue()
+
+def get_colormap(cmap_name, vmin, vmax):
+    if cmap_name == 'flood_custom':
+        bp_norm = min(1.0, max(0.0, (0.5 - vmin) / (vmax - vmin))) if vmax > vmin else 0.5
+        return LinearSegmentedColormap.from_list("custom_flood_cmap", [(0.0, "#a6cee3"), (bp_norm, "#a6cee3"), (1.0, "#1f78b4")])
+    if cmap_name == 'slope': return LinearSegmentedColormap.from_list("slope_cmap", ["#2ca25f", "#ffffbf", "#fee08b", "#fdae61", "#f46d43", "#d73027", "#a50026"])
+    return matplotlib.colormaps[cmap_name]
+
+def metatile(z, x, y):
+    # Origin and edge length of the N x N block holding tile (x, y); the whole zoom level if it is smaller.
+    n = min(METATILE_SIZE, 2 ** z)
+    return x // n * n, y // n * n, n
+
+def metatile_bounds(z, x0, y0, n):
+    left, _, _, top = mercantile.xy_bounds(x0, y0, z); _, bottom, right, _ = mercantile.xy_bounds(x0 + n - 1, y0 + n - 1, z)
+    return left, bottom, right, top
+
+def warp_band(src, band, z, x0, y0, n, nodata):
+    size = 256 * n; dst_tf = rasterio.transform.from_bounds(*metatile_bounds(z, x0, y0, n), width=size, height=size)
+    arr = np.full((size, size), nodata, dtype=np.float32)
+    with span('reproject'): reproject(source=rasterio.band(src, band), destination=arr, src_transform=src.transform, src_crs=src.crs, src_nodata=src.nodata, dst_transform=dst_tf, dst_crs='EPSG:3857', dst_nodata=nodata, resampling=Resampling.bilinear)
+    return arr
+
+def encode_tile(image, mode, i, j):
+    # PNG for tile (i, j) of a rendered metatile, counted in tiles from its top-left corner.
+    block = image[j * 256:(j + 1) * 256, i * 256:(i + 1) * 256]
+    # Blocks past the raster's edge are all zeros (transparent, or nodata in Terrain-RGB); they share one encoding.
+    if not block.any(): return empty_tile_png(mode)
+    with span('png'): buf = io.BytesIO(); Image.fromarray(np.ascontiguousarray(block), mode).save(buf, 'PNG')
+    return buf.getvalue()
+
+def render_dem_metatile(src, z, x0, y0, n):
+    nodata = src.nodata if src.nodata is not None else -9999
+    block = warp_band(src, 1, z, x0, y0, n, nodata)
+    with span('terrain_rgb'): return encode_terrain_rgb(block, nodata), 'RGB'
+
+def render_raster_metatile(src, z, x0, y0, n, params):
+    nodata = src.nodata if src.nodata is not None else -9999
+    if 'r' in params:
+        p_mins = [float(v) for v in params.get('p_mins', '0,0,0').split(',')]; p_maxs = [float(v) for v in params.get('p_maxs', '1,1,1').split(',')]
+        bands = [int(params.get('r')), int(params.get('g')), int(params.get('b'))]; rgb = np.zeros((256 * n, 256 * n, 3), dtype=np.uint8)
+        for i in range(3):
+            band_data = warp_band(src, bands[i], z, x0, y0, n, nodata)
+            rgb[..., i] = np.clip(((band_data - p_mins[i]) / (p_maxs[i] - p_mins[i] + 1e-9)) * 255, 0, 255).astype(np.uint8)
+        return rgb, 'RGB'
+    vmin = float(params.get('min', 0)); vmax = float(params.get('max', 1))
+    # 't' picks a time step (band) out of a multi-band frame stack such as the flood projection.
+    band = min(max(int(params.get('t', 0)), 0), src.count - 1) + 1
+    arr = warp_band(src, band, z, x0, y0, n, nodata)
+    with span('colormap'):
+        mask = (arr == nodata) | ~np.isfinite(arr); norm = Normalize(vmin=vmin, vmax=vmax, clip=True)
+        cmap = get_colormap(params.get('colormap', 'Spectral_r'), vmin, vmax)
+        rgba = cmap(norm(arr), bytes=True); rgba[mask] = [0, 0, 0, 0]
+    return rgba, 'RGBA'
+
+@contextmanager
+def borrow_tile_source(path, z, x0, y0, n=1):
+    # Prefer the ingested COG and read from the overview that matches the metatile's resolution,
+    # so low-zoom tiles don't pull every full-resolution pixel through reproject.
+    with ExitStack() as stack:
+        with span('open'):
+            cog = current_cog(COG_PATH, path)
+            if cog: COG_BUDGET.touch(cog); path = cog
+            level = pick_overview_level(DATASET_POOL.info(path), metatile_bounds(z, x0, y0, n), dst_size=256 * n)
+            src = stack.enter_context(DATASET_POOL.borrow(path, **({} if level is None else {'overview_level': level})))
+        yield src
+
+@contextmanager
+def borrow_elevation_source(path):
+    # Sample from the shared decoded array, pinned for the request, once an analysis has built it.
+    # Until then small profile and sample reads stay on windowed reads through the dataset pool.
+    if DEM_ARRAYS.ready(path):
+        with DEM_ARRAYS.borrow(path) as dem:
+            yield dem
+        return
+    with DATASET_POOL.borrow(path) as src:
+        yield src
+
+def render_tile(path, kind, z, x, y, params, render):
+    # One warp and one colour pass per metatile: the block is rendered on the first miss inside it
+    # (concurrent misses wait on that render) and kept, so its other tiles are only sliced and encoded.
+    x0, y0, n = metatile(z, x, y)
+
+    def run():
+        with borrow_tile_source(path, z, x0, y0, n) as src: return render(src, z, x0, y0, n)
+    image, mode = TILE_CACHE.metatile(TILE_CACHE.key(path, kind, z, x0, y0, dict(params or {}, metatile=n)), run)
+    return encode_tile(image, mode, x - x0, y - y0)
+
+def cached_tile_response(path, kind, z, x, y, params, render):
+    # The cache key is a strong validator: it changes whenever the source file or the styling params change.
+    etag = TILE_CACHE.key(path, kind, z, x, y, params)
+    if request.if_none_match.contains(etag):
+        resp = Response(status=304)
+    else:
+        with span('tile_cache'): data = TILE_CACHE.get(etag)
+        if data is None:
+            data = render_tile(path, kind, z, x, y, params, render)
+            with span('tile_cache_put'): TILE_CACHE.put(etag, data)
+        resp = Response(data, mimetype='image/png')
+    resp.set_etag(etag); resp.headers['Cache-Control'] = f"public, max-age={TILE_CACHE_MAX_AGE}"
+    return resp
+
+def job_result_response(record):
+    # The job's own stages (fill_depressions, simulate, ...) join this response's Server-Timing.
+    instrumentation.annotate((f"job.{stage}", seconds) for stage, seconds in record.get('timings') or ())
+    if record['status'] == 'succeeded':
+        result = record['result']
+        if result.get('download'):
+            EXPORT_BUDGET.touch(os.path.join(EXPORT_PATH, result['download']))
+            return send_file(os.path.join(EXPORT_PATH, result['download']), mimetype=result.get('mimetype'), as_attachment=True, download_name=result.get('download_name'))
+        return jsonify(result)
+    if record['status'] == 'cancelled': return jsonify({"error": "The job was cancelled."}), 409
+    return jsonify({"error": record.get('error') or "The job failed."}), record.get('status_code') or 500
+
+def run_analysis_job(kind, data, fn, *args):
+    # Heavy work always runs in the process pool; synchronous callers just wait on it cooperatively.
+    try:
+        job = JOBS.submit(kind, EvictAfter(fn, DISK_BUDGETS), *args)
+    except Exception as e:
+        traceback.print_exc(); return jsonify({"error": f"Could not start {kind} job: {str(e)}"}), 500
+    if data.get('async'):
+        return jsonify({"job_id": job['id'], "status": job['status'], "status_url": url_for('get_job', job_id=job['id'])}), 202
+    with span('job_wait'): record = JOBS.wait(job['id'])
+    return job_result_response(record)
+
+def run_cached_analysis(kind, data, sources, params, fn, *args):
+    # A hit is answered straight from the index; a miss runs the job, which records its own result.
+    with span('result_cache'): key = RESULTS.key(kind, sources, params); result = RESULTS.lookup(key)
+    if result is not None: return jsonify(result)
+    return run_analysis_job(kind, data, CachedAnalysis(RESULTS, key, kind, fn), *args)
+
+@app.route('/')
+def home():
+    return redirect(url_for('viewer'))
+
+@app.route('/viewer')
+def viewer():
+    return render_template('index.html')
+
+@app.route('/flood_simulation')
+def flood_simulation_launcher():
+    return render_template('flood-viewer.html')
+
+@app.route('/flood_simulation/<path:dem_id>')
+def flood_simulation(dem_id):
+    dem_path = os.path.join(ELEVATION_DATA_PATH, dem_id)
+    if not os.path.exists(dem_path):
+        abort(404, description=f"DEM file '{dem_id}' not found.")
+    return render_template('flood-viewer.html', dem_id=dem_id)
+
+@app.route('/point_viewer')
+def point_viewer_page():
+    return render_template('point.html')
+
+
+# =========================================================================
+# === FLOOD SIMULATION API ROUTES ===
+# =========================================================================
+
+@app.route('/api/run_gis_flood_simulation', methods=['POST'])
+def run_gis_flood_simulation():
+    # This function relies heavily on richdem and is now disabled.
+    return jsonify({"error": "This GIS simulation feature is currently disabled due to library incompatibility."}), 501
+
+    
+@app.route('/api/calculate_flow_accumulation', methods=['POST'])
+def calculate_flow_accumulation():
+    data = request.get_json(); dem_id = data.get('dem_id')
+    if not dem_id: return jsonify({"error": "dem_id is required."}), 400
+    dem_path = os.path.join(ELEVATION_DATA_PATH, dem_id)
+    if not os.path.exists(dem_path): return jsonify({"error": "DEM file not found."}), 404
+    return run_analysis_job('flow_accumulation', data, SUBSYSTEMS.deferred('analysis.flow_accumulation'), dem_path, CACHE_PATH, HYDRO_PATH)
+
+@app.route('/api/trace_flow_path', methods=['POST'])
+def trace_flow_path():
+    data = request.get_json(); dem_id = data.get('dem_id'); inflow_points = data.get('inflow_points', []); outflow_points = data.get('outflow_points', [])
+    if not dem_id or not inflow_points: return jsonify({"error": "DEM ID and inflow points are required."}), 400
+    dem_path = os.path.join(ELEVATION_DATA_PATH, dem_id)
+    if not os.path.exists(dem_path): return jsonify({"error": "DEM file not found."}), 404
+    return run_cached_analysis('trace_flow_path', data, [dem_path], {'inflow_points': inflow_points, 'outflow_points': outflow_points},
+                               SUBSYSTEMS.deferred('analysis.trace_flow_path'), dem_path, inflow_points, outflow_points, CACHE_PATH, HYDRO_PATH)
+
+@app.route('/api/channelized_flood_simulation', methods=['POST'])
+def channelized_flood_simulation():
+    data = request.get_json()
+    dem_id = data.get('dem_id')
+    inflow_points = data.get('inflow_points', [])
+
+    if not dem_id or not inflow_points:
+        return jsonify({"error": "DEM ID and inflow points are required."}), 400
+
+    dem_path = os.path.join(ELEVATION_DATA_PATH, dem_id)
+    if not os.path.exists(dem_path):
+        return jsonify({"error": "DEM file not found."}), 404
+
+    return run_cached_analysis('channelized_flood', data, [dem_path], {'inflow_points': inflow_points}, SUBSYSTEMS.deferred('analysis.channelized_flood'), dem_path, inflow_points, CACHE_PATH, HYDRO_PATH, DEM_ARRAYS)
+
+@app.route('/api/export_flood', methods=['POST'])
+@app.route('/api/export_channel_flood', methods=['POST'])
+def export_flood():
+    data = request.get_json(); cache_filename = data.get('cache_filename')
+    if not cache_filename: return jsonify({"error": "Cache filename is required."}), 400
+    fmt = data.get('format', 'gpkg')
+    if fmt not in flood_export.FORMATS: return jsonify({"error": f"Unsupported export format. Choose one of: {', '.join(flood_export.FORMATS)}."}), 400
+    try: breaks = [float(b) for b in data.get('breaks') or []]
+    except (TypeError, ValueError): return jsonify({"error": "Class breaks must be numbers."}), 400
+    raster_path = safe_join(CACHE_PATH, cache_filename)
+    if raster_path is None or not raster_path.endswith('.tif') or not os.path.exists(raster_path): return jsonify({"error": "Cached raster file not found."}), 404
+    return run_analysis_job('export_flood', data, SUBSYSTEMS.deferred('flood_export.export_flood'), raster_path, EXPORT_PATH, fmt, breaks)
+
+@app.route('/api/projection_data', methods=['POST'])
+def get_projection_data():
+    data = request.get_json(); dem_id = data.get('dem_id'); points = data.get('points', [])
+    if not dem_id: return jsonify({"error": "dem_id is required."}), 400
+    try:
+        rainfall_mm_hr = float(data.get('rainfall_mm_hr', 0.0)); duration_min = float(data.get('duration_min', 60)); frames = int(data.get('frames', 12))
+    except (TypeError, ValueError):
+        return jsonify({"error": "rainfall_mm_hr, duration_min and frames must be numbers."}), 400
+    if not np.isfinite(rainfall_mm_hr) or not np.isfinite(duration_min) or duration_min <= 0: return jsonify({"error": "duration_min must be positive and rainfall_mm_hr finite."}), 400
+    duration_min = min(duration_min, MAX_FLOOD_DURATION_MIN); frames = max(1, min(frames, MAX_FLOOD_FRAMES))
+    dem_path = os.path.join(ELEVATION_DATA_PATH, dem_id)
+    if not os.path.exists(dem_path): return jsonify({"error": "DEM file not found."}), 404
+    params = {'points': points, 'rainfall_mm_hr': rainfall_mm_hr, 'duration_min': duration_min, 'frames': frames}
+    return run_cached_analysis('projection_data', data, [dem_path], params, SUBSYSTEMS.deferred('analysis.projection_data'), dem_path, points, rainfall_mm_hr, CACHE_PATH, duration_min, frames, DEM_ARRAYS)
+
+
+def get_river_geometry(target_crs):
+    search_terms = ['stream', 'river']; river_path = None
+    for term in search_terms:
+        river_path = VECTOR_STORE.find_matching(term, ('.shp',))
+        if river_path: break
+    if not river_path: return None
+    try:
+        gdf = VECTOR_STORE.load(river_path)
+        gdf = gdf[gdf.is_valid & ~gdf.is_empty]
+        return unary_union(gdf.to_crs(target_crs).geometry) if not gdf.empty else None
+    except Exception as e:
+        print(f"Error processing river file {river_path}: {e}"); return None
+
+@app.route('/api/precalculated_flood_zones')
+def get_precalculated_flood_zones():
+    geojson_path = os.path.join(GENERIC_DATA_PATH, 'flood_data.geojson')
+    if not os.path.exists(geojson_path):
+        with open(geojson_path, 'w') as f: json.dump({"type": "FeatureCollection", "features": []}, f)
+    with open(geojson_path, 'r') as f: return jsonify(json.load(f))
+
+@app.route('/api/get_live_rainfall')
+def get_live_rainfall():
+    lat = request.args.get('lat', type=float); lon = request.args.get('lon', type=float)
+    if lat is None or lon is None: return jsonify({"error": "Latitude and Longitude are required."}), 400
+    try:
+        weather = HTTP.get_json('open_meteo', '/v1/forecast', {"latitude": lat, "longitude": lon, "current": "precipitation"})
+        return jsonify({"success": True, "current_precipitation_mmhr": float(weather.get('current', {}).get('precipitation', 0.0))})
+    except requests.exceptions.RequestException as e:
+        return jsonify({"error": f"Could not fetch weather data: {e}"}), 502
+
+@app.route('/solar_dashboard')
+def solar_dashboard_page(): return render_template('solar-dashboard.html')
+
+@app.route('/api/solar_irradiance', methods=['GET'])
+def get_solar_irradiance_data():
+    lat = float(request.args.get('lat', 10.3833)); lon = float(request.args.get('lon', 78.8333))
+    api_key = os.environ.get("OPENWEATHER_API_KEY")
+    if not api_key: return jsonify({"error": "OpenWeather API key not configured."}), 500
+    try:
+        weather_data = HTTP.get_json('openweather', '/data/3.0/onecall', {"lat": lat, "lon": lon, "exclude": "minutely,daily,alerts", "units": "metric", "appid": api_key})
+        hourly_data = weather_data['hourly']; tz = weather_data['timezone']
+        times = pd.to_datetime([h['dt'] for h in hourly_data], unit='s').tz_localize('UTC').tz_convert(tz)
+        df = pd.DataFrame({'temp_air': [h['temp'] for h in hourly_data], 'pressure': [h['pressure'] * 100 for h in hourly_data], 'dew_point': [h.get('dew_point', h['temp'] - 5) for h in hourly_data], 'clouds': [h['clouds'] for h in hourly_data],}, index=times)
+        solpos = pvlib.solarposition.get_solarposition(times, lat, lon)
+        clear_sky = pvlib.clearsky.simplified_solis(apparent_elevation=90 - solpos['apparent_zenith'], aod700=0.1, precipitable_water=pvlib.atmosphere.gueymard94_pw(df['temp_air'], df['dew_point']), pressure=df['pressure'], dni_extra=pvlib.irradiance.get_extra_radiation(times))
+        clear_sky.rename(columns={'dni': 'dni_clear', 'ghi': 'ghi_clear', 'dhi': 'dhi_clear'}, inplace=True)
+        cloudy_sky = pvlib.irradiance.dirint(clear_sky['ghi_clear'], solpos['apparent_zenith'], times, pressure=df['pressure'], temp_dew=df['dew_point']).to_frame('dni').fillna(0)
+        cloudy_sky['dhi_cloudy'] = clear_sky['dhi_clear']
+        cloudy_sky['ghi_cloudy'] = cloudy_sky['dni'] * np.cos(np.radians(solpos['apparent_zenith'])) + cloudy_sky['dhi_cloudy']
+        cloudy_sky.rename(columns={'dni': 'dni_cloudy'}, inplace=True)
+        final_df = pd.concat([clear_sky, cloudy_sky], axis=1); final_df[final_df < 0] = 0
+        return jsonify(json.loads(final_df.to_json(orient='table', date_format='iso'))['data'])
+    except Exception as e:
+        traceback.print_exc(); return jsonify({"error": f"Solar calculation error: {str(e)}"}), 500
+
+@app.route('/api/solar_potential', methods=['POST'])
+def calculate_solar_potential():
+    data = request.get_json() or {}
+    if 'dem_filename' not in data: return jsonify({"error": "DEM filename required."}), 400
+    dem_path = os.path.join(ELEVATION_DATA_PATH, data['dem_filename'])
+    if not os.path.exists(dem_path): return jsonify({"error": "DEM not found."}), 404
+    buildings_path = VECTOR_STORE.find(data['buildings_layer']) if data.get('buildings_layer') else (VECTOR_STORE.find_matching('builtup') or VECTOR_STORE.find_matching('building'))
+    if not buildings_path: return jsonify({"error": "No builtup/building footprint layer found."}), 404
+    try:
+        year = int(data['year']) if data.get('year') else None
+        efficiency = float(data.get('efficiency', solar.DEFAULT_EFFICIENCY)); performance_ratio = float(data.get('performance_ratio', solar.DEFAULT_PERFORMANCE_RATIO))
+    except (TypeError, ValueError):
+        return jsonify({"error": "year, efficiency and performance_ratio must be numbers."}), 400
+    return run_analysis_job('solar_potential', data, SUBSYSTEMS.deferred('solar.rooftop_potential'), dem_path, buildings_path, CACHE_PATH, year, efficiency, performance_ratio)
+
+@app.route('/api/solar_potential/<path:filename>')
+def get_solar_potential_table(filename):
+    solar_dir = os.path.join(CACHE_PATH, 'solar')
+    if not filename.endswith('.geojson') or not os.path.exists(os.path.join(solar_dir, filename)): abort(404, "Solar potential table not found.")
+    return send_from_directory(solar_dir, filename, mimetype='application/geo+json')
+
+def start_model_optimization(model_dir):
+    if not any(f.lower().endswith('.obj') for f in os.listdir(model_dir)): return None
+    try: return JOBS.submit('optimize_model', SUBSYSTEMS.deferred('mesh_optimizer.optimize_model'), model_dir)['id']
+    except Exception: traceback.print_exc(); return None
+
+@app.route('/upload-model', methods=['POST'])
+def upload_model():
+    if 'files' not in request.files: return jsonify({'success': False, 'message': 'No file part'}), 400
+    files = request.files.getlist('files')
+    if not files or files[0].filename == '': return jsonify({'success': False, 'message': 'No files selected'}), 400
+    model_id = str(uuid.uuid4()); model_upload_path = os.path.join(app.config['UPLOAD_FOLDER'], model_id)
+    os.makedirs(model_upload_path)
+    try:
+        for file in files:
+            if file: file.save(os.path.join(model_upload_path, secure_filename(file.filename)))
+        return jsonify({'success': True, 'modelId': model_id, 'jobId': start_model_optimization(model_upload_path), 'message': 'Files uploaded.'})
+    except Exception as e:
+        traceback.print_exc(); return jsonify({'success': False, 'message': str(e)}), 500
+
+@app.route('/api/model_uploads', methods=['POST'])
+def create_model_upload():
+    data = request.get_json(silent=True) or {}
+    try: return jsonify(MODEL_UPLOADS.create(data.get('files'))), 201
+    except UploadError as e: return jsonify({"error": str(e)}), e.status_code
+
+@app.route('/api/model_uploads/<upload_id>', methods=['GET', 'DELETE'])
+def model_upload_status(upload_id):
+    try:
+        if request.method == 'DELETE': MODEL_UPLOADS.abort(upload_id); return jsonify({"status": "aborted"})
+        return jsonify(MODEL_UPLOADS.status(upload_id))
+    except UploadError as e: return jsonify({"error": str(e)}), e.status_code
+
+@app.route('/api/model_uploads/<upload_id>/files/<filename>', methods=['PUT'])
+def put_model_upload_chunk(upload_id, filename):
+    # The chunk body is streamed to disk as it arrives; a 409 carries the offset to resume from.
+    offset = request.args.get('offset', type=int)
+    if offset is None or offset < 0: return jsonify({"error": "A non-negative offset is required."}), 400
+    try: return jsonify({"received": MODEL_UPLOADS.write_chunk(upload_id, filename, offset, request.stream)})
+    except UploadError as e: return jsonify({"error": str(e), "received": e.received}), e.status_code
+
+@app.route('/api/model_uploads/<upload_id>/complete', methods=['POST'])
+def complete_model_upload(upload_id):
+    try: model_dir = MODEL_UPLOADS.complete(upload_id)
+    except UploadError as e: return jsonify({"error": str(e)}), e.status_code
+    return jsonify({'success': True, 'modelId': upload_id, 'jobId': start_model_optimization(model_dir), 'message': 'Files uploaded.'})
+
+@app.route('/api/models/<model_id>')
+def get_model_info(model_id):
+    model_dir = safe_join(app.config['UPLOAD_FOLDER'], model_id)
+    if model_dir is None or not os.path.isdir(model_dir): abort(404, "Model not found")
+    files = sorted(f for f in os.listdir(model_dir) if os.path.isfile(os.path.join(model_dir, f)))
+    return jsonify({'modelId': model_id, 'files': files, 'optimized': mesh_optimizer.read_manifest(model_dir)})
+
+@app.route('/api/models/<model_id>/files/<path:filename>')
+def get_model_file(model_id, filename):
+    model_dir = safe_join(app.config['UPLOAD_FOLDER'], model_id)
+    path = safe_join(model_dir, filename) if model_dir else None
+    if path is None or not os.path.isfile(path): abort(404, "Model file not found")
+    mimetype = 'model/gltf-binary' if filename.endswith('.glb') else None
+    response = send_precompressed(model_dir, filename, mimetype=mimetype)
+    response.cache_control.max_age = 3600
+    return response
+
+@app.route('/inspector/<model_id>')
+def inspector(model_id):
+    model_dir = os.path.join(app.config['UPLOAD_FOLDER'], model_id)
+    if not os.path.isdir(model_dir): abort(404, "Model not found")
+    obj_filename = next((f for f in os.listdir(model_dir) if f.lower().endswith('.obj')), None)
+    mtl_filename = next((f for f in os.listdir(model_dir) if f.lower().endswith('.mtl')), None)
+    if not obj_filename: return "No .obj file found.", 404
+    # The optimized GLB is served when its background conversion has finished; until then the viewer parses the OBJ.
+    manifest = mesh_optimizer.read_manifest(model_dir)
+    glb_path = url_for('get_model_file', model_id=model_id, filename=manifest['glb']) if manifest else ""
+    return render_template('obj.html', model_id=model_id, model_obj_path=f"/static/uploads/{model_id}/{obj_filename}", model_mtl_path=f"/static/uploads/{model_id}/{mtl_filename}" if mtl_filename else "", model_glb_path=glb_path)
+
+@app.route('/api/elevation_layers')
+def list_elevation_layers():
+    # Layers the background indexer hasn't reached yet are listed as pending, without stats; the viewer asks again for them.
+    layers = []
+    for layer in CATALOG.list('elevation'):
+        if layer.get('error'): continue
+        entry = {"id": layer['id'], "name": os.path.splitext(layer['id'])[0].replace('_', ' ').title()}
+        if layer['info']: stats = layer['info']['stats'][0]; entry['stats'] = {'min': stats['sample_min'], 'max': stats['sample_max']}
+        else: entry.update(stats=None, pending=True)
+        layers.append(entry)
+    return jsonify(layers)
+
+@app.route('/api/vector_layers')
+def list_vector_layers():
+    layers = [{"id": layer['id'], "name": os.path.splitext(layer['id'])[0].replace('_', ' ').replace('-', ' ').title(), **({"bounds": layer['info']['bounds'], "feature_count": layer['info']['feature_count']} if layer['info'] else {})} for layer in CATALOG.list('vector')]
+    return jsonify(sorted(layers, key=lambda x: x['name']))
+
+@app.route('/api/raster_layers')
+def list_raster_layers():
+    layers = []
+    for layer in CATALOG.list('raster'):
+        if layer.get('error'): continue
+        entry = {"id": layer['id'], "name": os.path.splitext(layer['id'])[0].replace('_', ' ').title()}
+        if layer['info']: entry.update(bands=layer['info']['bands'], stats=[{'min': s['min'], 'max': s['max']} for s in layer['info']['stats']])
+        else: entry.update(bands=None, stats=None, pending=True)
+        layers.append(entry)
+    return jsonify(layers)
+
+@app.route('/api/pointcloud_layers')
+def list_pointcloud_layers():
+    if not os.path.isdir(POINTCLOUD_DATA_PATH): return jsonify([])
+    all_files = []
+    for pattern in ['*.las', '*.laz']:
+        all_files.extend(glob.glob(os.path.join(POINTCLOUD_DATA_PATH, pattern)))
+    return jsonify([{"id": os.path.basename(f), "name": os.path.splitext(os.path.basename(f))[0]} for f in sorted(all_files)])
+
+def preprocess_point_cloud(filename):
+    pc_path = safe_join(POINTCLOUD_DATA_PATH, filename)
+    if pc_path is None or safe_join(CACHE_PATH, filename) is None: raise RuntimeError("Point cloud file not found.")
+    base_name = os.path.splitext(filename)[0]
+    meta_path = os.path.join(CACHE_PATH, f"{base_name}.json")
+
+    if os.path.exists(meta_path):
+        with open(meta_path, 'r') as f:
+            meta = json.load(f)
+        if meta.get('format') == pointcloud.CACHE_FORMAT: return meta
+        print(f"Cached buffers for {filename} are in an older format; re-processing...")
+    else:
+        print(f"Pre-processing {filename} for the first time...")
+
+    try:
+        return pointcloud.preprocess(pc_path, CACHE_PATH, base_name)
+    except Exception as e:
+        traceback.print_exc()
+        raise RuntimeError(f"Failed during pre-processing: {str(e)}")
+
+
+@app.route('/api/get_pointcloud_metadata/<path:filename>')
+def get_pointcloud_metadata(filename):
+    try:
+        metadata = preprocess_point_cloud(filename)
+        return jsonify(metadata)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/pointcloud_hierarchy/<path:filename>')
+def get_pointcloud_hierarchy(filename):
+    try:
+        return jsonify(pointcloud.read_hierarchy(CACHE_PATH, preprocess_point_cloud(filename)))
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+def send_precompressed(directory, filename, mimetype='application/octet-stream'):
+    # Whole-file requests get a pre-compressed variant when the client accepts one; Range requests
+    # always address the identity bytes, so partial buffers can be streamed and resumed.
+    path = safe_join(directory, filename)
+    if path is None or not os.path.isfile(path): abort(404, "File not found.")
+    if not request.range:
+        for encoding, suffix in (('br', '.br'), ('gzip', '.gz')):
+            if request.accept_encodings[encoding] and os.path.exists(path + suffix):
+                response = send_file(path + suffix, mimetype=mimetype)
+                response.headers['Content-Encoding'] = encoding
+                response.vary.add('Accept-Encoding')
+                return response
+    response = send_from_directory(directory, filename, mimetype=mimetype)
+    response.accept_ranges = 'bytes'
+    response.vary.add('Accept-Encoding')
+    return response
+
+@app.route('/api/pointcloud_node/<path:filename>/<node_id>')
+def get_pointcloud_node(filename, node_id):
+    if not re.fullmatch(r'r[0-7]*', node_id): abort(400, "Invalid octree node id.")
+    node_dir = safe_join(CACHE_PATH, f"{os.path.splitext(filename)[0]}_octree")
+    if node_dir is None or not os.path.exists(os.path.join(node_dir, f"{node_id}.bin")):
+        abort(404, "Octree node not found.")
+    response = send_precompressed(node_dir, f"{node_id}.bin")
+    response.cache_control.max_age = 86400
+    return response
+
+@app.route('/api/get_pointcloud_data/<path:filename>')
+def get_pointcloud_binary_data(filename):
+    path = safe_join(CACHE_PATH, filename)
+    if path is None or not os.path.isfile(path):
+        abort(404, "Pre-processed data file not found.")
+    return send_precompressed(CACHE_PATH, filename)
+
+@app.route('/api/layer_bounds/<layer_type>/<path:layer_filename>')
+def get_layer_bounds(layer_type, layer_filename):
+    try:
+        path = None; source_path_map = {'dem': ELEVATION_DATA_PATH, 'raster': RASTER_DATA_PATH, 'pointcloud': POINTCLOUD_DATA_PATH}
+        if layer_type in source_path_map: path = os.path.join(source_path_map[layer_type], layer_filename)
+        if layer_type == 'raster' and not os.path.exists(path): path = os.path.join(CACHE_PATH, layer_filename)
+        elif layer_type == 'vector':
+            vector_path = VECTOR_STORE.find(layer_filename)
+            if not vector_path: return jsonify({"error": "Vector file not found"}), 404
+            return jsonify({"bounds": VECTOR_STORE.info(vector_path)['bounds']})
+        elif layer_type == 'pointcloud' and pdal:
+            if not path or not os.path.exists(path):
+                return jsonify({"error": "Point cloud file not found on server"}), 404
+            try:
+                info = pdal.Pipeline(json.dumps([{"type":"readers.las","filename":path}])).quickinfo['readers.las']
+                b = info['bounds']
+                bounds = gpd.GeoDataFrame(geometry=[box(b['minx'],b['miny'],b['maxx'],b['maxy'])], crs=info['srs']['wkt']).to_crs("EPSG:4326").total_bounds
+                return jsonify({"bounds": list(bounds)})
+            except Exception as pdal_error:
+                error_message = f"PDAL failed to read '{layer_filename}'. The file may be corrupt or in an unsupported format. PDAL error: {str(pdal_error)}"
+                print(f"ERROR: {error_message}")
+                traceback.print_exc()
+                return jsonify({"error": error_message}), 500
+        catalog_kind = {'dem': 'elevation', 'raster': 'raster'}.get(layer_type)
+        layer = CATALOG.get(catalog_kind, layer_filename) if catalog_kind else None
+        if layer and layer['info'] and layer['info']['bounds']: return jsonify({"bounds": layer['info']['bounds']})
+        if path and os.path.exists(path):
+            with rasterio.open(path) as src: return jsonify({"bounds": list(transform_bounds(src.crs, "EPSG:4326", *src.bounds))})
+        return jsonify({"error": "File not found or layer type is invalid"}), 404
+    except Exception as e:
+        traceback.print_exc(); return jsonify({"error": str(e)}), 500
+
+
+@app.route('/api/vector_layer/<string:layer_filename>')
+def serve_vector_layer(layer_filename):
+    try:
+        path = VECTOR_STORE.find(layer_filename)
+        if not path: return jsonify({"error": f"Vector file not found: {layer_filename}"}), 404
+        return Response(VECTOR_STORE.geojson(path), mimetype='application/json')
+    except Exception as e:
+        traceback.print_exc(); return jsonify({"error": str(e)}), 500
+
+VECTOR_TILE_INDEXES = VectorTileIndexCache(VECTOR_STORE.load)
+
+@app.route('/api/vector_tile/<string:layer_filename>/metadata.json')
+def vector_tile_metadata(layer_filename):
+    path = VECTOR_STORE.find(layer_filename)
+    if not path: return jsonify({"error": f"Vector file not found: {layer_filename}"}), 404
+    try:
+        meta = VECTOR_TILE_INDEXES.get(path, os.path.splitext(layer_filename)[0]).metadata()
+        meta.update({"tiles": [url_for('serve_vector_tile', layer_filename=layer_filename, z=0, x=0, y=0).replace('/0/0/0.pbf', '/{z}/{x}/{y}.pbf')], "minzoom": 0, "maxzoom": VECTOR_TILE_MAX_ZOOM})
+        return jsonify(meta)
+    except Exception as e:
+        traceback.print_exc(); return jsonify({"error": str(e)}), 500
+
+@app.route('/api/vector_tile/<string:layer_filename>/<int:z>/<int:x>/<int:y>.pbf')
+def serve_vector_tile(layer_filename, z, x, y):
+    path = VECTOR_STORE.find(layer_filename)
+    if not path: return jsonify({"error": f"Vector file not found: {layer_filename}"}), 404
+    try:
+        with span('vector_index'): index = VECTOR_TILE_INDEXES.get(path, os.path.splitext(layer_filename)[0])
+        with span('mvt_encode'): data = index.tile(z, x, y)
+        resp = Response(data, mimetype='application/vnd.mapbox-vector-tile'); resp.add_etag(); resp.headers['Cache-Control'] = f"public, max-age={TILE_CACHE_MAX_AGE}"
+        return resp.make_conditional(request)
+    except Exception as e:
+        traceback.print_exc(); return jsonify({"error": str(e)}), 500
+
+@app.route('/api/raster_tile/<path:layer_filename>/<int:z>/<int:x>/<int:y>.png')
+def serve_raster_overlay_tile(layer_filename, z, x, y):
+    path = DATASET_POOL.resolve(layer_filename, CACHE_PATH, RASTER_DATA_PATH)
+    if not path: return "File not found", 404
+    if os.path.dirname(path) == CACHE_PATH: RESULTS.touch(layer_filename)
+    elif os.path.dirname(os.path.dirname(path)) == HYDRO_PATH: HYDRO_BUDGET.touch(os.path.dirname(path))
+    try:
+        params = {k: request.args[k] for k in RASTER_TILE_PARAMS if k in request.args}
+        return cached_tile_response(path, 'raster', z, x, y, params, lambda src, z, x0, y0, n: render_raster_metatile(src, z, x0, y0, n, params))
+    except Exception as e:
+        traceback.print_exc()
+        return Response(empty_tile_png(), mimetype='image/png')
+
+@app.route('/api/layer_bounds_polygon/<path:dem_id>')
+def get_layer_bounds_polygon(dem_id):
+    path = os.path.join(ELEVATION_DATA_PATH, dem_id)
+    if not os.path.exists(path): return jsonify({"error": "DEM not found"}), 404
+    try:
+        with rasterio.open(path) as src: b = src.bounds; geom = box(b.left, b.bottom, b.right, b.top)
+        return jsonify(json.loads(gpd.GeoDataFrame([1], geometry=[geom], crs=src.crs).to_crs(epsg=4326).to_json()))
+    except Exception as e:
+        traceback.print_exc(); return jsonify({"error": str(e)}), 500
+
+@app.route('/api/dem_tile/<path:filename>/<int:z>/<int:x>/<int:y>.png')
+def dem_tile_server(filename, z, x, y):
+    path = DATASET_POOL.resolve(filename, CACHE_PATH, ELEVATION_DATA_PATH)
+    if not path: return "Not Found", 404
+    try:
+        return cached_tile_response(path, 'dem', z, x, y, None, render_dem_metatile)
+    except Exception as e:
+        print(f"DEM tile error for {filename}: {e}")
+        return Response(empty_tile_png(), mimetype='image/png')
+
+@app.route('/api/generate_profile', methods=['POST'])
+def generate_profile():
+    data = request.get_json(); dem_filename = data.get('dem_filename'); line_coords = data.get('line')
+    if not dem_filename or not line_coords or len(line_coords) < 2: return jsonify({"error": "Invalid request."}), 400
+    dem_path = os.path.join(ELEVATION_DATA_PATH, dem_filename)
+    if not os.path.exists(dem_path): return jsonify({"error": "DEM file not found."}), 404
+    try:
+        with borrow_elevation_source(dem_path) as src:
+            with span('sample'): lons, lats, distances, elevs = sampling.profile(src, line_coords, spacing_m=data.get('spacing_m'))
+        elevs = sampling.to_json_values(elevs, digits=2)
+        profile_data = [{'lon': float(lon), 'lat': float(lat), 'distance': round(float(d), 2), 'elev': e} for lon, lat, d, e in zip(lons, lats, distances, elevs)]
+        return jsonify({"profile_data": profile_data})
+    except Exception as e:
+        traceback.print_exc(); return jsonify({"error": str(e)}), 500
+
+@app.route('/api/calculate_slope', methods=['POST'])
+def calculate_slope():
+    data = request.get_json()
+    if not data or 'dem_filename' not in data: return jsonify({"error": "DEM filename required."}), 400
+    dem_path = os.path.join(ELEVATION_DATA_PATH, data['dem_filename'])
+    if not os.path.exists(dem_path): return jsonify({"error": "DEM not found."}), 404
+    return run_cached_analysis('slope', data, [dem_path], {}, SUBSYSTEMS.deferred('analysis.slope'), dem_path, data['dem_filename'], CACHE_PATH)
+
+@app.route('/api/calculate_aspect', methods=['POST'])
+def calculate_aspect():
+    data = request.get_json()
+    if not data or 'dem_filename' not in data: return jsonify({"error": "DEM filename required."}), 400
+    dem_path = os.path.join(ELEVATION_DATA_PATH, data['dem_filename'])
+    if not os.path.exists(dem_path): return jsonify({"error": "DEM not found."}), 404
+    return run_cached_analysis('aspect', data, [dem_path], {}, SUBSYSTEMS.deferred('analysis.aspect'), dem_path, data['dem_filename'], CACHE_PATH)
+
+@app.route('/api/landslide_hazard', methods=['POST'])
+def landslide_hazard_analysis():
+    data = request.get_json(); dem_filename = data.get('dem_filename'); rainfall_mm = float(data.get('rainfall_mm', 50.0))
+    if not dem_filename: return jsonify({"error": "DEM filename required."}), 400
+    dem_path = os.path.join(ELEVATION_DATA_PATH, dem_filename)
+    if not os.path.exists(dem_path): return jsonify({"error": "DEM not found."}), 404
+    return run_cached_analysis('landslide_hazard', data, [dem_path], {'rainfall_mm': rainfall_mm}, SUBSYSTEMS.deferred('analysis.landslide_hazard'), dem_path, dem_filename, rainfall_mm, CACHE_PATH)
+
+@app.route('/api/query_elevation', methods=['POST'])
+def query_elevation():
+    data = request.get_json()
+    if not data or 'dem_filename' not in data or 'lon' not in data or 'lat' not in data: return "Invalid request", 400
+    path = os.path.join(ELEVATION_DATA_PATH, data['dem_filename'])
+    if not os.path.exists(path): return {"error": "DEM file not found"}, 404
+    try:
+        with borrow_elevation_source(path) as src: elev = sampling.to_json_values(sampling.sample_lonlat(src, [data['lon']], [data['lat']]))[0]
+        return jsonify({"elevation": elev, "lon": data['lon'], "lat": data['lat']})
+    except Exception as e:
+        traceback.print_exc(); return jsonify({"error": "Failed to process elevation"}), 500
+
+@app.route('/api/sample_elevation', methods=['POST'])
+def sample_elevation_batch():
+    data = request.get_json(); points = (data or {}).get('points')
+    if not data or 'dem_filename' not in data or not points: return jsonify({"error": "DEM filename and points required."}), 400
+    if len(points) > MAX_SAMPLE_POINTS: return jsonify({"error": f"At most {MAX_SAMPLE_POINTS} points per request."}), 400
+    path = os.path.join(ELEVATION_DATA_PATH, data['dem_filename'])
+    if not os.path.exists(path): return jsonify({"error": "DEM file not found."}), 404
+    try:
+        coords = np.asarray(points, dtype='float64').reshape(-1, 2)
+        with borrow_elevation_source(path) as src: elevs = sampling.sample_lonlat(src, coords[:, 0], coords[:, 1])
+        return jsonify({"elevations": sampling.to_json_values(elevs)})
+    except (TypeError, ValueError):
+        return jsonify({"error": "Points must be [lon, lat] pairs."}), 400
+    except Exception as e:
+        traceback.print_exc(); return jsonify({"error": str(e)}), 500
+
+@app.route('/api/stream_layer')
+def get_stream_layer():
+    for term in ['stream', 'river']:
+        path = VECTOR_STORE.find_matching(term)
+        if path:
+            try:
+                gdf = VECTOR_STORE.load(path)
+                return Response(gdf[gdf.is_valid].to_json(), mimetype='application/json')
+            except Exception as e:
+                return jsonify({"error": f"Error reading stream file: {str(e)}"}), 500
+    return jsonify({"error": "No stream or river shapefile found."}), 404
+
+# =========================================================================
+# === ANALYSIS JOB API ROUTES ===
+# =========================================================================
+
+@app.route('/api/jobs/<job_id>')
+def get_job(job_id):
+    record = JOBS.get(job_id)
+    if record is None: return jsonify({"error": "Job not found."}), 404
+    return jsonify(record)
+
+@app.route('/api/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    record = JOBS.cancel(job_id)
+    if record is None: return jsonify({"error": "Job not found."}), 404
+    return jsonify(record)
+
+@app.route('/api/jobs/<job_id>/result')
+def get_job_result(job_id):
+    record = JOBS.get(job_id)
+    if record is None: return jsonify({"error": "Job not found."}), 404
+    if record['status'] not in FINISHED_STATES: return jsonify({"error": "The job has not finished yet.", "status": record['status']}), 409
+    return job_result_response(record)
+
+def ingest_all_cogs(force=False):
+    results = ingest_directories([ELEVATION_DATA_PATH, RASTER_DATA_PATH, CACHE_PATH], COG_PATH, force=force)
+    COG_BUDGET.evict()
+    return results
+
+@app.route('/api/admin/ingest_cogs', methods=['POST'])
+def admin_ingest_cogs():
+    if ADMIN_TOKEN and request.headers.get('X-Admin-Token') != ADMIN_TOKEN: return jsonify({"error": "Forbidden"}), 403
+    try:
+        results = ingest_all_cogs(force=request.args.get('force') == '1')
+        return jsonify({"status": "success", "results": results})
+    except Exception as e:
+        traceback.print_exc(); return jsonify({"error": str(e)}), 500
+
+@app.cli.command('ingest-cogs')
+@click.option('--force', is_flag=True, help='Rebuild COGs even when they are newer than their source.')
+def ingest_cogs_command(force):
+    """Convert DEMs, rasters and cached analysis outputs into Cloud-Optimized GeoTIFFs."""
+    for result in ingest_all_cogs(force=force):
+        click.echo(f"{result['status']:>9}  {result['source']}" + (f"  ({result['error']})" if result.get('error') else ""))
+
+@app.cli.command('fake-upstreams')
+@click.option('--port', default=8900, show_default=True, help='Port for the fake weather/irradiance server.')
+def fake_upstreams_command(port):
+    """Serve deterministic Open-Meteo/OpenWeather stand-ins; point OPEN_METEO_BASE_URL and OPENWEATHER_BASE_URL at it."""
+    from fake_upstreams import create_app
+    create_app().run(port=port)
+
+@app.route('/metrics')
+def metrics():
+    # Scrapers can't always send custom headers, so a bearer token is accepted as well.
+    if ADMIN_TOKEN and ADMIN_TOKEN not in (request.headers.get('X-Admin-Token'), request.headers.get('Authorization', '').removeprefix('Bearer ')):
+        return jsonify({"error": "Forbidden"}), 403
+    return Response(METRICS.render(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+@app.route('/api/admin/import_report')
+def admin_import_report():
+    if ADMIN_TOKEN and request.headers.get('X-Admin-Token') != ADMIN_TOKEN: return jsonify({"error": "Forbidden"}), 403
+    return jsonify(SUBSYSTEMS.report())
+
+@app.cli.command('import-report')
+@click.option('--load', 'load_all', is_flag=True, help='Also load every lazy subsystem and time each one.')
+def import_report_command(load_all):
+    """Show how long the app took to import and what each lazily loaded subsystem cost."""
+    if load_all:
+        for name in SUBSYSTEMS.report()['pending']: SUBSYSTEMS.load(name, optional=name == 'pdal')
+    report = SUBSYSTEMS.report()
+    for entry in report['loaded']:
+        click.echo(f"{entry['seconds']:>8.3f}s  {entry['name']}" + ("" if entry['available'] else "  (not installed)"))
+    if report['pending']: click.echo(f"not loaded: {', '.join(report['pending'])}")
+
+SUBSYSTEMS.record('app', time.perf_counter() - BOOT_STARTED)
+# --- WORKER WARM-UP ---
+# WARM_UP_SUBSYSTEMS=all (or a comma list such as "analysis,solar") preloads in the background
+# once the worker has had WARM_UP_DELAY seconds to start serving.
+WARM_UP_SUBSYSTEMS = os.environ.get("WARM_UP_SUBSYSTEMS", "").strip()
+if WARM_UP_SUBSYSTEMS:
+    SUBSYSTEMS.warm_up(None if WARM_UP_SUBSYSTEMS == 'all' else [n.strip() for n in WARM_UP_SUBSYSTEMS.split(',') if n.strip()],
+                       delay=float(os.environ.get("WARM_UP_DELAY", 5)))
+
+if __name__ == "__main__":
+
+    app.run()
+
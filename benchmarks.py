@@ -0,0 +1,384 @@
+# benchmarks.py
+# Offline performance benchmarks: builds deterministic synthetic fixtures, drives the tile, profile,
+# analysis and point cloud endpoints through Flask's test client and the core functions directly,
+# and writes latency percentiles, throughput and peak RSS as JSON so two runs can be compared.
+#
+#   python benchmarks.py --out before.json
+#   python benchmarks.py --out after.json --compare before.json --max-regression 15
+#
+# Fixtures are generated once into --workdir (re-used while their spec is unchanged); analysis
+# outputs and rendered tiles are cleared before every run so "cold" numbers stay cold.
+
+import argparse
+import importlib
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+FIXTURE_VERSION = 1
+CENTER_LON, CENTER_LAT = 78.84, 10.39
+DEGREES_PER_METRE = 1 / 111_320.0
+
+# name -> (width/height in cells, CRS, cell size in metres); 'full' runs add the large DEM.
+DEM_FIXTURES = {
+    'dem_small_4326.tif': (512, 'EPSG:4326', 10.0),
+    'dem_medium_utm.tif': (2048, 'EPSG:32644', 10.0),
+}
+LARGE_DEM_FIXTURES = {'dem_large_3857.tif': (4096, 'EPSG:3857', 5.0)}
+MULTIBAND_FIXTURE = 'ortho_4band.tif'
+POLYGON_FIXTURE = 'buildings.shp'
+LAS_FIXTURE = 'synthetic.las'
+
+QUICK = {'polygons': 2_000, 'points': 200_000, 'tiles': 24, 'profiles': 20, 'floods': 3}
+FULL = {'polygons': 20_000, 'points': 3_000_000, 'tiles': 96, 'profiles': 100, 'floods': 6}
+
+
+# ==============================================================================
+# --- FIXTURES ---
+# ==============================================================================
+
+def _terrain(u, v, seed):
+    """Smooth hills and a valley over unit coordinates ``u``/``v``: a fixed sum of waves, so every run sees the same surface."""
+    rng = np.random.default_rng(seed)
+    z = 150.0 + 60.0 * np.exp(-((u - 0.3) ** 2 + (v - 0.6) ** 2) * 8) - 25.0 * np.exp(-((u - v) ** 2) * 40)
+    for _ in range(12):
+        fu, fv, phase, amp = rng.uniform(1, 24), rng.uniform(1, 24), rng.uniform(0, 2 * np.pi), rng.uniform(0.5, 6)
+        z += amp * np.sin(fu * u + phase) * np.cos(fv * v - phase)
+    return z
+
+
+def _grid_transform(size, crs, cell_m):
+    from pyproj import Transformer
+    from rasterio.transform import from_origin
+    if crs == 'EPSG:4326':
+        res = cell_m * DEGREES_PER_METRE; x0, y0 = CENTER_LON - size * res / 2, CENTER_LAT + size * res / 2
+    else:
+        cx, cy = Transformer.from_crs('EPSG:4326', crs, always_xy=True).transform(CENTER_LON, CENTER_LAT)
+        res = cell_m; x0, y0 = cx - size * res / 2, cy + size * res / 2
+    return from_origin(x0, y0, res, res)
+
+
+def _write_dem(path, size, crs, cell_m, seed):
+    import rasterio
+    v, u = np.mgrid[0:size, 0:size] / float(size)
+    z = _terrain(u, v, seed).astype('float32')
+    z[(u + v) < 0.08] = -9999  # a nodata corner, as on clipped survey tiles
+    with rasterio.open(path, 'w', driver='GTiff', width=size, height=size, count=1, dtype='float32', crs=crs, transform=_grid_transform(size, crs, cell_m),
+                       nodata=-9999, tiled=True, blockxsize=256, blockysize=256, compress='deflate', predictor=3) as dst:
+        dst.write(z, 1)
+
+
+def _write_multiband(path, size, seed):
+    import rasterio
+    v, u = np.mgrid[0:size, 0:size] / float(size)
+    base = _terrain(u, v, seed)
+    bands = [np.clip((base - 100) * k + off, 0, 255).astype('uint8') for k, off in ((1.6, 10), (1.2, 40), (0.8, 60), (2.0, -20))]
+    with rasterio.open(path, 'w', driver='GTiff', width=size, height=size, count=4, dtype='uint8', crs='EPSG:4326', transform=_grid_transform(size, 'EPSG:4326', 1.0),
+                       tiled=True, blockxsize=256, blockysize=256, compress='deflate') as dst:
+        dst.write(np.stack(bands))
+
+
+def _write_polygons(path, count, seed):
+    import geopandas as gpd
+    from pyproj import Transformer
+    from shapely import affinity, box
+    rng = np.random.default_rng(seed)
+    cx, cy = Transformer.from_crs('EPSG:4326', 'EPSG:32644', always_xy=True).transform(CENTER_LON, CENTER_LAT)
+    xs, ys = cx + rng.uniform(-4000, 4000, count), cy + rng.uniform(-4000, 4000, count)
+    widths, depths, angles = rng.uniform(6, 30, count), rng.uniform(6, 24, count), rng.uniform(0, 90, count)
+    geoms = [affinity.rotate(box(x - w / 2, y - d / 2, x + w / 2, y + d / 2), a) for x, y, w, d, a in zip(xs, ys, widths, depths, angles)]
+    gpd.GeoDataFrame({'height': np.round(rng.uniform(3, 45, count), 1), 'use': rng.choice(['res', 'com', 'ind'], count)}, geometry=geoms, crs='EPSG:32644').to_file(path)
+
+
+def _write_las(path, count, seed):
+    import pdal
+    from pyproj import Transformer
+    rng = np.random.default_rng(seed)
+    cx, cy = Transformer.from_crs('EPSG:4326', 'EPSG:32644', always_xy=True).transform(CENTER_LON, CENTER_LAT)
+    u, v = rng.random(count), rng.random(count)
+    points = np.zeros(count, dtype=[('X', 'f8'), ('Y', 'f8'), ('Z', 'f8'), ('Intensity', 'u2'), ('Classification', 'u1'), ('Red', 'u2'), ('Green', 'u2'), ('Blue', 'u2')])
+    points['X'], points['Y'] = cx - 1000 + u * 2000, cy + 1000 - v * 2000
+    points['Z'] = _terrain(u, v, seed) + np.where(rng.random(count) < 0.2, rng.uniform(2, 25, count), 0)
+    points['Classification'] = np.where(points['Z'] - _terrain(u, v, seed) > 1, 6, 2)
+    points['Intensity'] = rng.integers(0, 4096, count)
+    for band, k in (('Red', 180), ('Green', 220), ('Blue', 140)): points[band] = np.clip((points['Z'] - 100) * k, 0, 65535)
+    spec = [{"type": "writers.las", "filename": path, "minor_version": 4, "dataformat_id": 7, "scale_x": 0.001, "scale_y": 0.001, "scale_z": 0.001,
+             "offset_x": "auto", "offset_y": "auto", "offset_z": "auto", "a_srs": "EPSG:32644"}]
+    pdal.Pipeline(json.dumps(spec), arrays=[points]).execute()
+
+
+def build_fixtures(data_root, sizes, full):
+    """Write the fixture set under ``data_root`` (the app's data/Koushika) unless an identical set is already there."""
+    spec = {'version': FIXTURE_VERSION, 'sizes': sizes, 'full': full, 'pdal': has_pdal()}
+    spec_path = os.path.join(data_root, 'fixtures.json')
+    try:
+        with open(spec_path, 'r') as f:
+            if json.load(f) == spec: return spec
+    except (OSError, ValueError):
+        pass
+    for sub in ('elevation', 'tif', 'shp', 'point', 'cache'): shutil.rmtree(os.path.join(data_root, sub), ignore_errors=True); os.makedirs(os.path.join(data_root, sub))
+    dems = dict(DEM_FIXTURES, **(LARGE_DEM_FIXTURES if full else {}))
+    for i, (name, (size, crs, cell_m)) in enumerate(dems.items()):
+        print(f"Fixture: {name} ({size}x{size}, {crs})"); _write_dem(os.path.join(data_root, 'elevation', name), size, crs, cell_m, seed=100 + i)
+    print(f"Fixture: {MULTIBAND_FIXTURE}"); _write_multiband(os.path.join(data_root, 'tif', MULTIBAND_FIXTURE), 2048, seed=200)
+    print(f"Fixture: {POLYGON_FIXTURE} ({sizes['polygons']} polygons)"); _write_polygons(os.path.join(data_root, 'shp', POLYGON_FIXTURE), sizes['polygons'], seed=300)
+    if has_pdal():
+        print(f"Fixture: {LAS_FIXTURE} ({sizes['points']} points)"); _write_las(os.path.join(data_root, 'point', LAS_FIXTURE), sizes['points'], seed=400)
+    else:
+        print("PDAL is not installed; skipping the LAS fixture and point cloud benchmarks.")
+    with open(spec_path, 'w') as f: json.dump(spec, f)
+    return spec
+
+
+def has_pdal():
+    try:
+        import pdal  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+# ==============================================================================
+# --- MEASUREMENT ---
+# ==============================================================================
+
+def _rss_mb():
+    # ru_maxrss is the process high-water mark, in KiB on Linux and bytes on macOS.
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def _job_rss_mb():
+    import multiprocessing
+    peaks = []
+    for child in multiprocessing.active_children():
+        try:
+            with open(f"/proc/{child.pid}/status") as f: peaks += [int(line.split()[1]) / 1024 for line in f if line.startswith('VmHWM:')]
+        except OSError:
+            pass
+    return round(max(peaks), 1) if peaks else None
+
+
+class Runner:
+    def __init__(self, only=None):
+        self.only = only
+        self.results = {}
+
+    def wanted(self, name):
+        return not self.only or any(name.startswith(prefix) for prefix in self.only)
+
+    def measure(self, name, calls, **info):
+        """Time each zero-argument callable in ``calls``; a call returning False counts as a failure."""
+        if not self.wanted(name): return None
+        rss_before = _rss_mb(); latencies = []; failures = 0
+        started = time.perf_counter()
+        for call in calls:
+            t0 = time.perf_counter()
+            try:
+                if call() is False: failures += 1
+            except Exception as e:
+                failures += 1; print(f"  {name}: {type(e).__name__}: {e}")
+            latencies.append((time.perf_counter() - t0) * 1000.0)
+        elapsed = time.perf_counter() - started
+        if not latencies: return None
+        ms = np.asarray(latencies)
+        result = {
+            'iterations': len(latencies), 'failures': failures,
+            'latency_ms': {'min': round(float(ms.min()), 3), 'p50': round(float(np.percentile(ms, 50)), 3), 'p90': round(float(np.percentile(ms, 90)), 3),
+                           'p99': round(float(np.percentile(ms, 99)), 3), 'max': round(float(ms.max()), 3), 'mean': round(float(ms.mean()), 3)},
+            'throughput_per_s': round(len(latencies) / elapsed, 3) if elapsed > 0 else None,
+            'peak_rss_mb': _rss_mb(), 'rss_growth_mb': round(_rss_mb() - rss_before, 1), 'job_peak_rss_mb': _job_rss_mb(), **info,
+        }
+        self.results[name] = result
+        print(f"{name:<48} n={result['iterations']:<4} p50={result['latency_ms']['p50']:>10.2f} ms  p99={result['latency_ms']['p99']:>10.2f} ms  rss={result['peak_rss_mb']} MB"
+              + (f"  FAILED {failures}" if failures else ""))
+        return result
+
+
+def _ok(response):
+    return response.status_code in (200, 304)
+
+
+def _tiles_over(path, zoom_offset, count, seed):
+    """``count`` tiles (seeded pick) covering the raster at about its native zoom plus ``zoom_offset``."""
+    import math
+    import mercantile
+    import rasterio
+    from rasterio.warp import transform_bounds
+    with rasterio.open(path) as src:
+        west, south, east, north = transform_bounds(src.crs, 'EPSG:4326', *src.bounds)
+        metres = abs(src.transform.a) / (DEGREES_PER_METRE if src.crs.is_geographic else 1.0)
+    native = int(round(math.log2(156543.03 * math.cos(math.radians(CENTER_LAT)) / metres)))
+    tiles = list(mercantile.tiles(west, south, east, north, zooms=max(native + zoom_offset, 0)))
+    picks = np.random.default_rng(seed).permutation(len(tiles))[:count]
+    return [tiles[i] for i in sorted(picks)]
+
+
+def _viewport(path, zoom_offset, cols=6, rows=4):
+    """The ``cols`` x ``rows`` block of tiles a map view centred on the raster requests at about its native zoom plus ``zoom_offset``."""
+    import mercantile
+    tiles = _tiles_over(path, zoom_offset, 10 ** 9, seed=0)
+    xs, ys = sorted({t.x for t in tiles}), sorted({t.y for t in tiles}); z = tiles[0].z
+    cx, cy = xs[len(xs) // 2], ys[len(ys) // 2]
+    return [mercantile.Tile(x, y, z) for y in range(cy - rows // 2, cy - rows // 2 + rows) for x in range(cx - cols // 2, cx - cols // 2 + cols)]
+
+
+def _random_lines(src_path, count, seed):
+    import rasterio
+    from rasterio.warp import transform_bounds
+    with rasterio.open(src_path) as src: west, south, east, north = transform_bounds(src.crs, 'EPSG:4326', *src.bounds)
+    rng = np.random.default_rng(seed)
+    lons, lats = rng.uniform(west, east, (count, 4)), rng.uniform(south, north, (count, 4))
+    return [[[float(lo), float(la)] for lo, la in zip(lons[i], lats[i])] for i in range(count)]
+
+
+# ==============================================================================
+# --- BENCHMARKS ---
+# ==============================================================================
+
+def run_benchmarks(runner, sizes, full, ingest_cogs=False):
+    runner.measure("boot.import_app", [lambda: importlib.import_module('app')])
+    import app as server
+    if ingest_cogs: server.ingest_all_cogs()
+    import analysis
+    import geopandas as gpd
+    import mercantile
+    import sampling
+    import terrain
+    client = server.app.test_client()
+    dems = list(dict(DEM_FIXTURES, **(LARGE_DEM_FIXTURES if full else {})))
+
+    # Tiles: a cold pass renders every tile, the warm pass over the same tiles is served from the tile cache.
+    for name in dems:
+        path = os.path.join(server.ELEVATION_DATA_PATH, name)
+        for label, offset in (('native', 0), ('overview', -3)):
+            urls = [f"/api/dem_tile/{name}/{t.z}/{t.x}/{t.y}.png" for t in _tiles_over(path, offset, sizes['tiles'], seed=1)]
+            for phase in ('cold', 'warm'): runner.measure(f"endpoint.dem_tile.{phase}[{name}:{label}]", [lambda u=u: _ok(client.get(u)) for u in urls])
+        # A whole map view per call: neighbouring tiles are sliced from shared metatile renders.
+        views = [[f"/api/dem_tile/{name}/{t.z}/{t.x}/{t.y}.png" for t in _viewport(path, offset)] for offset in (-2, -1, 1)]
+        runner.measure(f"endpoint.dem_tile.viewport[{name}]", [lambda v=v: all([_ok(client.get(u)) for u in v]) for v in views], tiles=len(views[0]))
+    ortho = os.path.join(server.RASTER_DATA_PATH, MULTIBAND_FIXTURE)
+    tiles = _tiles_over(ortho, 0, sizes['tiles'], seed=2)
+    for label, query in (('rgb', 'r=1&g=2&b=3&p_mins=0,0,0&p_maxs=255,255,255'), ('colormap', 't=3&min=0&max=255&colormap=viridis')):
+        urls = [f"/api/raster_tile/{MULTIBAND_FIXTURE}/{t.z}/{t.x}/{t.y}.png?{query}" for t in tiles]
+        for phase in ('cold', 'warm'): runner.measure(f"endpoint.raster_tile.{phase}[{label}]", [lambda u=u: _ok(client.get(u)) for u in urls])
+        views = [[f"/api/raster_tile/{MULTIBAND_FIXTURE}/{t.z}/{t.x}/{t.y}.png?{query}" for t in _viewport(ortho, offset)] for offset in (-2, -1, 1)]
+        runner.measure(f"endpoint.raster_tile.viewport[{label}]", [lambda v=v: all([_ok(client.get(u)) for u in v]) for v in views], tiles=len(views[0]))
+    layer = os.path.splitext(POLYGON_FIXTURE)[0]
+    runner.measure("endpoint.vector_layer.cold", [lambda: _ok(client.get(f"/api/vector_layer/{POLYGON_FIXTURE}"))], layer=layer)
+    west, south, east, north = gpd.read_file(os.path.join(server.VECTOR_DATA_PATH, POLYGON_FIXTURE)).to_crs('EPSG:4326').total_bounds
+    for zoom, label in ((11, 'low'), (15, 'high')):
+        tiles = list(mercantile.tiles(west, south, east, north, zooms=zoom))[:sizes['tiles']]
+        urls = [f"/api/vector_tile/{POLYGON_FIXTURE}/{t.z}/{t.x}/{t.y}.pbf" for t in tiles]
+        for phase in ('cold', 'warm'): runner.measure(f"endpoint.vector_tile.{phase}[{label}]", [lambda u=u: _ok(client.get(u)) for u in urls])
+
+    # Profiles and point sampling, before and after the shared DEM arrays exist.
+    for name in dems:
+        path = os.path.join(server.ELEVATION_DATA_PATH, name)
+        lines = _random_lines(path, sizes['profiles'], seed=3)
+        runner.measure(f"endpoint.generate_profile[{name}]", [lambda ln=ln: _ok(client.post('/api/generate_profile', json={'dem_filename': name, 'line': ln})) for ln in lines])
+        server.DEM_ARRAYS.materialize(path)
+        runner.measure(f"endpoint.generate_profile.shared[{name}]", [lambda ln=ln: _ok(client.post('/api/generate_profile', json={'dem_filename': name, 'line': ln})) for ln in lines])
+        points = [p for ln in _random_lines(path, 2500, seed=4) for p in ln]
+        runner.measure(f"endpoint.sample_elevation[{name}]", [lambda: _ok(client.post('/api/sample_elevation', json={'dem_filename': name, 'points': points}))] * 5, points=len(points))
+        with server.DATASET_POOL.borrow(path) as src:
+            runner.measure(f"core.sampling.profile[{name}]", [lambda ln=ln: sampling.profile(src, ln) for ln in lines])
+            tiles = _tiles_over(path, 0, sizes['tiles'], seed=5)
+            runner.measure(f"core.render_dem_tile[{name}]", [lambda t=t: server.encode_tile(*server.render_dem_metatile(src, t.z, t.x, t.y, 1), 0, 0) for t in tiles])
+            runner.measure(f"core.render_dem_metatile[{name}]", [lambda t=t: server.render_dem_metatile(src, t.z, *server.metatile(t.z, t.x, t.y)) for t in tiles], metatile=server.METATILE_SIZE)
+
+    # Analyses: the first flood call also builds the hydrology products; later ones vary the inflow so the result cache misses.
+    hydrology = importlib.import_module('hydrology')
+    for name in dems[:2]:
+        path = os.path.join(server.ELEVATION_DATA_PATH, name)
+        inflow = {'lon': CENTER_LON + 0.002, 'lat': CENTER_LAT - 0.002}
+        flood = lambda rate: _ok(client.post('/api/channelized_flood_simulation', json={'dem_id': name, 'inflow_points': [dict(inflow, rate=rate)]}))
+        runner.measure(f"endpoint.channelized_flood.cold[{name}]", [lambda: flood(10.0)])
+        runner.measure(f"endpoint.channelized_flood.warm[{name}]", [lambda r=r: flood(20.0 + r) for r in range(sizes['floods'])])
+        runner.measure(f"endpoint.channelized_flood.cached[{name}]", [lambda: flood(10.0)] * sizes['floods'])
+        runner.measure(f"endpoint.calculate_slope.cold[{name}]", [lambda: _ok(client.post('/api/calculate_slope', json={'dem_filename': name}))])
+        if runner.wanted('core.channelized_flood'): hydrology.HydrologyCache(server.HYDRO_PATH).get(path)  # time the analysis, not the one-off product build
+        runner.measure(f"core.channelized_flood[{name}]", [lambda r=r: analysis.channelized_flood(path, [dict(inflow, rate=30.0 + r)], server.CACHE_PATH, server.HYDRO_PATH, server.DEM_ARRAYS, cache_filename='bench_flood.tif')
+                                                           for r in range(sizes['floods'])])
+        runner.measure(f"core.compute_derivatives.slope[{name}]", [lambda: terrain.compute_derivatives(path, {os.path.join(server.CACHE_PATH, 'bench_slope.tif'): 'slope_degrees'})] * 3)
+
+    # Point clouds: the first metadata request preprocesses the LAS into the viewer's buffers.
+    if has_pdal() and os.path.exists(os.path.join(server.POINTCLOUD_DATA_PATH, LAS_FIXTURE)):
+        import pointcloud
+        runner.measure("endpoint.pointcloud_metadata.cold", [lambda: _ok(client.get(f"/api/get_pointcloud_metadata/{LAS_FIXTURE}"))], points=sizes['points'])
+        runner.measure("endpoint.pointcloud_hierarchy", [lambda: _ok(client.get(f"/api/pointcloud_hierarchy/{LAS_FIXTURE}"))] * 5)
+        runner.measure("core.pointcloud.preprocess", [lambda: pointcloud.preprocess(os.path.join(server.POINTCLOUD_DATA_PATH, LAS_FIXTURE), server.CACHE_PATH, 'bench_points')], points=sizes['points'])
+    server.DATASET_POOL.close()
+
+
+def compare(results, baseline, max_regression):
+    """Print p50 changes against ``baseline``; returns the names that slowed down by more than ``max_regression`` percent."""
+    regressions = []
+    print(f"\n{'benchmark':<48} {'before p50':>12} {'after p50':>12} {'change':>9}")
+    for name, result in results.items():
+        before = baseline.get(name)
+        if not before: continue
+        old, new = before['latency_ms']['p50'], result['latency_ms']['p50']
+        change = (new - old) / old * 100.0 if old > 0 else 0.0
+        flag = max_regression is not None and change > max_regression
+        if flag: regressions.append(name)
+        print(f"{name:<48} {old:>10.2f}ms {new:>10.2f}ms {change:>+8.1f}%" + ("  REGRESSION" if flag else ""))
+    return regressions
+
+
+def _git_revision():
+    try: return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_DIR, capture_output=True, text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError): return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark tiles, profiles, analyses and point clouds against synthetic fixtures.")
+    parser.add_argument('--out', help="Write the JSON report here (default: stdout).")
+    parser.add_argument('--workdir', default=os.path.join(tempfile.gettempdir(), 'koushika-bench'), help="Where fixtures and caches live; re-used between runs.")
+    parser.add_argument('--full', action='store_true', help="Larger fixtures (adds a 4096x4096 DEM) and more iterations.")
+    parser.add_argument('--only', help="Comma-separated benchmark name prefixes, e.g. endpoint.dem_tile,core.")
+    parser.add_argument('--ingest-cogs', action='store_true', help="Serve tiles from COG copies, as a deployment that ran `flask ingest-cogs` would.")
+    parser.add_argument('--compare', help="A previous JSON report to compare p50 latencies against.")
+    parser.add_argument('--max-regression', type=float, help="With --compare, exit non-zero when any p50 is this many percent slower.")
+    args = parser.parse_args(argv)
+
+    sizes = FULL if args.full else QUICK
+    data_root = os.path.join(args.workdir, 'data', 'Koushika')
+    os.makedirs(data_root, exist_ok=True)
+    build_fixtures(data_root, sizes, args.full)
+    # Outputs from a previous run would turn cold measurements into cache hits.
+    shutil.rmtree(os.path.join(data_root, 'cache'), ignore_errors=True)
+
+    # app.py derives its data paths from the working directory, so it is imported from inside the workdir.
+    os.chdir(args.workdir); sys.path.insert(0, REPO_DIR)
+    os.environ.setdefault('CATALOG_BACKGROUND_INDEX', '0')
+    runner = Runner(only=[p.strip() for p in args.only.split(',')] if args.only else None)
+    run_benchmarks(runner, sizes, args.full, args.ingest_cogs)
+
+    report = {
+        'meta': {'created': time.strftime('%Y-%m-%dT%H:%M:%S%z'), 'revision': _git_revision(), 'python': platform.python_version(), 'platform': platform.platform(),
+                 'cpus': os.cpu_count(), 'full': args.full, 'ingest_cogs': args.ingest_cogs, 'pdal': has_pdal(), 'sizes': sizes},
+        'results': runner.results,
+    }
+    if args.out:
+        with open(args.out, 'w') as f: json.dump(report, f, indent=2)
+        print(f"Wrote {args.out}")
+    else:
+        print(json.dumps(report, indent=2))
+    if args.compare:
+        with open(args.compare, 'r') as f: baseline = json.load(f)['results']
+        if compare(runner.results, baseline, args.max_regression): return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,70 @@
+# cog.py
+
+import hashlib
+import os
+
+import rasterio
+import rasterio.shutil
+from rasterio.warp import transform_bounds
+
+RASTER_EXTENSIONS = ('.tif', '.tiff')
+COG_OPTIONS = {'COMPRESS': 'DEFLATE', 'BLOCKSIZE': 512, 'OVERVIEW_RESAMPLING': 'AVERAGE', 'BIGTIFF': 'IF_SAFER', 'NUM_THREADS': 'ALL_CPUS'}
+
+
+def cog_path_for(cog_dir, source_path):
+    """Location of the Cloud-Optimized copy of ``source_path`` inside ``cog_dir``."""
+    source_path = os.path.abspath(source_path)
+    digest = hashlib.sha1(source_path.encode('utf-8')).hexdigest()[:8]
+    return os.path.join(cog_dir, f"{os.path.splitext(os.path.basename(source_path))[0]}_{digest}.tif")
+
+
+def current_cog(cog_dir, source_path):
+    """Return the COG for ``source_path`` if one exists and is newer than the source, else ``None``."""
+    cog_path = cog_path_for(cog_dir, source_path)
+    try:
+        return cog_path if os.stat(cog_path).st_mtime_ns >= os.stat(source_path).st_mtime_ns else None
+    except OSError:
+        return None
+
+
+def convert_to_cog(source_path, cog_dir, force=False):
+    cog_path = cog_path_for(cog_dir, source_path)
+    if not force and current_cog(cog_dir, source_path): return cog_path, False
+    os.makedirs(cog_dir, exist_ok=True)
+    tmp_path = f"{cog_path}.{os.getpid()}.tmp"
+    try:
+        # The COG driver tiles the data and writes internal overviews down to a single block.
+        rasterio.shutil.copy(source_path, tmp_path, driver='COG', **COG_OPTIONS)
+        os.replace(tmp_path, cog_path)
+    finally:
+        if os.path.exists(tmp_path): os.remove(tmp_path)
+    return cog_path, True
+
+
+def ingest_directories(directories, cog_dir, force=False):
+    results = []
+    for directory in directories:
+        if not os.path.isdir(directory): continue
+        for fname in sorted(os.listdir(directory)):
+            if not fname.lower().endswith(RASTER_EXTENSIONS): continue
+            source_path = os.path.join(directory, fname)
+            try:
+                cog_path, converted = convert_to_cog(source_path, cog_dir, force=force)
+                results.append({"source": source_path, "cog": os.path.basename(cog_path), "status": "converted" if converted else "current"})
+            except Exception as e:
+                print(f"COG ingestion failed for {source_path}: {e}")
+                results.append({"source": source_path, "status": "error", "error": str(e)})
+    return results
+
+
+def pick_overview_level(src, dst_bounds, dst_crs='EPSG:3857', dst_size=256):
+    """Index of the coarsest overview that still meets the destination resolution, or ``None`` for full resolution."""
+    factors = src.overviews(1)
+    if not factors: return None
+    left, bottom, right, top = transform_bounds(dst_crs, src.crs, *dst_bounds)
+    target_res = min((right - left) / dst_size, (top - bottom) / dst_size)
+    source_res = max(abs(src.res[0]), abs(src.res[1]))
+    level = None
+    for i, factor in enumerate(factors):
+        if source_res * factor <= target_res: level = i
+    return level
@@ -0,0 +1,181 @@
+# dem_arrays.py
+
+import glob
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import numpy as np
+import rasterio
+from affine import Affine
+from numpy.lib.format import open_memmap
+from rasterio.coords import BoundingBox
+from rasterio.crs import CRS
+from rasterio.transform import array_bounds
+from rasterio.windows import Window
+
+from instrumentation import span
+from result_cache import DiskBudget
+
+DECODE_ROWS = 1024  # rows decoded per read, so materialising a large DEM never holds a second full copy
+
+
+class DemArray:
+    """Decoded float32 elevations with nodata as NaN, plus the georeferencing sampling needs.
+
+    It answers ``read(1, window=...)`` like an open dataset (with ``nodata`` None, since gaps are
+    already NaN), so ``sampling`` works on it unchanged.
+    """
+
+    def __init__(self, data, transform, crs, source_nodata):
+        self.data = data
+        self.transform = transform
+        self.crs = crs
+        self.source_nodata = source_nodata
+        self.nodata = None
+        self.height, self.width = data.shape
+        self.bounds = BoundingBox(*array_bounds(self.height, self.width, transform))
+
+    def read(self, band=1, window=None, out_dtype=None):
+        data = self.data if window is None else self.data[window.toslices()]
+        return np.array(data, dtype=out_dtype or data.dtype)
+
+
+def _decode_into(src, out):
+    for row in range(0, src.height, DECODE_ROWS):
+        block = src.read(1, window=Window(0, row, src.width, min(DECODE_ROWS, src.height - row)), out_dtype='float32')
+        if src.nodata is not None: block[block == src.nodata] = np.nan
+        out[row:row + block.shape[0]] = block
+
+
+def read_dem(path):
+    """Decode a DEM into private memory, for callers without a shared cache."""
+    with rasterio.open(path) as src:
+        data = np.empty((src.height, src.width), dtype='float32'); _decode_into(src, data)
+        return DemArray(data, src.transform, src.crs, src.nodata)
+
+
+class DemArrayCache:
+    """Decoded DEMs shared between processes as read-only memory-mapped ``.npy`` files under ``root``.
+
+    The first process to need a DEM version (path, mtime, size) decodes it once; every gunicorn
+    worker and job process then maps the same file, so its pages sit once in the OS page cache
+    however many workers there are, and repeat analyses skip decoding. Each process keeps its maps
+    in a small LRU registry with a borrow count per version: ``borrow`` pins an array, and neither
+    the registry trim, the unlinking of stale versions nor the disk budget (``max_bytes``, see
+    ``DiskBudget``) touches a pinned one until it is returned. Other processes' borrows are covered
+    by the budget's grace period, since every borrow marks the file as used.
+    The object pickles as its settings, so it can be handed to the job pool.
+    """
+
+    def __init__(self, root, max_attached=8, max_bytes=4 * 1024 ** 3):
+        self.root = root
+        self.max_attached = max_attached
+        self.budget = DiskBudget(root, max_bytes)
+        self._attached = OrderedDict()  # version -> [DemArray, borrow count]
+        self._lock = threading.Lock()
+        self.builds = 0
+        os.makedirs(root, exist_ok=True)
+
+    def __getstate__(self):
+        return {'root': self.root, 'max_attached': self.max_attached, 'budget': self.budget}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state, _attached=OrderedDict(), _lock=threading.Lock(), builds=0)
+
+    @staticmethod
+    def version(path):
+        stat = os.stat(path)
+        return os.path.abspath(path), stat.st_mtime_ns, stat.st_size
+
+    def _stem(self, version):
+        return os.path.join(self.root, hashlib.sha1(version[0].encode('utf-8')).hexdigest()[:16])
+
+    def _paths(self, version):
+        base = f"{self._stem(version)}_{version[1]}_{version[2]}"
+        return base + '.npy', base + '.json'
+
+    def _stem_of(self, version):
+        return os.path.basename(self._paths(version)[0])[:-len('.npy')]
+
+    def _borrowed(self):
+        with self._lock: return {self._stem_of(version) for version, (_, refs) in self._attached.items() if refs}
+
+    def ready(self, path):
+        return os.path.exists(self._paths(self.version(path))[0])
+
+    def materialize(self, path, progress=None):
+        """Decode ``path`` into the shared cache unless this version is already there; returns the array file."""
+        version = self.version(path)
+        array_path, meta_path = self._paths(version)
+        if os.path.exists(array_path): return array_path
+        tmp = f"{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with rasterio.open(path) as src:
+                out = open_memmap(f"{array_path}.{tmp}", mode='w+', dtype='float32', shape=(src.height, src.width))
+                with span('decode_dem'): _decode_into(src, out); out.flush(); del out
+                with open(f"{meta_path}.{tmp}", 'w') as f:
+                    json.dump({'source': version[0], 'transform': list(src.transform)[:6], 'crs': src.crs.to_wkt() if src.crs else None, 'nodata': src.nodata}, f)
+            # Metadata first: a visible .npy always has its metadata next to it.
+            os.replace(f"{meta_path}.{tmp}", meta_path); os.replace(f"{array_path}.{tmp}", array_path)
+        finally:
+            for leftover in (f"{array_path}.{tmp}", f"{meta_path}.{tmp}"):
+                if os.path.exists(leftover): os.remove(leftover)
+        self.builds += 1
+        borrowed = self._borrowed()
+        for stale in glob.glob(f"{self._stem(version)}_*"):
+            if stale not in (array_path, meta_path) and not stale.endswith('.tmp') and os.path.basename(stale).rsplit('.', 1)[0] not in borrowed:
+                try: os.remove(stale)
+                except OSError: pass
+        self.evict(keep=array_path)
+        if progress: progress(1.0, "DEM decoded")
+        return array_path
+
+    def evict(self, keep=None):
+        """Apply the disk budget, never to ``keep`` (an array file) or a borrowed array; returns the evicted stems."""
+        return self.budget.evict(keep=self._borrowed() | ({os.path.basename(keep)[:-len('.npy')]} if keep else set()))
+
+    def _acquire(self, path, refs):
+        version = self.version(path)
+        with self._lock:
+            entry = self._attached.get(version)
+            if entry is not None:
+                entry[1] += refs; self._attached.move_to_end(version)
+        if entry is None:
+            array_path = self.materialize(path)
+            with open(self._paths(version)[1], 'r') as f: meta = json.load(f)
+            dem = DemArray(np.load(array_path, mmap_mode='r'), Affine(*meta['transform']), CRS.from_wkt(meta['crs']) if meta['crs'] else None, meta['nodata'])
+            with self._lock:
+                entry = self._attached.setdefault(version, [dem, 0])
+                entry[1] += refs; self._attached.move_to_end(version)
+                self._trim()
+        self.budget.touch(self._paths(version)[0])
+        return version, entry[0]
+
+    def _trim(self):
+        # Least recently used first, skipping borrowed arrays; the registry may run over while they are out.
+        for version in [v for v, (_, refs) in self._attached.items() if not refs][:max(len(self._attached) - self.max_attached, 0)]:
+            del self._attached[version]
+
+    def get(self, path):
+        """The shared array for ``path``, decoding it first if no process has yet. It is not pinned; see ``borrow``."""
+        return self._acquire(path, 0)[1]
+
+    @contextmanager
+    def borrow(self, path):
+        """The shared array for ``path``, pinned against eviction and unlinking until the block exits."""
+        version, dem = self._acquire(path, 1)
+        try:
+            yield dem
+        finally:
+            with self._lock:
+                self._attached[version][1] -= 1
+                self._trim()
+
+    def stats(self):
+        files = glob.glob(os.path.join(self.root, '*.npy'))
+        return {'attached': len(self._attached), 'builds': self.builds, 'files': len(files), 'bytes': sum(os.path.getsize(f) for f in files),
+                'max_bytes': self.budget.max_bytes, 'evictions': self.budget.evictions}
@@ -0,0 +1,42 @@
+# fake_upstreams.py
+
+import math
+import os
+import time
+
+from flask import Flask, jsonify, request
+
+# Deterministic stand-ins for Open-Meteo and OpenWeather, for tests and offline development.
+# Point OPEN_METEO_BASE_URL / OPENWEATHER_BASE_URL at this server (see `flask fake-upstreams`).
+LATENCY_S = float(os.environ.get("FAKE_UPSTREAM_LATENCY_MS", 0)) / 1000.0
+
+
+def create_app():
+    fake = Flask(__name__)
+    fake.config['CALLS'] = 0
+
+    @fake.before_request
+    def simulate_latency():
+        fake.config['CALLS'] += 1
+        if LATENCY_S: time.sleep(LATENCY_S)
+
+    @fake.route('/v1/forecast')
+    def open_meteo_forecast():
+        lat = request.args.get('latitude', type=float); lon = request.args.get('longitude', type=float)
+        if lat is None or lon is None: return jsonify({"error": True, "reason": "latitude and longitude are required"}), 400
+        return jsonify({"latitude": lat, "longitude": lon, "current": {"time": int(time.time()) // 900 * 900, "precipitation": round(abs(math.sin(lat * 7 + lon * 3)) * 12, 1)}})
+
+    @fake.route('/data/3.0/onecall')
+    def openweather_onecall():
+        lat = request.args.get('lat', type=float); lon = request.args.get('lon', type=float)
+        if lat is None or lon is None or not request.args.get('appid'): return jsonify({"cod": 400, "message": "lat, lon and appid are required"}), 400
+        start = int(time.time()) // 3600 * 3600
+        hourly = [{"dt": start + h * 3600, "temp": 27 + 5 * math.sin(2 * math.pi * ((h + 14) % 24) / 24), "pressure": 1009, "dew_point": 22.0, "clouds": (h * 17) % 100}
+                  for h in range(48)]
+        return jsonify({"lat": lat, "lon": lon, "timezone": "Asia/Kolkata", "hourly": hourly})
+
+    @fake.route('/_calls')
+    def call_count():
+        return jsonify({"calls": fake.config['CALLS']})
+
+    return fake
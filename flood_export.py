@@ -0,0 +1,178 @@
+# flood_export.py
+# Vector export of cached flood rasters, written feature-batch by feature-batch so memory stays flat.
+
+import hashlib
+import json
+import os
+import traceback
+
+import numpy as np
+import pyarrow as pa
+import pyproj
+import rasterio
+import shapely
+from pyogrio.raw import write_arrow
+from rasterio.features import shapes
+from rasterio.windows import Window
+from skimage.morphology import skeletonize
+
+from jobs import AnalysisError
+
+FORMATS = {
+    'gpkg': {'driver': 'GPKG', 'extension': '.gpkg', 'mimetype': 'application/geopackage+sqlite3'},
+    'fgb': {'driver': 'FlatGeobuf', 'extension': '.fgb', 'mimetype': 'application/octet-stream'},
+    'geojson': {'driver': 'GeoJSON', 'extension': '.geojson', 'mimetype': 'application/geo+json', 'layer_options': {'RFC7946': 'YES'}},
+}
+DEFAULT_BREAKS = ()  # class boundaries in raster units; none exports a single flooded extent
+BATCH_SIZE = 1000
+SKELETON_TILE = 2048
+SKELETON_OVERLAP = 64  # context around each tile so the skeleton near its edges matches a whole-raster one
+CLASS_PROFILE = {'driver': 'GTiff', 'dtype': 'uint8', 'count': 1, 'nodata': 0, 'tiled': True, 'blockxsize': 256, 'blockysize': 256, 'compress': 'deflate'}
+SCHEMA = pa.schema([
+    ('kind', pa.string()), ('value_class', pa.int32()), ('min_value', pa.float64()), ('max_value', pa.float64()),
+    ('area_m2', pa.float64()), ('length_m', pa.float64()),
+    pa.field('geometry', pa.binary(), metadata={b'ARROW:extension:name': b'geoarrow.wkb'}),
+])
+# Skeleton pixels joined to these neighbours; the other four directions are covered from the neighbour's side.
+SEGMENT_OFFSETS = ((0, 1), (1, 0), (1, 1), (1, -1))
+GEOD = pyproj.Geod(ellps='WGS84')
+
+
+def _no_progress(fraction, message=None):
+    pass
+
+
+def _cache_key(raster_path, fmt, breaks):
+    stat = os.stat(raster_path)
+    raw = json.dumps([os.path.abspath(raster_path), stat.st_mtime_ns, stat.st_size, fmt, list(breaks)])
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()[:16]
+
+
+def _write_classes(src, path, breaks, progress):
+    """Class per cell (0 = dry) as a tiled uint8 raster, one source block at a time.
+
+    Depth results mark dry cells with 0 and water-surface results with nodata, so both count as dry.
+    Multi-band results (animation frames) are reduced to their per-cell maximum.
+    """
+    wet_cells = 0
+    with rasterio.open(path, 'w', width=src.width, height=src.height, crs=src.crs, transform=src.transform, **CLASS_PROFILE) as dst:
+        windows = [window for _, window in src.block_windows(1)]
+        for done, window in enumerate(windows):
+            data = src.read(window=window, masked=True).astype('float32')
+            values = np.ma.masked_invalid(data).max(axis=0).filled(np.nan)
+            classes = np.where(np.isfinite(values) & (values != 0), np.digitize(values, breaks) + 1, 0).astype('uint8')
+            wet_cells += int(np.count_nonzero(classes))
+            dst.write(classes, 1, window=window)
+            if done % 16 == 0: progress(0.3 * (done + 1) / len(windows), "Classifying flood depths")
+    return wet_cells
+
+
+def _measure(geoms, crs, kind):
+    if crs is not None and crs.is_geographic:
+        return np.array([abs(GEOD.geometry_area_perimeter(g)[0 if kind == 'area' else 1]) for g in geoms])
+    return shapely.area(geoms) if kind == 'area' else shapely.length(geoms)
+
+
+def _batch(kind, geoms, crs, value_class=None, breaks=None):
+    geoms = np.asarray(geoms, dtype=object)
+    n = len(geoms)
+    if kind == 'extent':
+        value_class = np.asarray(value_class, dtype='int32')
+        # Class k covers [breaks[k-2], breaks[k-1]); the first and last classes are open-ended.
+        bounds = np.array([np.nan] + list(breaks) + [np.nan])
+        columns = [pa.array([kind] * n), pa.array(value_class), pa.array(bounds[value_class - 1], from_pandas=True),
+                   pa.array(bounds[value_class], from_pandas=True), pa.array(_measure(geoms, crs, 'area')), pa.nulls(n, pa.float64())]
+    else:
+        columns = [pa.array([kind] * n), pa.nulls(n, pa.int32()), pa.nulls(n, pa.float64()), pa.nulls(n, pa.float64()),
+                   pa.nulls(n, pa.float64()), pa.array(_measure(geoms, crs, 'length'))]
+    return pa.RecordBatch.from_arrays(columns + [pa.array(shapely.to_wkb(geoms), type=pa.binary())], schema=SCHEMA)
+
+
+def _extent_batches(classes_ds, breaks):
+    # Polygonizing the band (not an array) lets GDAL walk the raster scanline by scanline.
+    band = rasterio.band(classes_ds, 1)
+    geoms, values = [], []
+    for geom, value in shapes(band, mask=band, connectivity=8, transform=classes_ds.transform):
+        geoms.append(shapely.geometry.shape(geom)); values.append(int(value))
+        if len(geoms) >= BATCH_SIZE:
+            yield _batch('extent', geoms, classes_ds.crs, values, breaks); geoms, values = [], []
+    if geoms: yield _batch('extent', geoms, classes_ds.crs, values, breaks)
+
+
+def _centerline_batches(classes_ds, progress):
+    """Skeleton of the wet mask as merged polylines, computed on overlapping tiles so memory is bounded by the tile size."""
+    height, width = classes_ds.height, classes_ds.width
+    tiles = [(row, col) for row in range(0, height, SKELETON_TILE) for col in range(0, width, SKELETON_TILE)]
+    transform = classes_ds.transform
+    for done, (row, col) in enumerate(tiles):
+        r0, c0 = max(row - SKELETON_OVERLAP, 0), max(col - SKELETON_OVERLAP, 0)
+        r1, c1 = min(row + SKELETON_TILE + SKELETON_OVERLAP, height), min(col + SKELETON_TILE + SKELETON_OVERLAP, width)
+        wet = classes_ds.read(1, window=Window(c0, r0, c1 - c0, r1 - r0)) > 0
+        progress(0.6 + 0.35 * (done + 1) / len(tiles), "Extracting centerlines")
+        if not wet.any(): continue
+        skeleton = skeletonize(wet)
+        rows, cols = np.nonzero(skeleton)
+        # Each tile keeps only segments that start in its core, so overlapping tiles never emit the same segment twice.
+        core = (rows + r0 >= row) & (rows + r0 < row + SKELETON_TILE) & (cols + c0 >= col) & (cols + c0 < col + SKELETON_TILE)
+        rows, cols = rows[core], cols[core]
+        starts, ends = [], []
+        for dr, dc in SEGMENT_OFFSETS:
+            nr, nc = rows + dr, cols + dc
+            inside = (nr >= 0) & (nr < skeleton.shape[0]) & (nc >= 0) & (nc < skeleton.shape[1])
+            linked = np.zeros(rows.shape, dtype=bool); linked[inside] = skeleton[nr[inside], nc[inside]]
+            starts.append(np.column_stack([rows[linked], cols[linked]])); ends.append(np.column_stack([nr[linked], nc[linked]]))
+        starts, ends = np.concatenate(starts), np.concatenate(ends)
+        if not len(starts): continue
+        coords = np.empty((len(starts), 2, 2))
+        for k, cells in enumerate((starts, ends)):
+            xs, ys = rasterio.transform.xy(transform, cells[:, 0] + r0, cells[:, 1] + c0)
+            coords[:, k, 0], coords[:, k, 1] = xs, ys
+        merged = shapely.line_merge(shapely.multilinestrings(shapely.linestrings(coords)))
+        lines = shapely.get_parts(merged)
+        for start in range(0, len(lines), BATCH_SIZE): yield _batch('centerline', lines[start:start + BATCH_SIZE], classes_ds.crs)
+
+
+def export_flood(raster_path, export_dir, fmt='gpkg', breaks=DEFAULT_BREAKS, progress=_no_progress):
+    """Flood extents (one polygon set per value class) and centerlines of a cached result raster, as one vector layer.
+
+    The export is cached under ``export_dir/flood`` keyed by the source raster, format and breaks, and
+    written through an Arrow stream of feature batches, so neither the features nor the file are ever
+    held in memory as a whole.
+    """
+    if fmt not in FORMATS: raise AnalysisError(f"Unsupported export format '{fmt}'. Choose one of: {', '.join(FORMATS)}.", 400)
+    breaks = tuple(sorted(float(b) for b in breaks))
+    if len(breaks) > 254: raise AnalysisError("At most 254 class breaks are supported.", 400)
+    spec = FORMATS[fmt]
+    key = _cache_key(raster_path, fmt, breaks)
+    relative = f"flood/{key}{spec['extension']}"
+    out_path = os.path.join(export_dir, relative)
+    result = {"download": relative, "download_name": f"{os.path.splitext(os.path.basename(raster_path))[0]}_flood{spec['extension']}", "mimetype": spec['mimetype']}
+    if os.path.exists(out_path):
+        os.utime(out_path)  # last use, for the disk budget's eviction order
+        return result
+
+    os.makedirs(os.path.dirname(out_path), exist_ok=True)
+    classes_path = f"{out_path}.classes.{os.getpid()}.tif"
+    tmp_path = f"{out_path}.{os.getpid()}.tmp{spec['extension']}"
+    try:
+        with rasterio.open(raster_path) as src:
+            if _write_classes(src, classes_path, breaks, progress) == 0: raise AnalysisError("The raster contains no flood data to export.", 422)
+            crs = src.crs
+        with rasterio.open(classes_path) as classes_ds:
+            def batches():
+                progress(0.3, "Vectorizing flood extents")
+                yield from _extent_batches(classes_ds, breaks)
+                yield from _centerline_batches(classes_ds, progress)
+            reader = pa.RecordBatchReader.from_batches(SCHEMA, batches())
+            write_arrow(reader, tmp_path, layer='flood', driver=spec['driver'], geometry_name='geometry', geometry_type='Unknown',
+                        crs=crs.to_wkt() if crs else None, layer_options=spec.get('layer_options'))
+        os.replace(tmp_path, out_path)
+        return result
+    except AnalysisError:
+        raise
+    except Exception as e:
+        traceback.print_exc()
+        raise AnalysisError(f"An error during flood export: {str(e)}", 500)
+    finally:
+        for path in (classes_path, tmp_path):
+            if os.path.exists(path): os.remove(path)
@@ -0,0 +1,98 @@
+# http_client.py
+
+import json
+import threading
+import time
+from collections import OrderedDict
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Query parameters holding coordinates; they are rounded before the request so nearby clicks share one cache entry.
+COORDINATE_PARAMS = ('lat', 'lon', 'latitude', 'longitude')
+
+
+class Upstream:
+    __slots__ = ('name', 'base_url', 'timeout', 'ttl', 'coord_decimals')
+
+    def __init__(self, name, base_url, timeout=(3.05, 10), ttl=300, coord_decimals=2):
+        self.name = name
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout  # (connect, read) seconds, as requests expects
+        self.ttl = ttl
+        self.coord_decimals = coord_decimals
+
+
+class _InFlight:
+    __slots__ = ('event', 'value', 'error')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class HttpClient:
+    """One pooled ``requests.Session`` for every third-party API, with a TTL cache and request coalescing.
+
+    Each upstream is registered once with its base URL (overridable, so a local fake server can stand
+    in), timeouts and cache TTL. Concurrent identical GETs share a single in-flight fetch; failures
+    are never cached. ``threading`` primitives are patched by gevent, so waiting callers yield.
+    """
+
+    def __init__(self, pool_size=16, max_entries=1024, retries=2):
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size,
+                              max_retries=Retry(total=retries, backoff_factor=0.3, status_forcelist=(502, 503, 504), allowed_methods=('GET',)))
+        self.session.mount('https://', adapter); self.session.mount('http://', adapter)
+        self.max_entries = max_entries
+        self._upstreams = {}
+        self._cache = OrderedDict()
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'coalesced': 0, 'upstream_calls': 0, 'errors': 0}
+
+    def register(self, name, base_url, **kwargs):
+        self._upstreams[name] = Upstream(name, base_url, **kwargs)
+
+    def upstream(self, name):
+        return self._upstreams[name]
+
+    def get_json(self, upstream_name, path, params=None):
+        # The decoded JSON is shared by every caller that hits the same entry, so treat it as read-only.
+        upstream = self._upstreams[upstream_name]
+        params = {k: (round(float(v), upstream.coord_decimals) if k in COORDINATE_PARAMS else v) for k, v in (params or {}).items()}
+        key = json.dumps([upstream_name, path, sorted(params.items())], default=str)
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._cache.move_to_end(key); self.stats['hits'] += 1
+                return entry[1]
+            pending = self._inflight.get(key)
+            leader = pending is None
+            if leader: pending = self._inflight[key] = _InFlight(); self.stats['misses'] += 1
+            else: self.stats['coalesced'] += 1
+        if not leader:
+            pending.event.wait()
+            if pending.error is not None: raise pending.error
+            return pending.value
+        try:
+            with self._lock: self.stats['upstream_calls'] += 1
+            response = self.session.get(f"{upstream.base_url}/{path.lstrip('/')}", params=params, timeout=upstream.timeout)
+            response.raise_for_status()
+            pending.value = response.json()
+            with self._lock:
+                self._cache[key] = (time.monotonic() + upstream.ttl, pending.value)
+                while len(self._cache) > self.max_entries: self._cache.popitem(last=False)
+            return pending.value
+        except Exception as e:
+            pending.error = e
+            with self._lock: self.stats['errors'] += 1
+            raise
+        finally:
+            with self._lock: self._inflight.pop(key, None)
+            pending.event.set()
+
+    def clear(self):
+        with self._lock: self._cache.clear()
@@ -0,0 +1,189 @@
+# hydrology.py
+
+import hashlib
+import json
+import os
+import shutil
+import threading
+
+import numpy as np
+import rasterio
+from pysheds.grid import Grid
+
+from instrumentation import span
+
+# D8 neighbours as (row, col) offsets, in pysheds' default dirmap order: N, NE, E, SE, S, SW, W, NW.
+D8_OFFSETS = np.array([(-1, 0), (-1, 1), (0, 1), (1, 1), (1, 0), (1, -1), (0, -1), (-1, -1)], dtype=np.int8)
+PYSHEDS_DIRMAP = (64, 128, 1, 2, 4, 8, 16, 32)
+NO_FLOW = -1
+PRODUCT_FILES = {'conditioned': 'conditioned.tif', 'flowdir': 'flowdir.tif', 'accumulation': 'accumulation.tif'}
+PRODUCT_PROFILE = {'driver': 'GTiff', 'count': 1, 'tiled': True, 'blockxsize': 256, 'blockysize': 256, 'compress': 'deflate', 'BIGTIFF': 'IF_SAFER'}
+HASH_CHUNK = 4 * 1024 * 1024
+
+
+def downstream_index(flowdir):
+    """Flat index of each cell's D8 receiver, or -1 where flow stops or leaves the raster."""
+    rows, cols = flowdir.shape
+    r, c = np.indices(flowdir.shape)
+    valid = flowdir >= 0
+    d = np.where(valid, flowdir, 0)
+    dr, dc = r + D8_OFFSETS[d, 0], c + D8_OFFSETS[d, 1]
+    inside = valid & (dr >= 0) & (dr < rows) & (dc >= 0) & (dc < cols)
+    return np.where(inside, dr * cols + dc, -1).ravel()
+
+
+def accumulate(flowdir, weights=None):
+    """D8 flow accumulation by peeling cells in topological order, one vectorized front per step."""
+    down = downstream_index(flowdir)
+    acc = np.ones(down.size) if weights is None else np.asarray(weights, dtype='float64').ravel().copy()
+    indegree = np.bincount(down[down >= 0], minlength=down.size)
+    front = np.flatnonzero(indegree == 0)
+    while front.size:
+        front = front[down[front] >= 0]
+        receivers = down[front]
+        np.add.at(acc, receivers, acc[front])
+        np.subtract.at(indegree, receivers, 1)
+        front = np.unique(receivers[indegree[receivers] == 0])
+    return acc.reshape(flowdir.shape)
+
+
+def trace_downstream(flowdir, rows, cols, max_steps=None, stop_mask=None):
+    """Follow every start cell down its D8 path in lockstep; returns the visited cells as (rows, cols, step)."""
+    height, width = flowdir.shape
+    rows, cols = np.asarray(rows, dtype=np.int64), np.asarray(cols, dtype=np.int64)
+    active = (rows >= 0) & (rows < height) & (cols >= 0) & (cols < width)
+    rows, cols = rows[active], cols[active]
+    visited = np.zeros(flowdir.shape, dtype=bool)
+    path_rows, path_cols, path_steps = [], [], []
+    step = 0
+    while rows.size and (max_steps is None or step < max_steps):
+        # A cell already visited by another path (or earlier on this one, i.e. a loop) ends the walk there.
+        fresh = ~visited[rows, cols]
+        rows, cols = rows[fresh], cols[fresh]
+        if not rows.size: break
+        visited[rows, cols] = True
+        path_rows.append(rows); path_cols.append(cols); path_steps.append(np.full(rows.size, step, dtype=np.int32))
+        if stop_mask is not None:
+            keep = ~stop_mask[rows, cols]; rows, cols = rows[keep], cols[keep]
+        d = flowdir[rows, cols]
+        moving = d >= 0
+        rows, cols, d = rows[moving], cols[moving], d[moving]
+        rows, cols = rows + D8_OFFSETS[d, 0], cols + D8_OFFSETS[d, 1]
+        inside = (rows >= 0) & (rows < height) & (cols >= 0) & (cols < width)
+        rows, cols = rows[inside], cols[inside]
+        step += 1
+    if not path_rows: return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int32)
+    return np.concatenate(path_rows), np.concatenate(path_cols), np.concatenate(path_steps)
+
+
+def snap_to_channel(accumulation, row, col, min_accumulation=100, radius=25):
+    """Nearest cell within ``radius`` whose accumulation reaches ``min_accumulation``; falls back to the cell itself."""
+    height, width = accumulation.shape
+    if not (0 <= row < height and 0 <= col < width): return None
+    r0, r1, c0, c1 = max(row - radius, 0), min(row + radius + 1, height), max(col - radius, 0), min(col + radius + 1, width)
+    rr, cc = np.nonzero(accumulation[r0:r1, c0:c1] >= min_accumulation)
+    if not rr.size: return row, col
+    nearest = np.argmin((rr + r0 - row) ** 2 + (cc + c0 - col) ** 2)
+    return int(rr[nearest] + r0), int(cc[nearest] + c0)
+
+
+class HydrologyProducts:
+    def __init__(self, directory, meta):
+        self.directory = directory
+        self.meta = meta
+
+    def path(self, product):
+        return os.path.join(self.directory, PRODUCT_FILES[product])
+
+    def relative_path(self, product, root):
+        return os.path.relpath(self.path(product), root).replace(os.sep, '/')
+
+    def read(self, product):
+        with rasterio.open(self.path(product)) as src:
+            return src.read(1), src.transform, src.crs, src.nodata
+
+
+class HydrologyCache:
+    """Conditioned DEM, D8 flow direction and full accumulation, built once per DEM content hash."""
+
+    def __init__(self, root):
+        self.root = root
+        self._hashes = {}
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    def content_hash(self, dem_path):
+        stat = os.stat(dem_path); key = (os.path.abspath(dem_path), stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            if key in self._hashes: return self._hashes[key]
+        # Hashing a large DEM is not free, so remember it per file version on disk as well.
+        memo_path = os.path.join(self.root, 'sources', hashlib.sha1(key[0].encode('utf-8')).hexdigest()[:16] + '.json')
+        try:
+            with open(memo_path, 'r') as f: memo = json.load(f)
+            if [memo['mtime_ns'], memo['size']] == [stat.st_mtime_ns, stat.st_size]: digest = memo['hash']
+            else: digest = None
+        except (OSError, ValueError, KeyError):
+            digest = None
+        if digest is None:
+            h = hashlib.sha1()
+            with open(dem_path, 'rb') as f:
+                for chunk in iter(lambda: f.read(HASH_CHUNK), b''): h.update(chunk)
+            digest = h.hexdigest()
+            os.makedirs(os.path.dirname(memo_path), exist_ok=True)
+            with open(memo_path, 'w') as f: json.dump({'source': key[0], 'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size, 'hash': digest}, f)
+        with self._lock: self._hashes[key] = digest
+        return digest
+
+    def get(self, dem_path, progress=None):
+        directory = os.path.join(self.root, self.content_hash(dem_path))
+        meta_path = os.path.join(directory, 'meta.json')
+        if os.path.exists(meta_path):
+            os.utime(directory)  # last use, for the disk budget's eviction order
+            with open(meta_path, 'r') as f: return HydrologyProducts(directory, json.load(f))
+        return self._build(dem_path, directory, progress)
+
+    def _build(self, dem_path, directory, progress):
+        report = progress or (lambda fraction, message=None: None)
+        tmp_dir = f"{directory}.{os.getpid()}.tmp"
+        os.makedirs(tmp_dir, exist_ok=True)
+        try:
+            report(0.05, "Reading DEM")
+            with span('read_dem'):
+                grid = Grid.from_raster(dem_path); dem = grid.read_raster(dem_path)
+                with rasterio.open(dem_path) as src: profile = dict(PRODUCT_PROFILE, width=src.width, height=src.height, crs=src.crs, transform=src.transform)
+            report(0.15, "Filling depressions")
+            with span('fill_depressions'): filled = grid.fill_depressions(dem)
+            with span('resolve_flats'): conditioned = grid.resolve_flats(filled)
+            report(0.45, "Computing flow direction")
+            with span('flowdir'): codes = np.asarray(grid.flowdir(conditioned, dirmap=PYSHEDS_DIRMAP))
+            flowdir = np.full(codes.shape, NO_FLOW, dtype=np.int8)
+            for i, code in enumerate(PYSHEDS_DIRMAP): flowdir[codes == code] = i
+            conditioned = np.asarray(conditioned, dtype='float32')
+            invalid = ~np.isfinite(conditioned) | (np.asarray(dem) == dem.nodata)
+            flowdir[invalid] = NO_FLOW
+            report(0.6, "Accumulating flow")
+            with span('accumulate'): accumulation = accumulate(flowdir).astype('float32')
+            accumulation[invalid] = -1
+            report(0.9, "Writing hydrology products")
+            with span('write_products'):
+                with rasterio.open(os.path.join(tmp_dir, PRODUCT_FILES['conditioned']), 'w', dtype='float32', nodata=-9999, predictor=3, **profile) as dst:
+                    dst.write(np.where(invalid, -9999, conditioned).astype('float32'), 1)
+                with rasterio.open(os.path.join(tmp_dir, PRODUCT_FILES['flowdir']), 'w', dtype='int8', nodata=NO_FLOW, **profile) as dst:
+                    dst.write(flowdir, 1)
+                with rasterio.open(os.path.join(tmp_dir, PRODUCT_FILES['accumulation']), 'w', dtype='float32', nodata=-1, predictor=3, **profile) as dst:
+                    dst.write(accumulation, 1)
+            valid_acc = accumulation[~invalid]
+            meta = {
+                'source': os.path.abspath(dem_path), 'hash': os.path.basename(directory), 'shape': list(flowdir.shape),
+                'accumulation_stats': {'min': 1.0, 'max': float(np.percentile(valid_acc, 99)) if valid_acc.size else 1.0, 'cells_max': float(valid_acc.max()) if valid_acc.size else 1.0},
+            }
+            with open(os.path.join(tmp_dir, 'meta.json'), 'w') as f: json.dump(meta, f)
+            try:
+                os.rename(tmp_dir, directory)
+            except OSError:
+                # Another worker finished the same DEM first; its products are identical.
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+            return HydrologyProducts(directory, meta)
+        except BaseException:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
@@ -0,0 +1,180 @@
+# instrumentation.py
+
+import bisect
+import contextvars
+import os
+import threading
+import time
+from collections import defaultdict
+
+# INSTRUMENTATION=0 turns every span into a shared no-op object: no clock reads, no locking.
+ENABLED = os.environ.get("INSTRUMENTATION", "1") != "0"
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+# Per-request (or per-job) state; contextvars follow greenlets under gevent, so concurrent requests don't mix.
+_route = contextvars.ContextVar('instrumented_route', default=None)
+_timings = contextvars.ContextVar('instrumented_timings', default=None)
+
+
+class _Histogram:
+    __slots__ = ('counts', 'count', 'total')
+
+    def __init__(self):
+        self.counts = [0] * len(BUCKETS)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, seconds):
+        i = bisect.bisect_left(BUCKETS, seconds)
+        if i < len(BUCKETS): self.counts[i] += 1
+        self.count += 1; self.total += seconds
+
+
+class Metrics:
+    """Per-process histograms of request and stage durations, in-flight gauges and response counters.
+
+    Each gunicorn worker keeps its own, so ``/metrics`` describes the worker that answered it; the
+    ``pid`` label keeps the series of different workers apart once scraped. Cache counters are read
+    from registered collectors at scrape time rather than being double-counted here.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._requests = defaultdict(_Histogram)  # route -> histogram
+        self._stages = defaultdict(_Histogram)  # (route, stage) -> histogram
+        self._responses = defaultdict(int)  # (route, status) -> count
+        self._in_flight = defaultdict(int)  # route -> count
+        self._collectors = []
+        self.started = time.time()
+
+    def observe_stage(self, route, stage, seconds):
+        with self._lock: self._stages[(route, stage)].observe(seconds)
+
+    def request_started(self, route):
+        with self._lock: self._in_flight[route] += 1
+
+    def request_finished(self, route, status, seconds):
+        with self._lock:
+            self._in_flight[route] -= 1
+            self._requests[route].observe(seconds)
+            self._responses[(route, status)] += 1
+
+    def register(self, collector):
+        """``collector()`` returns ``(name, type, help, [(labels, value), ...])`` tuples, evaluated on every scrape."""
+        self._collectors.append(collector)
+
+    def render(self):
+        """Prometheus text exposition format (version 0.0.4)."""
+        pid = str(os.getpid()); lines = []
+
+        def family(name, kind, help_text, samples):
+            lines.append(f"# HELP {name} {help_text}"); lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples: lines.append(f"{name}{_labels(dict(labels, pid=pid))} {_number(value)}")
+
+        def histograms(name, help_text, items):
+            lines.append(f"# HELP {name} {help_text}"); lines.append(f"# TYPE {name} histogram")
+            for labels, hist in items:
+                cumulative = 0
+                for bound, count in zip(BUCKETS, hist.counts):
+                    cumulative += count; lines.append(f"{name}_bucket{_labels(dict(labels, pid=pid, le=_number(bound)))} {cumulative}")
+                lines.append(f"{name}_bucket{_labels(dict(labels, pid=pid, le='+Inf'))} {hist.count}")
+                lines.append(f"{name}_sum{_labels(dict(labels, pid=pid))} {_number(hist.total)}")
+                lines.append(f"{name}_count{_labels(dict(labels, pid=pid))} {hist.count}")
+
+        with self._lock:
+            requests = sorted(self._requests.items()); stages = sorted(self._stages.items())
+            responses = sorted(self._responses.items()); in_flight = sorted(self._in_flight.items())
+        histograms("koushika_request_duration_seconds", "Time to produce a response, by route.", [({'route': r}, h) for r, h in requests])
+        histograms("koushika_stage_duration_seconds", "Time spent in each instrumented stage, by route (job:<kind> for the analysis pool).", [({'route': r, 'stage': s}, h) for (r, s), h in stages])
+        family("koushika_responses_total", "counter", "Responses sent, by route and status code.", [({'route': r, 'status': str(s)}, n) for (r, s), n in responses])
+        family("koushika_requests_in_flight", "gauge", "Requests currently being handled, by route.", [({'route': r}, n) for r, n in in_flight])
+        family("koushika_uptime_seconds", "gauge", "Seconds since this worker started collecting metrics.", [({}, time.time() - self.started)])
+        for collector in self._collectors:
+            try:
+                for name, kind, help_text, samples in collector(): family(name, kind, help_text, samples)
+            except Exception as e:
+                print(f"WARNING: Metrics collector failed: {e}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(labels):
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + "}" if labels else ""
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+METRICS = Metrics()
+
+
+class _Span:
+    __slots__ = ('stage', 'started')
+
+    def __init__(self, stage):
+        self.stage = stage
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        record(self.stage, time.perf_counter() - self.started)
+        return False
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self): return self
+
+    def __exit__(self, *exc): return False
+
+
+_NOOP = _NoopSpan()
+
+
+def span(stage):
+    """``with span('reproject'):`` times a stage for the current request's Server-Timing header and the route's histograms."""
+    return _Span(stage) if ENABLED else _NOOP
+
+
+def record(stage, seconds):
+    timings = _timings.get()
+    if timings is not None: timings.append((stage, seconds))
+    route = _route.get()
+    if route is not None: METRICS.observe_stage(route, stage, seconds)
+
+
+def begin(route):
+    """Start collecting for a request or job; returns the token ``end()`` needs."""
+    return _route.set(route), _timings.set([])
+
+
+def end(token):
+    timings = _timings.get()
+    _route.reset(token[0]); _timings.reset(token[1])
+    return timings or []
+
+
+def annotate(timings):
+    """Add stage times measured elsewhere (e.g. inside a job process) to the current request's Server-Timing only."""
+    current = _timings.get()
+    if current is not None: current.extend((stage, seconds) for stage, seconds in timings)
+
+
+def server_timing(timings, total=None):
+    """``Server-Timing`` header value; repeated stages (one reproject per band, say) are summed, in first-seen order."""
+    merged = {}
+    for stage, seconds in timings: merged[stage] = merged.get(stage, 0.0) + seconds
+    entries = [f"{_token(stage)};dur={seconds * 1000.0:.2f}" for stage, seconds in merged.items()]
+    if total is not None: entries.append(f"total;dur={total * 1000.0:.2f}")
+    return ", ".join(entries)
+
+
+def _token(stage):
+    return "".join(c if c.isalnum() or c in "-_." else "_" for c in stage)
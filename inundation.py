@@ -0,0 +1,161 @@
+# inundation.py
+
+import math
+
+import numpy as np
+import rasterio
+
+from terrain import METRES_PER_DEGREE_LAT, METRES_PER_DEGREE_LON
+
+GRAVITY = 9.81
+MANNING_N = 0.035
+WET_DEPTH = 0.01  # m; shallower water is not routed and not drawn
+ACTIVE_DEPTH = 1e-6  # m gained, lost or passed through a face in one step; cells moving less than this drop out of the window
+CFL_ALPHA = 0.7
+MAX_DT = 10.0
+FRAME_PROFILE = {'driver': 'GTiff', 'dtype': 'float32', 'tiled': True, 'blockxsize': 256, 'blockysize': 256, 'compress': 'deflate', 'predictor': 3, 'BIGTIFF': 'IF_SAFER'}
+
+
+def cell_size_metres(transform, crs, height):
+    dx, dy = abs(transform.a), abs(transform.e)
+    if crs is not None and crs.is_geographic:
+        lat = transform.f + transform.e * height / 2.0
+        return dx * METRES_PER_DEGREE_LON * math.cos(math.radians(lat)), dy * METRES_PER_DEGREE_LAT
+    return dx, dy
+
+
+class _ActiveWindow:
+    """Bounding box of cells that moved water last step plus a one-cell margin; everything outside it is skipped each step."""
+
+    def __init__(self, shape):
+        self.shape = shape
+        self.bounds = None
+
+    def include(self, rows, cols):
+        if not len(rows): return
+        r0, r1, c0, c1 = int(np.min(rows)), int(np.max(rows)) + 1, int(np.min(cols)), int(np.max(cols)) + 1
+        if self.bounds is not None:
+            r0, r1, c0, c1 = min(r0, self.bounds[0]), max(r1, self.bounds[1]), min(c0, self.bounds[2]), max(c1, self.bounds[3])
+        self.bounds = (r0, r1, c0, c1)
+
+    def update(self, active, qx, qy):
+        """Shrink to the ``active`` cells of the current window, then grow by one so a moving front can advance next step.
+
+        Faces the window gives up are zeroed, so no stale momentum comes back when it grows over them again.
+        """
+        old = self.slices()
+        r0, r1, c0, c1 = self.bounds
+        rr, cc = np.nonzero(active)
+        h, w = self.shape
+        self.bounds = (max(r0 + rr.min() - 1, 0), min(r0 + rr.max() + 2, h), max(c0 + cc.min() - 1, 0), min(c0 + cc.max() + 2, w)) if rr.size else None
+        if self.bounds == (r0, r1, c0, c1): return
+        for q, faces in ((qx, _x_faces), (qy, _y_faces)):
+            kept = q[faces(*self.slices())].copy() if self.bounds else None
+            q[faces(*old)] = 0
+            if kept is not None: q[faces(*self.slices())] = kept
+
+    def slices(self):
+        r0, r1, c0, c1 = self.bounds
+        return slice(r0, r1), slice(c0, c1)
+
+
+def _x_faces(rs, cs):
+    return rs, slice(cs.start, cs.stop - 1)
+
+
+def _y_faces(rs, cs):
+    return slice(rs.start, rs.stop - 1), cs
+
+
+def _step(z, depth, qx, qy, dx, dy, dt):
+    """One local-inertial (Bates et al. 2010) update of a window, in place."""
+    eta = z + depth
+    friction = np.float32(GRAVITY * dt * MANNING_N ** 2)
+    # Faces between columns j and j+1 (qx) and rows i and i+1 (qy, positive southwards).
+    for q, a, b, length in ((qx, np.s_[:, :-1], np.s_[:, 1:], dx), (qy, np.s_[:-1, :], np.s_[1:, :], dy)):
+        with np.errstate(invalid='ignore'):
+            # Faces touching a nodata wall give inf - inf = nan here, which never counts as wet.
+            h_flow = np.maximum(eta[a], eta[b]); h_flow -= np.maximum(z[a], z[b])
+            wet = h_flow > 1e-4
+            np.maximum(h_flow, 1e-4, out=h_flow)
+            q_new = q - np.float32(GRAVITY * dt / length) * h_flow * (eta[b] - eta[a])
+            q_new /= 1 + friction * np.abs(q) / (h_flow * h_flow * np.cbrt(h_flow))
+        q[...] = np.where(wet, q_new, 0)
+    # Scale down faces draining a cell faster than it holds water, so depths never go negative (mass stays conserved).
+    outflow = np.zeros_like(depth)
+    outflow[:, :-1] += np.maximum(qx, 0); outflow[:, 1:] -= np.minimum(qx, 0); outflow *= np.float32(dt / dx)
+    outflow_y = np.zeros_like(depth)
+    outflow_y[:-1, :] += np.maximum(qy, 0); outflow_y[1:, :] -= np.minimum(qy, 0); outflow += outflow_y * np.float32(dt / dy)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        limit = np.where(outflow > depth, depth / outflow, np.float32(1))
+    qx *= np.where(qx > 0, limit[:, :-1], limit[:, 1:])
+    qy *= np.where(qy > 0, limit[:-1, :], limit[1:, :])
+    depth[:, :-1] -= qx * np.float32(dt / dx); depth[:, 1:] += qx * np.float32(dt / dx)
+    depth[:-1, :] -= qy * np.float32(dt / dy); depth[1:, :] += qy * np.float32(dt / dy)
+    np.maximum(depth, 0, out=depth)
+
+
+def simulate(dem, transform, crs, out_path, rainfall_mm_hr=0.0, inflows=(), duration_s=3600.0, frames=12, nodata=-9999.0, progress=None):
+    """Run the diffusive-wave solver and write ``frames`` depth snapshots as bands of one tiled GeoTIFF.
+
+    ``inflows`` are ``(row, col, rate_m3_per_s)`` tuples; negative rates drain the cell. Each step only touches the bounding window of
+    cells whose water moved in the previous step; rain on cells outside it is credited lazily, so dry or still parts of the DEM cost
+    nothing per step.
+    Returns the maximum depth seen in any frame.
+    """
+    z = dem.astype('float32')
+    valid = np.isfinite(z)
+    height, width = z.shape
+    dx, dy = cell_size_metres(transform, crs, height)
+    # Nodata cells become walls: their bed is infinitely high so no face ever carries water into them.
+    z = np.where(valid, z, np.inf).astype('float32')
+    depth = np.zeros(z.shape, dtype='float32')
+    qx = np.zeros((height, width - 1), dtype='float32')
+    qy = np.zeros((height - 1, width), dtype='float32')
+    rain_rate = max(rainfall_mm_hr, 0.0) / 1000.0 / 3600.0
+    inflows = [(r, c, q) for r, c, q in inflows if 0 <= r < height and 0 <= c < width and valid[r, c] and q != 0]
+    # Cells around each source: kept in the window every step, since water is added there every step.
+    sources = ([rr for r, _, q in inflows if q > 0 for rr in (max(r - 1, 0), min(r + 1, height - 1))],
+               [cc for _, c, q in inflows if q > 0 for cc in (max(c - 1, 0), min(c + 1, width - 1))])
+    window = _ActiveWindow(z.shape)
+    frame_times = [duration_s * (k + 1) / frames for k in range(frames)]
+    # Rain is credited lazily: a cell receives everything that fell since its last credit when it is routed or drawn.
+    credited = np.zeros(z.shape, dtype='float32')
+    t, max_depth = 0.0, 0.0
+    probe = rain_rate > 0
+    profile = dict(FRAME_PROFILE, width=width, height=height, count=frames, crs=crs, transform=transform, nodata=nodata)
+    with rasterio.open(out_path, 'w', **profile) as dst:
+        for k, frame_t in enumerate(frame_times):
+            while t < frame_t - 1e-6:
+                window.include(*sources)
+                if probe and rain_rate * t >= WET_DEPTH:
+                    # Once a frame, route the whole DEM for one step so runoff starting anywhere joins the window; the
+                    # window then shrinks back to the cells that actually moved water.
+                    window.include([0, height - 1], [0, width - 1]); probe = False
+                if window.bounds is None:
+                    t = min(frame_t, WET_DEPTH / rain_rate) if probe else frame_t; continue
+                rs, cs = window.slices()
+                rain_total = np.float32(rain_rate * t)
+                depth[rs, cs] += np.where(valid[rs, cs], rain_total - credited[rs, cs], 0); credited[rs, cs] = rain_total
+                before = depth[rs, cs].copy()
+                h_max = float(before.max())
+                dt = min(MAX_DT, frame_t - t, CFL_ALPHA * min(dx, dy) / math.sqrt(GRAVITY * max(h_max, WET_DEPTH)))
+                wqx, wqy = qx[_x_faces(rs, cs)], qy[_y_faces(rs, cs)]
+                _step(z[rs, cs], depth[rs, cs], wqx, wqy, dx, dy, dt)
+                for r, c, q in inflows: depth[r, c] = max(depth[r, c] + q * dt / (dx * dy), 0)
+                # Active cells changed depth or sit on a face that carried water; rain alone moves nothing.
+                active = np.abs(depth[rs, cs] - before) > ACTIVE_DEPTH
+                moving = np.abs(wqx) * np.float32(dt / dx) > ACTIVE_DEPTH; active[:, :-1] |= moving; active[:, 1:] |= moving
+                moving = np.abs(wqy) * np.float32(dt / dy) > ACTIVE_DEPTH; active[:-1, :] |= moving; active[1:, :] |= moving
+                # Water reaching the raster edge leaves the model instead of piling up against it.
+                depth[0, :] = 0; depth[-1, :] = 0; depth[:, 0] = 0; depth[:, -1] = 0
+                t += dt
+                window.update(active, qx, qy)
+            probe = rain_rate > 0
+            frame = depth + np.where(valid, np.float32(rain_rate * t) - credited, 0)
+            frame = np.where(frame > WET_DEPTH, frame, 0).astype('float32')
+            frame[~valid] = nodata
+            dst.write(frame, k + 1)
+            max_depth = max(max_depth, float(frame[valid].max()) if valid.any() else 0.0)
+            if progress: progress((k + 1) / float(frames))
+    return max_depth
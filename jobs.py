@@ -0,0 +1,167 @@
+# jobs.py
+
+import json
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+
+import instrumentation
+
+FINISHED_STATES = ('succeeded', 'failed', 'cancelled')
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class AnalysisError(Exception):
+    """An expected analysis failure that should reach the client with its own HTTP status."""
+
+    def __init__(self, message, status_code=400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+# --- Job records (JSON files, so every gunicorn worker sees the same state) ---
+def _record_path(jobs_dir, job_id):
+    return os.path.join(jobs_dir, f"{job_id}.json")
+
+
+def _cancel_flag_path(jobs_dir, job_id):
+    return os.path.join(jobs_dir, f"{job_id}.cancel")
+
+
+def read_record(jobs_dir, job_id):
+    try:
+        with open(_record_path(jobs_dir, job_id), 'r') as f: return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_record(jobs_dir, record):
+    record['updated'] = time.time()
+    fd, tmp_path = tempfile.mkstemp(dir=jobs_dir, suffix='.tmp')
+    with os.fdopen(fd, 'w') as f: json.dump(record, f)
+    os.replace(tmp_path, _record_path(jobs_dir, record['id']))
+
+
+def _update_record(jobs_dir, job_id, **changes):
+    record = read_record(jobs_dir, job_id) or {'id': job_id}
+    if record.get('status') in FINISHED_STATES and changes.get('status') not in FINISHED_STATES: return record
+    record.update(changes)
+    _write_record(jobs_dir, record)
+    return record
+
+
+class JobProgress:
+    """Progress callback handed to job functions; also the point where cancellation is observed."""
+
+    def __init__(self, jobs_dir, job_id, min_interval=0.5):
+        self.jobs_dir = jobs_dir
+        self.job_id = job_id
+        self.min_interval = min_interval
+        self._last_write = 0.0
+
+    def __call__(self, fraction, message=None):
+        if os.path.exists(_cancel_flag_path(self.jobs_dir, self.job_id)): raise JobCancelled()
+        now = time.monotonic()
+        if now - self._last_write < self.min_interval and fraction < 1: return
+        self._last_write = now
+        _update_record(self.jobs_dir, self.job_id, progress=round(float(fraction), 4), message=message)
+
+
+def _run_job(jobs_dir, job_id, fn, args, kwargs):
+    """Entry point inside the worker process."""
+    progress = JobProgress(jobs_dir, job_id)
+    # Stage spans inside the job are collected here and travel back in the record, since this process has no requests.
+    token = instrumentation.begin(None)
+    try:
+        progress(0.0)
+        _update_record(jobs_dir, job_id, status='running', started=time.time())
+        result = fn(*args, progress=progress, **kwargs)
+        outcome = {'status': 'succeeded', 'progress': 1.0, 'result': result}
+    except JobCancelled:
+        outcome = {'status': 'cancelled'}
+    except AnalysisError as e:
+        outcome = {'status': 'failed', 'error': str(e), 'status_code': e.status_code}
+    except Exception as e:
+        traceback.print_exc()
+        outcome = {'status': 'failed', 'error': str(e), 'status_code': 500}
+    _update_record(jobs_dir, job_id, timings=instrumentation.end(token), **outcome)
+
+
+class JobManager:
+    """Runs heavy analyses in a bounded process pool so the web worker keeps serving tiles meanwhile."""
+
+    def __init__(self, jobs_dir, max_workers=2, retention_seconds=24 * 3600):
+        self.jobs_dir = jobs_dir
+        self.max_workers = max_workers
+        self.retention_seconds = retention_seconds
+        self._executor = None
+        self._futures = {}
+        self._lock = threading.Lock()
+        os.makedirs(jobs_dir, exist_ok=True)
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                # 'spawn' keeps the children clear of the gevent-patched parent state.
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=multiprocessing.get_context('spawn'))
+            return self._executor
+
+    def submit(self, kind, fn, *args, **kwargs):
+        self._prune()
+        job_id = uuid.uuid4().hex
+        record = {'id': job_id, 'kind': kind, 'status': 'queued', 'progress': 0.0, 'message': None, 'result': None, 'error': None, 'created': time.time()}
+        _write_record(self.jobs_dir, record)
+        future = self._get_executor().submit(_run_job, self.jobs_dir, job_id, fn, args, kwargs)
+        with self._lock: self._futures[job_id] = future
+        future.add_done_callback(lambda f, job_id=job_id: self._on_done(job_id, f))
+        return record
+
+    def _on_done(self, job_id, future):
+        with self._lock: self._futures.pop(job_id, None)
+        if instrumentation.ENABLED:
+            record = self.get(job_id) or {}
+            for stage, seconds in record.get('timings') or (): instrumentation.METRICS.observe_stage(f"job:{record.get('kind')}", stage, seconds)
+        if future.cancelled():
+            _update_record(self.jobs_dir, job_id, status='cancelled')
+        elif future.exception() is not None:
+            # The worker process died (e.g. OOM) before it could record the outcome itself.
+            _update_record(self.jobs_dir, job_id, status='failed', error=f"Worker process failed: {future.exception()}", status_code=500)
+            if 'BrokenProcessPool' in type(future.exception()).__name__:
+                with self._lock: self._executor = None
+
+    def get(self, job_id):
+        return read_record(self.jobs_dir, job_id)
+
+    def wait(self, job_id, timeout=None):
+        with self._lock: future = self._futures.get(job_id)
+        if future is not None:
+            try: future.exception(timeout=timeout)
+            except Exception: pass
+        return self.get(job_id)
+
+    def cancel(self, job_id):
+        record = self.get(job_id)
+        if record is None or record['status'] in FINISHED_STATES: return record
+        with self._lock: future = self._futures.get(job_id)
+        if future is not None and future.cancel():
+            return _update_record(self.jobs_dir, job_id, status='cancelled')
+        # Running (or owned by another web worker): the job observes the flag at its next progress report.
+        open(_cancel_flag_path(self.jobs_dir, job_id), 'w').close()
+        return _update_record(self.jobs_dir, job_id, cancel_requested=True)
+
+    def _prune(self):
+        cutoff = time.time() - self.retention_seconds
+        for fname in os.listdir(self.jobs_dir):
+            path = os.path.join(self.jobs_dir, fname)
+            try:
+                if os.path.getmtime(path) < cutoff: os.remove(path)
+            except OSError:
+                pass
@@ -0,0 +1,169 @@
+# layer_catalog.py
+
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+
+import numpy as np
+import rasterio
+from rasterio.warp import transform_bounds
+from rasterio.windows import Window
+
+RASTER_EXTENSIONS = ('.tif', '.tiff')
+SAMPLE_PIXELS = 1 << 20
+SAMPLE_BLOCKS = 64
+
+
+def list_directory(directory, extensions=RASTER_EXTENSIONS):
+    if not os.path.isdir(directory): return {}
+    return {fname: os.path.join(directory, fname) for fname in sorted(os.listdir(directory)) if fname.lower().endswith(extensions)}
+
+
+def _sample_band(src, band):
+    """Valid pixels of ``band`` from an overview or a bounded random set of blocks, never a full scan."""
+    if src.width * src.height <= SAMPLE_PIXELS:
+        data = src.read(band, masked=True)
+    elif src.overviews(band):
+        scale = max(1.0, (src.width * src.height / SAMPLE_PIXELS) ** 0.5)
+        data = src.read(band, out_shape=(max(1, int(src.height / scale)), max(1, int(src.width / scale))), masked=True)
+    else:
+        block_h, block_w = src.block_shapes[band - 1]
+        if block_h * block_w * SAMPLE_BLOCKS > SAMPLE_PIXELS or block_h == 1:
+            block_h = block_w = 256
+        rows, cols = -(-src.height // block_h), -(-src.width // block_w)
+        # Seeded by file name so the catalog's percentiles don't jitter between reindexes.
+        rng = np.random.default_rng(zlib.crc32(os.path.basename(src.name).encode('utf-8')))
+        picks = rng.choice(rows * cols, size=min(SAMPLE_BLOCKS, rows * cols), replace=False)
+        windows = [Window(int(p % cols) * block_w, int(p // cols) * block_h, block_w, block_h).intersection(Window(0, 0, src.width, src.height)) for p in picks]
+        data = np.ma.concatenate([src.read(band, window=w, masked=True).ravel() for w in windows])
+    values = np.ma.compressed(data)
+    return values[np.isfinite(values)]
+
+
+def raster_layer_info(path):
+    with rasterio.open(path) as src:
+        stats = []
+        for band in range(1, src.count + 1):
+            values = _sample_band(src, band)
+            if values.size:
+                p2, p98 = np.percentile(values, [2, 98])
+                stats.append({'min': float(p2), 'max': float(p98), 'sample_min': float(values.min()), 'sample_max': float(values.max())})
+            else:
+                stats.append({'min': 0.0, 'max': 0.0, 'sample_min': 0.0, 'sample_max': 0.0})
+        bounds = list(transform_bounds(src.crs, "EPSG:4326", *src.bounds)) if src.crs else None
+        return {"bounds": bounds, "crs": src.crs.to_string() if src.crs else None, "bands": src.count, "dtype": src.dtypes[0], "nodata": src.nodata, "stats": stats}
+
+
+class LayerCatalog:
+    """Persistent SQLite index of layer metadata, refreshed only when a file's mtime or size changes.
+
+    Reads never index: a new or changed file is listed with ``info`` None and queued for a
+    background indexer thread, started on demand. A file the indexer cannot read is stored with
+    its error, so it is retried only once it changes.
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._sources = {}
+        self._lock = threading.Lock()
+        self._queue_lock = threading.Lock()
+        self._pending = {}  # (kind, id) -> path
+        self._indexing = set()
+        self._worker = None
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS layers (kind TEXT NOT NULL, id TEXT NOT NULL, path TEXT NOT NULL, mtime_ns INTEGER, size INTEGER, info TEXT, indexed_at REAL, PRIMARY KEY (kind, id))")
+
+    def register(self, kind, lister, indexer):
+        """``lister()`` maps layer ids to paths; ``indexer(path)`` builds the stored info."""
+        self._sources[kind] = (lister, indexer)
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            with conn: yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _layer(layer_id, path, raw_info):
+        info = json.loads(raw_info) if raw_info is not None else None
+        if info and 'error' in info: return {"id": layer_id, "path": path, "info": None, "error": info['error']}
+        return {"id": layer_id, "path": path, "info": info}
+
+    def list(self, kind):
+        lister, _ = self._sources[kind]
+        files = lister()
+        with self._connect() as conn:
+            rows = {r[0]: r for r in conn.execute("SELECT id, path, mtime_ns, size, info FROM layers WHERE kind = ?", (kind,))}
+            removed = [layer_id for layer_id in rows if layer_id not in files]
+            if removed: conn.executemany("DELETE FROM layers WHERE kind = ? AND id = ?", [(kind, layer_id) for layer_id in removed])
+        layers, stale = [], []
+        for layer_id, path in files.items():
+            row = rows.get(layer_id)
+            try: stat = os.stat(path)
+            except OSError: continue
+            if row and row[1] == path and row[2] == stat.st_mtime_ns and row[3] == stat.st_size:
+                layers.append(self._layer(layer_id, path, row[4]))
+            else:
+                layers.append({"id": layer_id, "path": path, "info": None}); stale.append((layer_id, path))
+        if stale: self._enqueue(kind, stale)
+        return layers
+
+    def get(self, kind, layer_id):
+        with self._connect() as conn:
+            row = conn.execute("SELECT path, info FROM layers WHERE kind = ? AND id = ?", (kind, layer_id)).fetchone()
+        return self._layer(layer_id, row[0], row[1]) if row else None
+
+    def _enqueue(self, kind, layers):
+        with self._queue_lock:
+            for layer_id, path in layers:
+                if (kind, layer_id) not in self._indexing: self._pending[(kind, layer_id)] = path
+            if not self._pending or (self._worker is not None and self._worker.is_alive()): return
+            self._worker = threading.Thread(target=self._drain, name="layer-catalog-indexer", daemon=True)
+            self._worker.start()
+
+    def _drain(self):
+        while True:
+            with self._queue_lock:
+                if not self._pending: return
+                (kind, layer_id), path = self._pending.popitem(); self._indexing.add((kind, layer_id))
+            try:
+                self._index(kind, layer_id, path, self._sources[kind][1])
+            finally:
+                with self._queue_lock: self._indexing.discard((kind, layer_id))
+
+    def _index(self, kind, layer_id, path, indexer):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        try:
+            info = indexer(path)
+        except Exception as e:
+            print(f"Catalog could not index {kind} layer {layer_id}: {e}")
+            info = {"error": str(e)}
+        with self._connect() as conn:
+            conn.execute("INSERT OR REPLACE INTO layers (kind, id, path, mtime_ns, size, info, indexed_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                         (kind, layer_id, path, stat.st_mtime_ns, stat.st_size, json.dumps(info), time.time()))
+        return info
+
+    def refresh(self):
+        """Index every new or changed layer of every kind, on the calling thread."""
+        # One refresh at a time per process; other workers sharing the DB skip layers already indexed.
+        if not self._lock.acquire(blocking=False): return
+        try:
+            for kind in self._sources: self.list(kind)
+            self._drain()
+        finally:
+            self._lock.release()
+
+    def start_background_refresh(self):
+        thread = threading.Thread(target=self.refresh, name="layer-catalog-refresh", daemon=True)
+        thread.start()
+        return thread
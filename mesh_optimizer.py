@@ -0,0 +1,242 @@
+# mesh_optimizer.py
+# Converts uploaded OBJ models to a compact binary glTF (GLB) the inspector can load without parsing text.
+
+import json
+import os
+import struct
+import time
+
+import numpy as np
+
+from jobs import AnalysisError
+from pointcloud import write_compressed_variants
+
+OPTIMIZED_DIR = 'optimized'
+MANIFEST_NAME = 'manifest.json'
+GLB_NAME = 'model.glb'
+FORMAT_VERSION = 1
+POSITION_BITS = 16
+PRIMITIVE_TRIANGLES = 21845  # 3 x 21845 corners < 65536, so every primitive can use 16-bit indices
+DEFAULT_MATERIAL = '__default__'
+# glTF component types / targets
+BYTE, UNSIGNED_SHORT, FLOAT = 5120, 5123, 5126
+ARRAY_BUFFER, ELEMENT_ARRAY_BUFFER = 34962, 34963
+
+
+def _no_progress(fraction, message=None):
+    pass
+
+
+def manifest_path(model_dir):
+    return os.path.join(model_dir, OPTIMIZED_DIR, MANIFEST_NAME)
+
+
+def read_manifest(model_dir):
+    try:
+        with open(manifest_path(model_dir), 'r') as f: return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _floats(lines, width):
+    """Parse ``v``/``vt``/``vn`` payloads in one go; lines with extra values (e.g. vertex colours) fall back to a per-line split."""
+    if not lines: return np.zeros((0, width))
+    tokens = b' '.join(lines).split()
+    per_line = len(lines[0].split())
+    if per_line >= width and len(tokens) == per_line * len(lines):
+        return np.array(tokens, dtype='float64').reshape(-1, per_line)[:, :width]
+    return np.array([(line.split() + [b'0'] * width)[:width] for line in lines], dtype='float64')
+
+
+def _index(token, count):
+    if not token: return -1
+    index = int(token)
+    # Negative indices count back from the elements defined so far.
+    return index - 1 if index > 0 else count + index
+
+
+def parse_obj(path, progress=_no_progress):
+    """Vertex arrays plus, per material, the face corners as ``(v, vt, vn)`` zero-based index triples (-1 when absent)."""
+    v_lines, vt_lines, vn_lines = [], [], []
+    corners, face_sizes, face_material = [], [], []
+    materials, mtllib, current = {DEFAULT_MATERIAL: 0}, None, 0
+    total, done = max(os.path.getsize(path), 1), 0
+    with open(path, 'rb') as f:
+        for line_number, line in enumerate(f):
+            done += len(line)
+            if line.startswith(b'v '): v_lines.append(line[2:])
+            elif line.startswith(b'vt '): vt_lines.append(line[3:])
+            elif line.startswith(b'vn '): vn_lines.append(line[3:])
+            elif line.startswith(b'f '):
+                tokens = line.split()[1:]
+                if len(tokens) < 3: continue
+                counts = (len(v_lines), len(vt_lines), len(vn_lines))
+                for token in tokens:
+                    parts = token.split(b'/') + [b'', b'']
+                    corners.append((_index(parts[0], counts[0]), _index(parts[1], counts[1]), _index(parts[2], counts[2])))
+                face_sizes.append(len(tokens)); face_material.append(current)
+            elif line.startswith(b'usemtl'):
+                name = line[6:].strip().decode('utf-8', 'replace') or DEFAULT_MATERIAL
+                current = materials.setdefault(name, len(materials))
+            elif line.startswith(b'mtllib') and mtllib is None:
+                mtllib = line[6:].strip().decode('utf-8', 'replace')
+            if line_number % 500000 == 0: progress(0.6 * done / total, "Parsing OBJ")
+    if not face_sizes: raise AnalysisError("The OBJ file contains no faces.", 422)
+    positions, uvs, normals = _floats(v_lines, 3), _floats(vt_lines, 2), _floats(vn_lines, 3)
+    corners = np.array(corners, dtype='int64')
+    face_sizes, face_material = np.array(face_sizes), np.array(face_material)
+    # Fan triangulation: a face with k corners starting at s gives (s, s+i, s+i+1) for i in 1..k-2.
+    starts = np.concatenate([[0], np.cumsum(face_sizes)[:-1]])
+    tri_face = np.repeat(np.arange(len(face_sizes)), face_sizes - 2)
+    step = np.arange(len(tri_face)) - np.repeat(np.cumsum(face_sizes - 2) - (face_sizes - 2), face_sizes - 2) + 1
+    triangles = np.stack([starts[tri_face], starts[tri_face] + step, starts[tri_face] + step + 1], axis=1)
+    names = {index: name for name, index in materials.items()}
+    groups = [(names[m], triangles[face_material[tri_face] == m]) for m in np.unique(face_material)]
+    return positions, uvs, normals, corners, groups, mtllib
+
+
+def parse_mtl(path):
+    materials, current = {}, None
+    if not path or not os.path.exists(path): return materials
+    with open(path, 'r', encoding='utf-8', errors='replace') as f:
+        for line in f:
+            parts = line.strip().split(None, 1)
+            if not parts: continue
+            key, value = parts[0], parts[1] if len(parts) > 1 else ''
+            if key == 'newmtl': current = materials.setdefault(value.strip(), {})
+            elif current is None: continue
+            elif key == 'Kd': current['color'] = [float(x) for x in value.split()[:3]]
+            elif key == 'd': current['opacity'] = float(value.split()[0])
+            elif key == 'Tr': current['opacity'] = 1.0 - float(value.split()[0])
+            elif key == 'map_Kd': current['texture'] = os.path.basename(value.split()[-1].replace('\\', '/'))
+    return materials
+
+
+def _primitive(positions, uvs, normals, corners, triangles):
+    """Welded vertex arrays and indices for one material: corners sharing position, UV and (quantized) normal become one vertex."""
+    tri_corners = corners[triangles]  # (T, 3, 3)
+    p = positions[np.clip(tri_corners[..., 0], 0, len(positions) - 1)]
+    face_normal = np.cross(p[:, 1] - p[:, 0], p[:, 2] - p[:, 0])
+    # Corners without an OBJ normal take the face normal, so flat-shaded models keep their hard edges.
+    n = np.repeat(face_normal[:, None, :], 3, axis=1)
+    if len(normals):
+        has_vn = tri_corners[..., 2] >= 0
+        n[has_vn] = normals[tri_corners[..., 2][has_vn]]
+    length = np.linalg.norm(n, axis=-1, keepdims=True)
+    n = np.where(length > 0, n / np.where(length > 0, length, 1), 0)
+    qn = np.round(n * 127).astype('int8').reshape(-1, 3)
+    uv_index = tri_corners[..., 1].reshape(-1) if len(uvs) else np.full(tri_corners.shape[0] * 3, -1)
+    keys = np.column_stack([tri_corners[..., 0].reshape(-1), uv_index, qn.astype('int64')])
+    unique, inverse = np.unique(keys, axis=0, return_inverse=True)
+    uv = None
+    if (unique[:, 1] >= 0).any():
+        uv = np.where(unique[:, 1:2] >= 0, uvs[np.clip(unique[:, 1], 0, None)], 0.0)  # corners without a UV get (0, 0)
+    return positions[unique[:, 0]], uv, unique[:, 2:].astype('int8'), inverse.reshape(-1)
+
+
+class _Buffer:
+    """The single merged GLB binary chunk; every view starts on a 4-byte boundary as glTF requires."""
+
+    def __init__(self):
+        self.parts, self.length, self.views, self.accessors = [], 0, [], []
+
+    def add(self, array, component_type, kind, target, count, normalized=False, stride=None, minmax=None):
+        data = np.ascontiguousarray(array).tobytes()
+        view = {'buffer': 0, 'byteOffset': self.length, 'byteLength': len(data), 'target': target}
+        if stride: view['byteStride'] = stride
+        self.parts.append(data); self.length += len(data)
+        if self.length % 4: self.parts.append(b'\0' * (4 - self.length % 4)); self.length += 4 - self.length % 4
+        self.views.append(view)
+        accessor = {'bufferView': len(self.views) - 1, 'componentType': component_type, 'count': int(count), 'type': kind}
+        if normalized: accessor['normalized'] = True
+        if minmax: accessor['min'], accessor['max'] = minmax
+        self.accessors.append(accessor)
+        return len(self.accessors) - 1
+
+
+def write_glb(path, gltf, buffer):
+    gltf['buffers'] = [{'byteLength': buffer.length}]
+    gltf['bufferViews'], gltf['accessors'] = buffer.views, buffer.accessors
+    payload = json.dumps(gltf, separators=(',', ':')).encode('utf-8')
+    payload += b' ' * (-len(payload) % 4)
+    total = 12 + 8 + len(payload) + 8 + buffer.length
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(struct.pack('<4sII', b'glTF', 2, total))
+        f.write(struct.pack('<II', len(payload), 0x4E4F534A)); f.write(payload)
+        f.write(struct.pack('<II', buffer.length, 0x004E4942))
+        for part in buffer.parts: f.write(part)
+    os.replace(tmp_path, path)
+
+
+def optimize_model(model_dir, progress=_no_progress):
+    """Convert the OBJ (and MTL) in ``model_dir`` to ``optimized/model.glb`` and describe it in ``optimized/manifest.json``.
+
+    Positions are quantized to 16 bits over the model bounds (dequantized by the node transform,
+    KHR_mesh_quantization), normals to 8 bits and in-range UVs to 16 bits; corners are welded per
+    material and every attribute and index array shares one binary buffer.
+    """
+    started = time.time()
+    obj_name = next((f for f in sorted(os.listdir(model_dir)) if f.lower().endswith('.obj')), None)
+    if not obj_name: raise AnalysisError("No .obj file found.", 404)
+    positions, uvs, normals, corners, groups, mtllib = parse_obj(os.path.join(model_dir, obj_name), progress=progress)
+    mtl_name = mtllib if mtllib and os.path.exists(os.path.join(model_dir, os.path.basename(mtllib))) else next((f for f in sorted(os.listdir(model_dir)) if f.lower().endswith('.mtl')), None)
+    mtl = parse_mtl(os.path.join(model_dir, os.path.basename(mtl_name))) if mtl_name else {}
+
+    lo = positions.min(axis=0); extent = np.maximum(positions.max(axis=0) - lo, 1e-9)
+    step = extent / (2 ** POSITION_BITS - 1)
+    buffer, primitives, materials, textures, images = _Buffer(), [], [], [], []
+    vertex_count = triangle_count = 0
+    chunks = [(name, triangles[start:start + PRIMITIVE_TRIANGLES]) for name, triangles in groups for start in range(0, len(triangles), PRIMITIVE_TRIANGLES)]
+    material_index = {}
+    for done, (name, triangles) in enumerate(chunks):
+        progress(0.6 + 0.3 * done / len(chunks), "Building binary mesh")
+        p, uv, qn, indices = _primitive(positions, uvs, normals, corners, triangles)
+        qp = np.zeros((len(p), 4), dtype='uint16'); qp[:, :3] = np.round((p - lo) / step)
+        attributes = {'POSITION': buffer.add(qp, UNSIGNED_SHORT, 'VEC3', ARRAY_BUFFER, len(p), stride=8,
+                                             minmax=(qp[:, :3].min(axis=0).tolist(), qp[:, :3].max(axis=0).tolist()))}
+        n4 = np.zeros((len(p), 4), dtype='int8'); n4[:, :3] = qn
+        attributes['NORMAL'] = buffer.add(n4, BYTE, 'VEC3', ARRAY_BUFFER, len(p), normalized=True, stride=4)
+        if uv is not None:
+            uv = np.column_stack([uv[:, 0], 1.0 - uv[:, 1]])  # OBJ's V axis points up, glTF's down
+            if uv.min() >= 0 and uv.max() <= 1: attributes['TEXCOORD_0'] = buffer.add(np.round(uv * 65535).astype('uint16'), UNSIGNED_SHORT, 'VEC2', ARRAY_BUFFER, len(p), normalized=True)
+            else: attributes['TEXCOORD_0'] = buffer.add(uv.astype('float32'), FLOAT, 'VEC2', ARRAY_BUFFER, len(p))
+        index_accessor = buffer.add(indices.astype('uint16'), UNSIGNED_SHORT, 'SCALAR', ELEMENT_ARRAY_BUFFER, len(indices))
+        primitives.append({'attributes': attributes, 'indices': index_accessor, 'material': material_index.get(name, len(materials)), 'mode': 4})
+        vertex_count += len(p); triangle_count += len(triangles)
+        if name in material_index: continue
+
+        material_index[name] = len(materials)
+        spec = mtl.get(name, {})
+        material = {'name': name, 'doubleSided': True, 'pbrMetallicRoughness': {'baseColorFactor': spec.get('color', [0.8, 0.8, 0.8]) + [spec.get('opacity', 1.0)], 'metallicFactor': 0.0, 'roughnessFactor': 1.0}}
+        if spec.get('opacity', 1.0) < 1.0: material['alphaMode'] = 'BLEND'
+        if spec.get('texture') and uv is not None and os.path.exists(os.path.join(model_dir, spec['texture'])):
+            # Textures stay next to the uploaded OBJ; the GLB references them relative to optimized/.
+            images.append({'uri': f"../{spec['texture']}"}); textures.append({'source': len(images) - 1, 'sampler': 0})
+            material['pbrMetallicRoughness']['baseColorTexture'] = {'index': len(textures) - 1}
+        materials.append(material)
+
+    gltf = {
+        'asset': {'version': '2.0', 'generator': 'Koushika mesh_optimizer'},
+        'extensionsUsed': ['KHR_mesh_quantization'], 'extensionsRequired': ['KHR_mesh_quantization'],
+        'scene': 0, 'scenes': [{'nodes': [0]}],
+        'nodes': [{'name': os.path.splitext(obj_name)[0], 'mesh': 0, 'translation': lo.tolist(), 'scale': step.tolist()}],
+        'meshes': [{'name': os.path.splitext(obj_name)[0], 'primitives': primitives}],
+        'materials': materials,
+    }
+    if textures: gltf.update(textures=textures, images=images, samplers=[{'magFilter': 9729, 'minFilter': 9987, 'wrapS': 10497, 'wrapT': 10497}])
+    out_dir = os.path.join(model_dir, OPTIMIZED_DIR); os.makedirs(out_dir, exist_ok=True)
+    progress(0.9, "Writing GLB")
+    write_glb(os.path.join(out_dir, GLB_NAME), gltf, buffer)
+    write_compressed_variants(os.path.join(out_dir, GLB_NAME))
+    manifest = {
+        'format_version': FORMAT_VERSION, 'source': obj_name, 'material_library': mtl_name,
+        'source_bytes': os.path.getsize(os.path.join(model_dir, obj_name)), 'glb': f"{OPTIMIZED_DIR}/{GLB_NAME}",
+        'glb_bytes': os.path.getsize(os.path.join(out_dir, GLB_NAME)), 'vertices': int(vertex_count), 'triangles': int(triangle_count),
+        'primitives': len(primitives), 'bounds': {'min': lo.tolist(), 'max': (lo + extent).tolist()},
+        'position_step': step.tolist(), 'seconds': round(time.time() - started, 2),
+    }
+    tmp_path = f"{manifest_path(model_dir)}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f: json.dump(manifest, f)
+    os.replace(tmp_path, manifest_path(model_dir))
+    return manifest
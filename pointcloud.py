@@ -0,0 +1,364 @@
+# pointcloud.py
+
+import gzip
+import json
+import os
+import shutil
+
+import numpy as np
+from matplotlib import colormaps
+
+try:
+    import pdal
+except ImportError:
+    pdal = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Bumped whenever the cached buffers change shape; older caches are rebuilt on first request.
+CACHE_FORMAT = 3
+CHUNK_SIZE = 1_000_000
+POSITION_PRECISION = 0.001  # metres; the finest step kept by the quantized position encodings
+COPY_CHUNK = 4 * 1024 * 1024
+NODE_POINT_BUDGET = 65_536
+MORTON_BITS = 21  # per axis, so a Morton code fits in a uint64
+SAMPLE_BITS = 7  # each node samples one point per cell of a 128^3 grid over its cube
+CLASS_COLORS = {1: (200, 200, 200), 2: (165, 80, 40), 3: (0, 255, 0), 4: (0, 150, 0), 5: (0, 100, 0), 6: (255, 0, 0), 9: (0, 0, 255)}
+DEFAULT_CLASS_COLOR = (200, 200, 200)
+
+
+def _classification_lut():
+    lut = np.tile(np.array(DEFAULT_CLASS_COLOR, dtype=np.uint8), (256, 1))
+    for code, rgb in CLASS_COLORS.items(): lut[code] = rgb
+    return lut
+
+
+# 256-entry lookup tables, so colouring a chunk is a single fancy-index instead of per-point Python work.
+CLASSIFICATION_LUT = _classification_lut()
+ELEVATION_LUT = (colormaps['viridis'](np.linspace(0, 1, 256))[:, :3] * 255).round().astype(np.uint8)
+
+
+def _reader_pipeline(path):
+    return pdal.Pipeline(json.dumps([{"type": "readers.las", "filename": path}]))
+
+
+def quick_bounds(path):
+    """Header bounds and point count without reading any points."""
+    info = _reader_pipeline(path).quickinfo['readers.las']
+    b = info.get('bounds') or {}
+    if not all(k in b for k in ('minx', 'maxx', 'miny', 'maxy', 'minz', 'maxz')): return None, info.get('num_points')
+    return b, info.get('num_points')
+
+
+def iter_chunks(path, chunk_size=CHUNK_SIZE):
+    for chunk in _reader_pipeline(path).iterator(chunk_size=chunk_size):
+        if len(chunk): yield chunk
+
+
+def _scan_bounds(path, chunk_size):
+    b = None
+    for chunk in iter_chunks(path, chunk_size):
+        current = {'minx': float(chunk['X'].min()), 'maxx': float(chunk['X'].max()), 'miny': float(chunk['Y'].min()), 'maxy': float(chunk['Y'].max()),
+                   'minz': float(chunk['Z'].min()), 'maxz': float(chunk['Z'].max())}
+        b = current if b is None else {k: (min if k.startswith('min') else max)(b[k], v) for k, v in current.items()}
+    return b
+
+
+def _quantization(tight_min, tight_max):
+    """Offset and per-axis scale that spread each centred axis of the bounding box over the uint16 range, no finer than ``POSITION_PRECISION``."""
+    extent = np.asarray(tight_max, dtype='float64') - np.asarray(tight_min, dtype='float64')
+    return np.asarray(tight_min, dtype='float64'), np.maximum(extent / np.iinfo(np.uint16).max, POSITION_PRECISION)
+
+
+def _quantize(points, offset, scale, dtype):
+    q = np.rint((points - offset) / scale)
+    return np.clip(q, 0, np.iinfo(dtype).max).astype(dtype)
+
+
+def write_compressed_variants(path):
+    """Pre-compress ``path`` to ``.gz`` (and ``.br`` when Brotli is installed), streaming so large buffers never sit in memory.
+
+    Variants that save less than 5% are dropped; serving them would only cost the client a decode.
+    """
+    size = os.path.getsize(path)
+    targets = [('.gz', lambda raw: gzip.GzipFile(fileobj=raw, mode='wb', compresslevel=6, mtime=0))]
+    if brotli is not None: targets.append(('.br', None))
+    for suffix, opener in targets:
+        tmp = f"{path}{suffix}.{os.getpid()}.tmp"
+        with open(path, 'rb') as src, open(tmp, 'wb') as raw:
+            if opener is not None:
+                with opener(raw) as dst: shutil.copyfileobj(src, dst, COPY_CHUNK)
+            else:
+                compressor = brotli.Compressor(quality=5)
+                for chunk in iter(lambda: src.read(COPY_CHUNK), b''): raw.write(compressor.process(chunk))
+                raw.write(compressor.finish())
+        if os.path.getsize(tmp) < size * 0.95: os.replace(tmp, path + suffix)
+        else:
+            os.remove(tmp)
+            if os.path.exists(path + suffix): os.remove(path + suffix)
+
+
+def preprocess(pc_path, cache_dir, base_name, chunk_size=CHUNK_SIZE):
+    """Stream a LAS/LAZ file into the viewer's compact ``.bin`` buffers and LOD octree, one chunk at a time.
+
+    Memory stays bounded by ``chunk_size`` whatever the point count: the centre and elevation range
+    come from the header (or a bounds-only pass when the header lacks them), and each chunk is
+    appended to the outputs before the next is read. Positions are stored as uint16 with a per-axis
+    scale over the bounding box and colours as uint8 (``meta['encoding']``). Full-precision float32
+    positions are only kept in a temporary file while the octree is built from them.
+    The metadata JSON is written last, so an interrupted run is simply redone.
+    """
+    if pdal is None: raise RuntimeError("PDAL is not installed on this server.")
+    bounds, _ = quick_bounds(pc_path)
+    if bounds is None: bounds = _scan_bounds(pc_path, chunk_size)
+    if bounds is None: raise RuntimeError("PDAL returned no points from the file. It may be empty or invalid.")
+    center = np.array([(bounds['maxx'] + bounds['minx']) / 2, (bounds['maxy'] + bounds['miny']) / 2, (bounds['maxz'] + bounds['minz']) / 2])
+    z_min, z_span = bounds['minz'], max(bounds['maxz'] - bounds['minz'], 1e-9)
+    offset, scale = _quantization(np.array([bounds['minx'], bounds['miny'], bounds['minz']]) - center, np.array([bounds['maxx'], bounds['maxy'], bounds['maxz']]) - center)
+
+    names = {'positions': f"{base_name}_positions_q.bin", 'rgb': f"{base_name}_color_rgb_u8.bin", 'classification': f"{base_name}_color_classification_u8.bin",
+             'elevation': f"{base_name}_color_elevation_u8.bin", 'classification_raw': f"{base_name}_classification_raw.bin", 'octree_input': f"{base_name}_positions_f32.bin"}
+    tmp = {key: os.path.join(cache_dir, f"{name}.{os.getpid()}.tmp") for key, name in names.items()}
+    outputs, count, fields = {}, 0, None
+    try:
+        for chunk in iter_chunks(pc_path, chunk_size):
+            if fields is None:
+                fields = chunk.dtype.names
+                wanted = ['positions', 'octree_input', 'elevation'] + (['rgb'] if 'Red' in fields else []) + (['classification', 'classification_raw'] if 'Classification' in fields else [])
+                outputs = {key: open(tmp[key], 'wb') for key in wanted}
+            positions = np.empty((len(chunk), 3), dtype=np.float32)
+            for i, axis in enumerate(('X', 'Y', 'Z')): positions[:, i] = chunk[axis] - center[i]
+            positions.tofile(outputs['octree_input'])
+            _quantize(positions, offset, scale, np.uint16).tofile(outputs['positions'])
+            if 'rgb' in outputs:
+                rgb = np.stack([chunk['Red'], chunk['Green'], chunk['Blue']], axis=1).astype(np.float32); rgb *= np.float32(255 / 65535)
+                np.rint(rgb).astype(np.uint8).tofile(outputs['rgb'])
+            if 'classification' in outputs:
+                classes = chunk['Classification'].astype(np.uint8)
+                CLASSIFICATION_LUT[classes].tofile(outputs['classification'])
+                classes.tofile(outputs['classification_raw'])
+            levels = np.clip((chunk['Z'] - z_min) / z_span * 255, 0, 255).astype(np.uint8)
+            ELEVATION_LUT[levels].tofile(outputs['elevation'])
+            count += len(chunk)
+        for f in outputs.values(): f.close()
+        if count == 0: raise RuntimeError("PDAL returned no points from the file. It may be empty or invalid.")
+        for key in outputs:
+            if key != 'octree_input': os.replace(tmp[key], os.path.join(cache_dir, names[key]))
+
+        color_attributes = [attr for attr in ('rgb', 'classification', 'elevation') if attr in outputs]
+        classification_available = 'classification' in outputs
+        meta = {
+            "format": CACHE_FORMAT,
+            "point_count": count,
+            "bbox": {"min": [bounds['minx'], bounds['miny'], bounds['minz']], "max": [bounds['maxx'], bounds['maxy'], bounds['maxz']]},
+            "color_attributes": color_attributes,
+            "classification_available": classification_available,
+            "files": {
+                "positions": names['positions'],
+                "colors": {attr: names[attr] for attr in color_attributes},
+                "classification_raw": names['classification_raw'] if classification_available else None,
+            },
+            # Decoded position = quantized * scale + offset, per axis, in the frame centred on the bounding box.
+            "encoding": {"position_type": "uint16", "scale": scale.tolist(), "offset": offset.tolist(), "color_type": "uint8"},
+        }
+        for name in [meta['files']['positions'], *meta['files']['colors'].values()]: write_compressed_variants(os.path.join(cache_dir, name))
+        meta["octree"] = build_octree(cache_dir, base_name, meta, tmp['octree_input'], chunk_size=chunk_size)
+    finally:
+        for f in outputs.values(): f.close()
+        for path in tmp.values():
+            if os.path.exists(path): os.remove(path)
+    with open(os.path.join(cache_dir, f"{base_name}.json"), 'w') as f: json.dump(meta, f)
+    # Float32 buffers left by caches older than format 3 are no longer read by anything.
+    for name in ('positions', 'color_rgb', 'color_classification', 'color_elevation'):
+        stale = os.path.join(cache_dir, f"{base_name}_{name}.bin")
+        if os.path.exists(stale): os.remove(stale)
+    return meta
+
+
+# --- LEVEL-OF-DETAIL OCTREE ---
+def _spread_bits(v):
+    # Interleave the low 21 bits of ``v`` with two zero bits each (the usual 3D Morton "part1by2").
+    v = v.astype(np.uint64) & np.uint64(0x1fffff)
+    for shift, mask in ((32, 0x1f00000000ffff), (16, 0x1f0000ff0000ff), (8, 0x100f00f00f00f00f), (4, 0x10c30c30c30c30c3), (2, 0x1249249249249249)):
+        v = (v | (v << np.uint64(shift))) & np.uint64(mask)
+    return v
+
+
+def _morton_codes(positions, cube_min, cube_size, chunk_size):
+    codes = np.empty(len(positions), dtype=np.uint64)
+    cells = 1 << MORTON_BITS
+    for start in range(0, len(positions), chunk_size):
+        q = ((positions[start:start + chunk_size] - cube_min) / cube_size * cells).astype(np.int64)
+        np.clip(q, 0, cells - 1, out=q)
+        codes[start:start + chunk_size] = (_spread_bits(q[:, 0]) << np.uint64(2)) | (_spread_bits(q[:, 1]) << np.uint64(1)) | _spread_bits(q[:, 2])
+    return codes
+
+
+def _child_cube(cube_min, size, digit):
+    half = size / 2
+    return [cube_min[0] + half * ((digit >> 2) & 1), cube_min[1] + half * ((digit >> 1) & 1), cube_min[2] + half * (digit & 1)], half
+
+
+def _index_chunks(source, count, chunk_size):
+    """A node's point indices in pieces of ``chunk_size``: ``source`` is an int64 index file, or None for every point."""
+    for start in range(0, count, chunk_size):
+        if source is None: yield np.arange(start, min(start + chunk_size, count), dtype=np.int64)
+        else: yield np.fromfile(source, dtype=np.int64, count=chunk_size, offset=start * 8)
+
+
+class _OctreeBuilder:
+    """Writes octree nodes into ``tmp_dir``, holding at most ``chunk_size`` points (plus a fixed sampling grid) in memory.
+
+    Subtrees of up to ``chunk_size`` points are sorted by Morton code in memory. Larger nodes are streamed from an index
+    file: their sample is picked on the fly and every other point is spilled to one index file per octant.
+    """
+
+    def __init__(self, tmp_dir, positions, colors, cube_min, cube_size, budget, chunk_size):
+        self.tmp_dir, self.positions, self.colors = tmp_dir, positions, colors
+        self.cube_min, self.cube_size, self.budget, self.chunk_size = cube_min, cube_size, budget, chunk_size
+        self.max_depth = MORTON_BITS - SAMPLE_BITS
+        self.nodes = {}
+
+    def build(self, count):
+        stack = [('r', 0, None, count, list(self.cube_min), self.cube_size)]
+        while stack:
+            node_id, depth, source, n, node_min, size = stack.pop()
+            if n <= max(self.chunk_size, self.budget) or depth >= self.max_depth:
+                index = np.concatenate(list(_index_chunks(source, n, n)))
+                if source is not None: os.remove(source)
+                self._subtree(index, node_id, depth, node_min, size)
+            else:
+                stack.extend(self._split(node_id, depth, source, n, node_min, size))
+                if source is not None: os.remove(source)
+
+    def _codes(self, index):
+        return _morton_codes(self.positions[index], self.cube_min, self.cube_size, self.chunk_size)
+
+    def _write(self, node_id, index, node_min, size, children):
+        index = np.sort(index)
+        # Coarse nodes are seen from far away, so a step of size/65535 (far below their spacing) is plenty.
+        scale = max(POSITION_PRECISION, size / np.iinfo(np.uint16).max)
+        node_path = os.path.join(self.tmp_dir, f"{node_id}.bin")
+        with open(node_path, 'wb') as f:
+            _quantize(self.positions[index], np.asarray(node_min), scale, np.uint16).tofile(f)
+            for values in self.colors.values(): np.ascontiguousarray(values[index]).tofile(f)
+        write_compressed_variants(node_path)
+        self.nodes[node_id] = {"count": int(index.size), "min": [float(v) for v in node_min], "max": [float(v) + size for v in node_min],
+                               "scale": scale, "spacing": size / (1 << SAMPLE_BITS), "children": children}
+
+    def _subtree(self, index, node_id, depth, node_min, size):
+        # Sorted by Morton code, every node below is a contiguous range of ``index``.
+        index = np.sort(index)
+        codes = self._codes(index)
+        order = np.argsort(codes, kind='stable')
+        codes, index = codes[order], index[order]
+        del order
+        taken = np.zeros(len(codes), dtype=bool)
+        stack = [(node_id, depth, 0, len(codes), node_min, size)]
+        while stack:
+            node_id, depth, start, end, node_min, size = stack.pop()
+            remaining = np.flatnonzero(~taken[start:end]) + start
+            children = []
+            if remaining.size <= self.budget or depth >= self.max_depth:
+                selected = remaining
+            else:
+                # Points sharing a sampling cell are adjacent: keep the first of each run.
+                cells = codes[remaining] >> np.uint64(3 * (MORTON_BITS - depth - SAMPLE_BITS))
+                selected = remaining[np.flatnonzero(np.r_[True, cells[1:] != cells[:-1]])]
+                if selected.size > self.budget: selected = selected[np.linspace(0, selected.size - 1, self.budget).astype(np.int64)]
+                taken[selected] = True
+                digits = (codes[start:end] >> np.uint64(3 * (MORTON_BITS - depth - 1))) & np.uint64(7)
+                bounds = np.searchsorted(digits, np.arange(9, dtype=np.uint64)) + start
+                for digit in range(8):
+                    c0, c1 = int(bounds[digit]), int(bounds[digit + 1])
+                    if c1 > c0 and not taken[c0:c1].all():
+                        children.append(digit)
+                        child_min, child_size = _child_cube(node_min, size, digit)
+                        stack.append((f"{node_id}{digit}", depth + 1, c0, c1, child_min, child_size))
+            self._write(node_id, index[selected], node_min, size, children)
+
+    def _split(self, node_id, depth, source, count, node_min, size):
+        """Stream one node's points once: sample it and spill the rest into per-octant index files. Returns the children to visit."""
+        cell_shift, digit_shift = np.uint64(3 * (MORTON_BITS - depth - SAMPLE_BITS)), np.uint64(3 * (MORTON_BITS - depth - 1))
+        cell_mask = np.uint64((1 << 3 * SAMPLE_BITS) - 1)
+        seen = np.zeros(1 << 3 * SAMPLE_BITS, dtype=bool)
+        buckets = [os.path.join(self.tmp_dir, f"{node_id}{digit}.idx") for digit in range(8)]
+        files = [open(path, 'wb') for path in buckets]
+        # The sample is the first point of each cell, thinned evenly by doubling ``stride`` so at most 2 * budget are held.
+        pool, seen_count, stride = (np.empty(0, dtype=np.int64), np.empty(0, dtype=np.uint64), np.empty(0, dtype=np.int64)), 0, 1
+
+        def spill(index, digits):
+            for digit in range(8): index[digits == digit].tofile(files[digit])
+
+        try:
+            for index in _index_chunks(source, count, self.chunk_size):
+                codes = self._codes(index)
+                digits = (codes >> digit_shift) & np.uint64(7)
+                cells, first = np.unique((codes >> cell_shift) & cell_mask, return_index=True)
+                del codes
+                first = np.sort(first[~seen[cells]]); seen[cells] = True
+                ordinals = np.arange(seen_count, seen_count + first.size); seen_count += first.size
+                first, ordinals = first[ordinals % stride == 0], ordinals[ordinals % stride == 0]
+                rest = np.ones(len(index), dtype=bool); rest[first] = False
+                spill(index[rest], digits[rest])
+                pool = tuple(np.concatenate(pair) for pair in zip(pool, (index[first], digits[first], ordinals)))
+                while pool[0].size > 2 * self.budget:
+                    stride *= 2
+                    keep = pool[2] % stride == 0
+                    spill(pool[0][~keep], pool[1][~keep])
+                    pool = tuple(values[keep] for values in pool)
+            selected = np.zeros(pool[0].size, dtype=bool)
+            selected[np.linspace(0, pool[0].size - 1, min(self.budget, pool[0].size)).astype(np.int64)] = True
+            spill(pool[0][~selected], pool[1][~selected])
+        finally:
+            for f in files: f.close()
+        children, visits = [], []
+        for digit, path in enumerate(buckets):
+            n = os.path.getsize(path) // 8
+            if not n: os.remove(path); continue
+            children.append(digit)
+            child_min, child_size = _child_cube(node_min, size, digit)
+            visits.append((f"{node_id}{digit}", depth + 1, path, n, child_min, child_size))
+        self._write(node_id, pool[0][selected], node_min, size, children)
+        return visits
+
+
+def build_octree(cache_dir, base_name, meta, positions_path, budget=NODE_POINT_BUDGET, chunk_size=CHUNK_SIZE):
+    """Split the float32 positions at ``positions_path`` and the flat colour buffers into a Potree-style octree of
+    ``<node_id>.bin`` files plus ``hierarchy.json``.
+
+    Each node keeps one point per cell of a 128^3 grid over its cube (at most ``budget``) and hands the rest down to
+    its eight children; node ids are ``r`` followed by one octant digit per level. Memory stays bounded by ``chunk_size``
+    whatever the point count: nodes larger than that are streamed and spilled to per-octant index files on disk (see
+    ``_OctreeBuilder``). A node file holds uint16 positions quantized against the node's cube (``position * scale + min``)
+    followed by each uint8 colour attribute, in ``meta['color_attributes']`` order, with pre-compressed variants alongside.
+    """
+    positions = np.memmap(positions_path, dtype=np.float32, mode='r').reshape(-1, 3)
+    colors = {attr: np.memmap(os.path.join(cache_dir, meta['files']['colors'][attr]), dtype=np.uint8, mode='r').reshape(-1, 3) for attr in meta['color_attributes']}
+    center = (np.array(meta['bbox']['min']) + np.array(meta['bbox']['max'])) / 2
+    tight_min, tight_max = np.array(meta['bbox']['min']) - center, np.array(meta['bbox']['max']) - center
+    cube_size = float(max((tight_max - tight_min).max(), 1e-6)) * 1.0001
+
+    directory = f"{base_name}_octree"
+    final_dir = os.path.join(cache_dir, directory)
+    tmp_dir = f"{final_dir}.{os.getpid()}.tmp"
+    os.makedirs(tmp_dir, exist_ok=True)
+    try:
+        builder = _OctreeBuilder(tmp_dir, positions, colors, tight_min.astype('float64'), cube_size, budget, chunk_size)
+        builder.build(len(positions))
+        hierarchy = {"point_count": meta['point_count'], "bounds": {"min": tight_min.tolist(), "max": tight_max.tolist()},
+                     "color_attributes": meta['color_attributes'], "encoding": {"positions": "uint16", "colors": "uint8"}, "budget": budget, "nodes": builder.nodes}
+        with open(os.path.join(tmp_dir, 'hierarchy.json'), 'w') as f: json.dump(hierarchy, f)
+        if os.path.isdir(final_dir): shutil.rmtree(final_dir, ignore_errors=True)
+        os.replace(tmp_dir, final_dir)
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+    return {"directory": directory, "hierarchy": f"{directory}/hierarchy.json", "node_count": len(builder.nodes)}
+
+
+def read_hierarchy(cache_dir, meta):
+    with open(os.path.join(cache_dir, meta['octree']['hierarchy']), 'r') as f: return json.load(f)
@@ -0,0 +1,134 @@
+# raster_pool.py
+
+import os
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import rasterio
+
+
+class _PooledDataset:
+    __slots__ = ('dataset', 'mtime', 'lock', 'refs', 'retired')
+
+    def __init__(self, dataset, mtime):
+        self.dataset = dataset
+        self.mtime = mtime
+        # rasterio handles are not safe for concurrent reads, so each borrower gets exclusive use.
+        self.lock = threading.RLock()
+        self.refs = 0
+        self.retired = False
+
+
+class DatasetInfo:
+    """What choosing a read (e.g. an overview level) needs to know about a raster, without holding a handle."""
+
+    __slots__ = ('crs', 'res', 'bounds', 'count', 'factors')
+
+    def __init__(self, src):
+        self.crs = src.crs
+        self.res = src.res
+        self.bounds = src.bounds
+        self.count = src.count
+        self.factors = [src.overviews(band) for band in range(1, src.count + 1)]
+
+    def overviews(self, band):
+        return self.factors[band - 1]
+
+
+class DatasetPool:
+    """Long-lived rasterio dataset handles with LRU eviction and mtime invalidation.
+
+    Handles are keyed by absolute path plus any extra ``rasterio.open`` keyword
+    arguments (e.g. ``overview_level``). A handle that is evicted or goes stale while
+    borrowed is closed when its last borrower returns it. ``threading`` primitives are
+    patched by gevent, so the pool is safe under both the gevent and sync workers.
+    """
+
+    def __init__(self, max_size=16):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._info = {}  # abspath -> (mtime, DatasetInfo)
+        self._lock = threading.Lock()
+        self.opens = 0
+
+    @staticmethod
+    def resolve(filename, *directories):
+        for directory in directories:
+            path = os.path.join(directory, filename)
+            if os.path.exists(path): return path
+        return None
+
+    @contextmanager
+    def borrow(self, path, **open_kwargs):
+        entry = self._checkout(path, open_kwargs)
+        try:
+            with entry.lock:
+                yield entry.dataset
+        finally:
+            self._checkin(entry)
+
+    def info(self, path):
+        """Cached ``DatasetInfo`` for ``path``, refreshed when the file changes."""
+        path = os.path.abspath(path)
+        mtime = os.stat(path).st_mtime_ns
+        cached = self._info.get(path)
+        if cached is not None and cached[0] == mtime: return cached[1]
+        with self.borrow(path) as src: info = DatasetInfo(src)
+        with self._lock:
+            self._info[path] = (mtime, info)
+            while len(self._info) > 4 * self.max_size: self._info.pop(next(iter(self._info)))
+        return info
+
+    def invalidate(self, path=None):
+        path = os.path.abspath(path) if path else None
+        with self._lock:
+            for cached in [p for p in self._info if path is None or p == path]: del self._info[cached]
+            for key in [k for k in self._entries if path is None or k[0] == path]:
+                self._retire(self._entries.pop(key))
+
+    def close(self):
+        self.invalidate()
+
+    def _checkout(self, path, open_kwargs):
+        path = os.path.abspath(path)
+        mtime = os.stat(path).st_mtime_ns
+        key = (path, tuple(sorted(open_kwargs.items())))
+        with self._lock:
+            entry = self._lookup(key, mtime)
+            if entry is not None:
+                entry.refs += 1
+                return entry
+        # Opened outside the pool lock, so a slow cold open (a remote COG, a large overview scan)
+        # only delays requests for this path; if two requests race, the loser closes its copy.
+        dataset = rasterio.open(path, **open_kwargs)
+        with self._lock:
+            entry = self._lookup(key, mtime)
+            if entry is None:
+                entry = _PooledDataset(dataset, mtime); dataset = None
+                self.opens += 1
+                self._entries[key] = entry
+                while len(self._entries) > self.max_size:
+                    self._retire(self._entries.popitem(last=False)[1])
+            entry.refs += 1
+        if dataset is not None: dataset.close()
+        return entry
+
+    def _lookup(self, key, mtime):
+        entry = self._entries.get(key)
+        if entry is None: return None
+        if entry.mtime != mtime:
+            self._retire(self._entries.pop(key))
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def _checkin(self, entry):
+        with self._lock:
+            entry.refs -= 1
+            if entry.retired and entry.refs == 0: entry.dataset.close()
+
+    @staticmethod
+    def _retire(entry):
+        entry.retired = True
+        if entry.refs == 0: entry.dataset.close()
@@ -0,0 +1,236 @@
+# result_cache.py
+
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+TOUCH_INTERVAL = 60.0  # seconds between access-time writes for the same result, so hot tiles don't hammer the index
+
+
+def canonical(value):
+    """JSON-stable form of request parameters: sorted keys, and integers and floats of equal value hashing alike."""
+    if isinstance(value, dict): return {str(k): canonical(v) for k, v in sorted(value.items())}
+    if isinstance(value, (list, tuple)): return [canonical(v) for v in value]
+    if isinstance(value, bool) or value is None: return value
+    if isinstance(value, (int, float)): return round(float(value), 9)
+    return value
+
+
+class ResultCache:
+    """Content-addressed analysis outputs in ``cache_dir``, indexed in SQLite and evicted LRU under a byte budget.
+
+    A key hashes the analysis kind, each source file's path, mtime and size, and the canonicalized
+    parameters, so a repeat request is a lookup and an edited DEM misses instead of serving a stale
+    result. The object holds only paths, so it pickles into the job processes, which record their
+    own results.
+    """
+
+    def __init__(self, cache_dir, db_path, max_bytes):
+        self.cache_dir = cache_dir
+        self.db_path = db_path
+        self.max_bytes = max_bytes
+        self._touched = {}
+        self._lock = threading.Lock()
+        self.hits = self.misses = 0
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, kind TEXT NOT NULL, filename TEXT NOT NULL, result TEXT NOT NULL, bytes INTEGER NOT NULL, created REAL, last_access REAL)")
+            conn.execute("CREATE INDEX IF NOT EXISTS results_last_access ON results (last_access)")
+            conn.execute("CREATE INDEX IF NOT EXISTS results_filename ON results (filename)")
+
+    def __getstate__(self):
+        return {'cache_dir': self.cache_dir, 'db_path': self.db_path, 'max_bytes': self.max_bytes}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state, _touched={}, _lock=threading.Lock(), hits=0, misses=0)
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            with conn: yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def key(kind, sources, params):
+        parts = [kind, canonical(params)]
+        for path in sources:
+            stat = os.stat(path); parts.append([os.path.abspath(path), stat.st_mtime_ns, stat.st_size])
+        return hashlib.sha1(json.dumps(parts, separators=(',', ':')).encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def filename(kind, key):
+        return f"{kind}_{key[:16]}.tif"
+
+    def lookup(self, key):
+        with self._connect() as conn:
+            row = conn.execute("SELECT filename, result FROM results WHERE key = ?", (key,)).fetchone()
+            if row is None: self.misses += 1; return None
+            if not os.path.exists(os.path.join(self.cache_dir, row[0])):
+                # Removed behind our back (e.g. by hand); forget it and recompute.
+                conn.execute("DELETE FROM results WHERE key = ?", (key,))
+                self.misses += 1; return None
+            conn.execute("UPDATE results SET last_access = ? WHERE key = ?", (time.time(), key))
+        self.hits += 1
+        return json.loads(row[1])
+
+    def store(self, key, kind, filename, result):
+        now = time.time()
+        size = os.path.getsize(os.path.join(self.cache_dir, filename))
+        with self._connect() as conn:
+            conn.execute("INSERT OR REPLACE INTO results (key, kind, filename, result, bytes, created, last_access) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                         (key, kind, filename, json.dumps(result), size, now, now))
+        self.evict(keep=key)
+
+    def touch(self, filename):
+        """Mark a result as used (e.g. when its tiles are served); throttled per file."""
+        now = time.monotonic()
+        with self._lock:
+            if now - self._touched.get(filename, 0.0) < TOUCH_INTERVAL: return
+            self._touched[filename] = now
+        try:
+            with self._connect() as conn: conn.execute("UPDATE results SET last_access = ? WHERE filename = ?", (time.time(), filename))
+        except sqlite3.Error as e:
+            print(f"WARNING: Could not update result cache access time: {e}")
+
+    def evict(self, keep=None):
+        """Delete least recently used results until the indexed total fits the budget; returns the evicted filenames."""
+        evicted = []
+        with self._connect() as conn:
+            total = conn.execute("SELECT COALESCE(SUM(bytes), 0) FROM results").fetchone()[0]
+            if total <= self.max_bytes: return evicted
+            for key, filename, size in conn.execute("SELECT key, filename, bytes FROM results ORDER BY last_access").fetchall():
+                if total <= self.max_bytes: break
+                if key == keep: continue
+                try: os.remove(os.path.join(self.cache_dir, filename))
+                except FileNotFoundError: pass
+                except OSError as e: print(f"WARNING: Could not evict cached result {filename}: {e}"); continue
+                conn.execute("DELETE FROM results WHERE key = ?", (key,))
+                total -= size; evicted.append(filename)
+        return evicted
+
+    def stats(self):
+        with self._connect() as conn:
+            count, total = conn.execute("SELECT COUNT(*), COALESCE(SUM(bytes), 0) FROM results").fetchone()
+        return {'entries': count, 'bytes': total, 'max_bytes': self.max_bytes}
+
+
+class CachedAnalysis:
+    """Job-pool wrapper: runs ``fn`` with a temporary output name, moves the raster to its content-addressed name and records it.
+
+    Writing under a per-process temporary name and renaming keeps two identical requests that miss
+    at the same time from writing into the same file.
+    """
+
+    def __init__(self, cache, key, kind, fn):
+        self.cache, self.key, self.kind, self.fn = cache, key, kind, fn
+
+    def __call__(self, *args, progress, **kwargs):
+        filename = self.cache.filename(self.kind, self.key)
+        tmp_filename = f"{os.path.splitext(filename)[0]}.{os.getpid()}.tmp.tif"
+        try:
+            result = self.fn(*args, cache_filename=tmp_filename, progress=progress, **kwargs)
+            os.replace(os.path.join(self.cache.cache_dir, tmp_filename), os.path.join(self.cache.cache_dir, filename))
+        finally:
+            if os.path.exists(os.path.join(self.cache.cache_dir, tmp_filename)): os.remove(os.path.join(self.cache.cache_dir, tmp_filename))
+        result = {k: (filename if v == tmp_filename else v) for k, v in result.items()}
+        self.cache.store(self.key, self.kind, filename, result)
+        return result
+
+
+def _tree_size(path):
+    total, mtime = 0, os.stat(path).st_mtime
+    for dirpath, _, files in os.walk(path):
+        for name in files:
+            try: stat = os.stat(os.path.join(dirpath, name))
+            except FileNotFoundError: continue
+            total += stat.st_size
+    return total, mtime
+
+
+class DiskBudget:
+    """Least-recently-used byte budget over the entries directly under ``root``: whole directories, or files sharing a stem.
+
+    Use is recorded as the entry's mtime (``touch``), so any process can account and evict without an index, as the
+    tile cache's disk layer does. Entries used within ``grace`` seconds are never evicted, so files a job or request is
+    still working with stay put; in-progress ``.tmp`` names and names in ``exclude`` are left alone. The object pickles
+    as its settings, so job processes evict after writing.
+    """
+
+    def __init__(self, root, max_bytes, grace=2 * TOUCH_INTERVAL, exclude=()):
+        self.root, self.max_bytes, self.grace, self.exclude = root, max_bytes, grace, tuple(exclude)
+        self._touched = {}
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def __getstate__(self):
+        return {'root': self.root, 'max_bytes': self.max_bytes, 'grace': self.grace, 'exclude': self.exclude}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state, _touched={}, _lock=threading.Lock(), evictions=0)
+
+    def touch(self, path):
+        """Mark an entry (a file or directory under ``root``) as used; throttled per path."""
+        now = time.monotonic()
+        with self._lock:
+            if now - self._touched.get(path, -TOUCH_INTERVAL) < TOUCH_INTERVAL: return
+            self._touched[path] = now
+        try: os.utime(path)
+        except OSError: pass
+
+    def entries(self):
+        """``{stem: [last_used, bytes, paths]}`` for everything under ``root`` that may be evicted."""
+        entries = {}
+        try: listing = list(os.scandir(self.root))
+        except FileNotFoundError: return entries
+        for entry in listing:
+            if entry.name in self.exclude or '.tmp' in entry.name: continue
+            try:
+                if entry.is_dir(follow_symlinks=False): size, mtime = _tree_size(entry.path)
+                else: stat = entry.stat(follow_symlinks=False); size, mtime = stat.st_size, stat.st_mtime
+            except FileNotFoundError: continue
+            group = entries.setdefault(os.path.splitext(entry.name)[0], [0.0, 0, []])
+            group[0] = max(group[0], mtime); group[1] += size; group[2].append(entry.path)
+        return entries
+
+    def usage(self):
+        return sum(size for _, size, _ in self.entries().values())
+
+    def evict(self, keep=()):
+        """Delete least recently used entries until the total fits the budget; stems in ``keep`` stay. Returns the evicted stems."""
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries.values())
+        evicted, cutoff = [], time.time() - self.grace
+        for stem, (last_used, size, paths) in sorted(entries.items(), key=lambda item: item[1][0]):
+            if total <= self.max_bytes or last_used > cutoff: break
+            if stem in keep: continue
+            for path in paths:
+                try:
+                    if os.path.isdir(path): shutil.rmtree(path)
+                    else: os.remove(path)
+                except FileNotFoundError: pass
+                except OSError as e: print(f"WARNING: Could not evict {path}: {e}")
+            total -= size; evicted.append(stem)
+        self.evictions += len(evicted)
+        return evicted
+
+
+class EvictAfter:
+    """Job-pool wrapper: runs ``fn``, then evicts each of ``budgets`` in the job process, so whatever it wrote is accounted for."""
+
+    def __init__(self, fn, budgets):
+        self.fn, self.budgets = fn, budgets
+
+    def __call__(self, *args, **kwargs):
+        try:
+            return self.fn(*args, **kwargs)
+        finally:
+            for budget in self.budgets:
+                try: budget.evict()
+                except Exception as e: print(f"WARNING: Disk cache eviction failed: {e}")
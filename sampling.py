@@ -0,0 +1,110 @@
+# sampling.py
+
+import math
+import threading
+
+import numpy as np
+import pyproj
+from rasterio.windows import Window
+
+from terrain import METRES_PER_DEGREE_LAT, METRES_PER_DEGREE_LON
+
+WGS84 = 'EPSG:4326'
+MAX_WINDOW_CELLS = 4 * 1024 * 1024  # larger point sets are split until each read window is below this
+MAX_PROFILE_SAMPLES = 5000
+GEOD = pyproj.Geod(ellps='WGS84')
+
+# pyproj transformers are not safe to share between threads, so each thread keeps its own cache.
+_local = threading.local()
+
+
+def transformer(src_crs, dst_crs):
+    cache = _local.__dict__.setdefault('transformers', {})
+    key = (str(src_crs), str(dst_crs))
+    if key not in cache: cache[key] = pyproj.Transformer.from_crs(key[0], key[1], always_xy=True)
+    return cache[key]
+
+
+def _bilinear(data, valid, rows, cols):
+    """Bilinear interpolation at fractional (row, col) cell-centre positions; nodata corners are dropped and the rest re-weighted."""
+    h, w = data.shape
+    r0 = np.clip(np.floor(rows).astype(np.int64), 0, max(h - 2, 0)); c0 = np.clip(np.floor(cols).astype(np.int64), 0, max(w - 2, 0))
+    r1, c1 = np.minimum(r0 + 1, h - 1), np.minimum(c0 + 1, w - 1)
+    fr, fc = np.clip(rows - r0, 0, 1), np.clip(cols - c0, 0, 1)
+    total, weight = np.zeros(rows.shape), np.zeros(rows.shape)
+    for rr, cc, wgt in ((r0, c0, (1 - fr) * (1 - fc)), (r0, c1, (1 - fr) * fc), (r1, c0, fr * (1 - fc)), (r1, c1, fr * fc)):
+        ok = valid[rr, cc]
+        total += np.where(ok, data[rr, cc] * wgt, 0); weight += np.where(ok, wgt, 0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(weight > 1e-9, total / weight, np.nan)
+
+
+def _sample_group(src, rows, cols, out, index):
+    r0, r1 = max(int(math.floor(rows.min())), 0), min(int(math.floor(rows.max())) + 2, src.height)
+    c0, c1 = max(int(math.floor(cols.min())), 0), min(int(math.floor(cols.max())) + 2, src.width)
+    if (r1 - r0) * (c1 - c0) > MAX_WINDOW_CELLS and rows.size > 1:
+        # Split along the longer side of the window so each half reads (at most) half the cells.
+        order = np.argsort(rows if r1 - r0 >= c1 - c0 else cols, kind='stable')
+        half = order.size // 2
+        for part in (order[:half], order[half:]): _sample_group(src, rows[part], cols[part], out, index[part])
+        return
+    data = src.read(1, window=Window(c0, r0, c1 - c0, r1 - r0), out_dtype='float64')
+    valid = np.isfinite(data) if src.nodata is None else (data != src.nodata) & np.isfinite(data)
+    out[index] = _bilinear(data, valid, rows - r0, cols - c0)
+
+
+def sample(src, xs, ys):
+    """Bilinear elevations at ``xs``/``ys`` in the dataset CRS; NaN outside the raster or over nodata.
+
+    Only the bounding window of the points is read (split further when it would be large), so a
+    profile across a big DEM touches the cells along its path rather than the whole raster.
+    """
+    xs, ys = np.asarray(xs, dtype='float64'), np.asarray(ys, dtype='float64')
+    out = np.full(xs.shape, np.nan)
+    if not xs.size: return out
+    cols, rows = ~src.transform * (xs, ys)
+    # Positions relative to cell centres; the half-cell fringe at the raster edge clamps to the edge cells.
+    rows, cols = np.asarray(rows) - 0.5, np.asarray(cols) - 0.5
+    inside = np.flatnonzero((rows >= -0.5) & (rows <= src.height - 0.5) & (cols >= -0.5) & (cols <= src.width - 0.5))
+    if inside.size: _sample_group(src, rows[inside], cols[inside], out, inside)
+    return out
+
+
+def sample_lonlat(src, lons, lats):
+    xs, ys = transformer(WGS84, src.crs).transform(np.asarray(lons, dtype='float64'), np.asarray(lats, dtype='float64'))
+    return sample(src, xs, ys)
+
+
+def cell_size_metres(src):
+    if src.crs is not None and src.crs.is_geographic:
+        lat = math.radians((src.bounds.top + src.bounds.bottom) / 2)
+        return min(abs(src.transform.a) * METRES_PER_DEGREE_LON * math.cos(lat), abs(src.transform.e) * METRES_PER_DEGREE_LAT)
+    return min(abs(src.transform.a), abs(src.transform.e))
+
+
+def profile(src, line, spacing_m=None, max_samples=MAX_PROFILE_SAMPLES):
+    """Elevation profile along a WGS84 polyline, sampled every ``spacing_m`` metres (default: the DEM resolution).
+
+    Returns ``(lons, lats, distances_m, elevations)``. Every vertex is included, and the spacing is
+    widened when needed to stay within ``max_samples``.
+    """
+    lons, lats = np.asarray(line, dtype='float64')[:, 0], np.asarray(line, dtype='float64')[:, 1]
+    _, _, seg_lengths = GEOD.inv(lons[:-1], lats[:-1], lons[1:], lats[1:])
+    seg_lengths = np.atleast_1d(seg_lengths)
+    vertex_dist = np.concatenate([[0.0], np.cumsum(seg_lengths)])
+    total = float(vertex_dist[-1])
+    spacing = max(float(spacing_m) if spacing_m else cell_size_metres(src), total / max(max_samples - len(lons), 1), 1e-6)
+    distances = np.union1d(np.arange(0.0, total, spacing), vertex_dist)
+
+    xs, ys = transformer(WGS84, src.crs).transform(lons, lats)
+    xs, ys = np.asarray(xs), np.asarray(ys)
+    seg = np.clip(np.searchsorted(vertex_dist, distances, side='right') - 1, 0, len(seg_lengths) - 1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        t = np.where(seg_lengths[seg] > 0, (distances - vertex_dist[seg]) / seg_lengths[seg], 0.0)
+    px, py = xs[seg] + t * (xs[seg + 1] - xs[seg]), ys[seg] + t * (ys[seg + 1] - ys[seg])
+    out_lons, out_lats = transformer(src.crs, WGS84).transform(px, py)
+    return np.asarray(out_lons), np.asarray(out_lats), distances, sample(src, px, py)
+
+
+def to_json_values(values, digits=3):
+    return [None if not np.isfinite(v) else round(float(v), digits) for v in values]
@@ -0,0 +1,141 @@
+# solar.py
+
+import hashlib
+import json
+import math
+import os
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import pvlib
+import rasterio
+from rasterio.features import rasterize
+from rasterio.windows import Window, from_bounds
+
+from jobs import AnalysisError
+from terrain import NODATA, derive_array
+
+AOD700 = 0.1
+PRECIPITABLE_WATER_CM = 2.5
+ALBEDO = 0.2
+DEFAULT_EFFICIENCY = 0.18
+DEFAULT_PERFORMANCE_RATIO = 0.75
+MAX_ROOF_TILT = 60.0  # steeper DEM gradients under a footprint are wall/edge artefacts, not roofs
+BUILDING_BLOCK = 256  # buildings per transposition block; bounds the (buildings x timestamps) working array
+
+
+def _no_progress(fraction, message=None):
+    pass
+
+
+def _cache_key(dem_path, buildings_path, params):
+    parts = [params]
+    for path in (dem_path, buildings_path):
+        stat = os.stat(path); parts.append([os.path.abspath(path), stat.st_mtime_ns, stat.st_size])
+    return hashlib.sha1(json.dumps(parts, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+
+
+def roof_orientation(dem_path, footprints):
+    """Mean DEM gradient under each footprint as (tilt, azimuth) in degrees, azimuth being the compass direction the roof faces.
+
+    Footprints are rasterized once onto the DEM window that covers them and the Horn gradients are
+    averaged per building with ``bincount``. Footprints that cover no valid cell come back flat.
+    """
+    with rasterio.open(dem_path) as src:
+        footprints = footprints.to_crs(src.crs)
+        window = from_bounds(*footprints.total_bounds, transform=src.transform)
+        col0, row0 = max(math.floor(window.col_off) - 1, 0), max(math.floor(window.row_off) - 1, 0)
+        col1, row1 = min(math.ceil(window.col_off + window.width) + 1, src.width), min(math.ceil(window.row_off + window.height) + 1, src.height)
+        if col1 <= col0 or row1 <= row0: raise AnalysisError("The building footprints do not overlap the DEM.", 422)
+        window = Window(col0, row0, col1 - col0, row1 - row0)
+        dem = src.read(1, window=window, out_dtype='float32')
+        transform, crs, nodata = src.window_transform(window), src.crs, src.nodata
+    dzdx = derive_array(dem, transform, crs, lambda s: s.dzdx, nodata)
+    dzdy = derive_array(dem, transform, crs, lambda s: s.dzdy, nodata)
+    ids = rasterize(((geom, i + 1) for i, geom in enumerate(footprints.geometry)), out_shape=dem.shape, transform=transform, fill=0, all_touched=True, dtype='int32')
+    valid = (ids > 0) & (dzdx != NODATA) & (dzdy != NODATA)
+    counts = np.bincount(ids[valid], minlength=len(footprints) + 1)[1:]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        gx = np.bincount(ids[valid], weights=dzdx[valid], minlength=len(footprints) + 1)[1:] / counts
+        gy = np.bincount(ids[valid], weights=dzdy[valid], minlength=len(footprints) + 1)[1:] / counts
+    gx, gy = np.nan_to_num(gx), np.nan_to_num(gy)
+    tilt = np.minimum(np.degrees(np.arctan(np.hypot(gx, gy))), MAX_ROOF_TILT)
+    # Same convention as terrain aspect: the downslope bearing; flat roofs face south by convention.
+    azimuth = np.where((gx == 0) & (gy == 0), 180.0, np.degrees(np.arctan2(-gx, gy)) % 360)
+    return tilt, azimuth
+
+
+def clearsky_year(lat, lon, year, freq='1h', altitude=0.0):
+    """Sun position and clear-sky irradiance for one site, once per timestamp over a year (daylight rows only)."""
+    step = pd.Timedelta(freq)
+    # Mid-interval timestamps, so summing W/m^2 x step integrates each interval rather than its start.
+    times = pd.date_range(f"{year}-01-01", f"{year + 1}-01-01", freq=freq, inclusive='left', tz='UTC') + step / 2
+    solpos = pvlib.solarposition.get_solarposition(times, lat, lon, altitude=altitude)
+    sky = pvlib.clearsky.simplified_solis(90 - solpos['apparent_zenith'], aod700=AOD700, precipitable_water=PRECIPITABLE_WATER_CM,
+                                          pressure=pvlib.atmosphere.alt2pres(altitude), dni_extra=pvlib.irradiance.get_extra_radiation(times))
+    frame = pd.concat([solpos[['apparent_zenith', 'azimuth']], sky[['ghi', 'dni', 'dhi']]], axis=1).fillna(0)
+    frame[['ghi', 'dni', 'dhi']] = frame[['ghi', 'dni', 'dhi']].clip(lower=0)
+    return frame[frame['apparent_zenith'] < 90], step.total_seconds() / 3600.0
+
+
+def annual_poa(tilt, azimuth, sky, step_hours, albedo=ALBEDO, progress=_no_progress):
+    """Annual plane-of-array irradiation (kWh/m^2) for every (tilt, azimuth), transposed for all timestamps at once.
+
+    The isotropic sky and ground terms are linear in DHI/GHI, so they reduce to one annual sum each; only
+    the beam term needs the full buildings x timestamps array, built a block of buildings at a time.
+    """
+    zenith, sun_azimuth = sky['apparent_zenith'].to_numpy('float32'), sky['azimuth'].to_numpy('float32')
+    dni = sky['dni'].to_numpy('float32')
+    beam = np.empty(len(tilt))
+    for start in range(0, len(tilt), BUILDING_BLOCK):
+        block = slice(start, start + BUILDING_BLOCK)
+        cos_aoi = pvlib.irradiance.aoi_projection(tilt[block, None].astype('float32'), azimuth[block, None].astype('float32'), zenith[None, :], sun_azimuth[None, :])
+        beam[block] = (np.maximum(cos_aoi, 0) * dni[None, :]).sum(axis=1)
+        progress(min(start + BUILDING_BLOCK, len(tilt)) / float(len(tilt)))
+    sky_diffuse = pvlib.irradiance.isotropic(tilt, float(sky['dhi'].sum()))
+    ground = pvlib.irradiance.get_ground_diffuse(tilt, float(sky['ghi'].sum()), albedo=albedo)
+    return (beam + sky_diffuse + ground) * step_hours / 1000.0
+
+
+def rooftop_potential(dem_path, buildings_path, cache_dir, year=None, efficiency=DEFAULT_EFFICIENCY, performance_ratio=DEFAULT_PERFORMANCE_RATIO, freq='1h', progress=_no_progress):
+    """Annual clear-sky rooftop potential for every footprint in ``buildings_path``, cached as a GeoJSON attribute table."""
+    year = int(year or pd.Timestamp.now().year)
+    params = {'year': year, 'efficiency': float(efficiency), 'performance_ratio': float(performance_ratio), 'freq': freq}
+    key = _cache_key(dem_path, buildings_path, params)
+    out_dir = os.path.join(cache_dir, 'solar'); os.makedirs(out_dir, exist_ok=True)
+    table_path, summary_path = os.path.join(out_dir, f"{key}.geojson"), os.path.join(out_dir, f"{key}.json")
+    if os.path.exists(table_path) and os.path.exists(summary_path):
+        with open(summary_path, 'r') as f: return json.load(f)
+
+    progress(0.02, "Reading building footprints")
+    buildings = gpd.read_file(buildings_path)
+    buildings = buildings[buildings.geometry.notna() & ~buildings.geometry.is_empty & buildings.geom_type.isin(['Polygon', 'MultiPolygon'])].reset_index(drop=True)
+    if buildings.empty: raise AnalysisError("The building layer has no polygon footprints.", 422)
+    if buildings.crs is None: buildings = buildings.set_crs('EPSG:4326')
+
+    progress(0.1, "Deriving roof slope and aspect")
+    tilt, azimuth = roof_orientation(dem_path, buildings)
+    area = buildings.to_crs(buildings.estimate_utm_crs()).area.to_numpy()
+    # One sun position per timestamp for the whole town: a few km shifts solar angles by hundredths of a degree.
+    lon0, lat0, lon1, lat1 = buildings.to_crs('EPSG:4326').total_bounds
+
+    progress(0.2, "Computing solar position and irradiance")
+    sky, step_hours = clearsky_year((lat0 + lat1) / 2, (lon0 + lon1) / 2, year, freq=freq)
+    poa = annual_poa(tilt, azimuth, sky, step_hours, progress=lambda f: progress(0.2 + 0.7 * f, "Transposing irradiance to roofs"))
+
+    progress(0.92, "Writing attribute table")
+    result = buildings.to_crs('EPSG:4326')
+    result['building_id'] = np.arange(len(result))
+    result['roof_tilt'] = tilt.round(1); result['roof_azimuth'] = azimuth.round(1); result['area_m2'] = area.round(1)
+    result['poa_kwh_m2'] = poa.round(1)
+    result['potential_kwh'] = (poa * area * efficiency * performance_ratio).round(0)
+    tmp_path = f"{table_path}.{os.getpid()}.tmp"
+    result.to_file(tmp_path, driver='GeoJSON'); os.replace(tmp_path, table_path)
+    summary = {
+        'table_filename': f"{key}.geojson", 'building_count': int(len(result)), 'year': year,
+        'total_potential_kwh': float(result['potential_kwh'].sum()),
+        'stats': {'min': float(poa.min()), 'max': float(poa.max())},
+    }
+    with open(summary_path, 'w') as f: json.dump(summary, f)
+    return summary
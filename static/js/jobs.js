@@ -0,0 +1,26 @@
+// static/js/jobs.js
+
+const JOB_POLL_INTERVAL_MS = 1000;
+
+/**
+ * Starts a long-running analysis as a background job and polls it until it finishes.
+ * Resolves with the job's result Response, so callers can use it exactly like a direct fetch.
+ * onProgress(fraction, message) is called on every poll while the job runs.
+ */
+export async function runJob(url, payload, onProgress) {
+    const response = await fetch(url, { method: 'POST', headers: { 'Content-Type': 'application/json' }, body: JSON.stringify({ ...payload, async: true }) });
+    if (response.status !== 202) return response;
+    const { job_id } = await response.json();
+    while (true) {
+        await new Promise(resolve => setTimeout(resolve, JOB_POLL_INTERVAL_MS));
+        const statusResponse = await fetch(`/api/jobs/${job_id}`);
+        const job = await statusResponse.json();
+        if (!statusResponse.ok) throw new Error(job.error || 'Lost track of the analysis job.');
+        if (onProgress && job.status === 'running') onProgress(job.progress || 0, job.message);
+        if (['succeeded', 'failed', 'cancelled'].includes(job.status)) return fetch(`/api/jobs/${job_id}/result`);
+    }
+}
+
+export function cancelJob(jobId) {
+    return fetch(`/api/jobs/${jobId}/cancel`, { method: 'POST' });
+}
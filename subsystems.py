@@ -0,0 +1,114 @@
+# subsystems.py
+
+import importlib
+import sys
+import threading
+import time
+
+
+class LazyModule:
+    """Stands in for a module until an attribute is first used; ``bool()`` tells whether an optional module is installed."""
+
+    __slots__ = ('_registry', '_name', '_optional')
+
+    def __init__(self, registry, name, optional=False):
+        self._registry = registry
+        self._name = name
+        self._optional = optional
+
+    def __getattr__(self, attr):
+        module = self._registry.load(self._name, self._optional)
+        if module is None: raise AttributeError(f"Optional module '{self._name}' is not installed.")
+        return getattr(module, attr)
+
+    def __bool__(self):
+        return self._registry.load(self._name, self._optional) is not None
+
+    def __repr__(self):
+        return f"<lazy module '{self._name}'>"
+
+
+class Deferred:
+    """Picklable ``module.function`` reference, imported where it is called.
+
+    Job functions are handed to the process pool this way, so the web worker never imports the
+    heavy analysis stack just to submit a job.
+    """
+
+    def __init__(self, target):
+        self.target = target
+
+    def __call__(self, *args, **kwargs):
+        module, attr = self.target.rsplit('.', 1)
+        return getattr(REGISTRY.load(module), attr)(*args, **kwargs)
+
+    def __repr__(self):
+        return f"<deferred {self.target}>"
+
+
+class Subsystems:
+    """Registry of heavy modules loaded on first use, with per-module load times for the import report."""
+
+    def __init__(self):
+        self._names = {}  # name -> optional
+        self._modules = {}
+        self._timings = {}
+        self._lock = threading.RLock()
+
+    def register(self, *names, optional=False):
+        for name in names: self._names.setdefault(name, optional)
+
+    def lazy(self, name, optional=False):
+        self._names.setdefault(name, optional)
+        return LazyModule(self, name, optional)
+
+    def deferred(self, target):
+        self._names.setdefault(target.rsplit('.', 1)[0], False)
+        return Deferred(target)
+
+    def load(self, name, optional=False):
+        if name in self._modules: return self._modules[name]
+        with self._lock:
+            if name in self._modules: return self._modules[name]
+            already = name in sys.modules
+            started = time.perf_counter()
+            try:
+                module = importlib.import_module(name)
+            except ImportError as e:
+                if not optional: raise
+                print(f"WARNING: Optional module '{name}' is not available ({e}); features that need it are disabled.")
+                module = None
+            # Time spent here includes any dependencies nothing else had imported yet.
+            self._timings[name] = {'seconds': 0.0 if already else round(time.perf_counter() - started, 4), 'available': module is not None, 'loaded_at': time.time()}
+            self._modules[name] = module
+            return module
+
+    def record(self, name, seconds):
+        self._timings[name] = {'seconds': round(seconds, 4), 'available': True, 'loaded_at': time.time()}
+
+    def report(self):
+        loaded = sorted(({'name': name, **timing} for name, timing in self._timings.items()), key=lambda entry: -entry['seconds'])
+        return {'loaded': loaded, 'pending': sorted(name for name in self._names if name not in self._modules)}
+
+    def warm_up(self, names=None, delay=0.0):
+        """Preload ``names`` (default: every registered module) on a background thread, a greenlet under gevent.
+
+        The delay lets the worker answer its first requests before the imports, which hold the
+        interpreter while they run, begin.
+        """
+        names = list(self._names) if names is None else list(names)
+
+        def run():
+            time.sleep(delay)
+            for name in names:
+                try: self.load(name, self._names.get(name, False))
+                except Exception as e: print(f"WARNING: Warm-up could not load {name}: {e}")
+                time.sleep(0)  # yield to pending requests between modules
+
+        thread = threading.Thread(target=run, name="subsystem-warm-up", daemon=True)
+        thread.start()
+        return thread
+
+
+# One registry per process, shared by every module that defers its heavy imports.
+REGISTRY = Subsystems()
@@ -0,0 +1,207 @@
+# terrain.py
+
+import math
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import rasterio
+from rasterio.windows import Window
+
+NODATA = -9999.0
+BLOCK_SIZE = 1024
+STATS_SAMPLE_SIZE = 1 << 20
+OUTPUT_PROFILE = {'driver': 'GTiff', 'dtype': 'float32', 'count': 1, 'nodata': NODATA, 'tiled': True, 'blockxsize': 256, 'blockysize': 256,
+                  'compress': 'deflate', 'predictor': 3, 'BIGTIFF': 'IF_SAFER'}
+# Metres per degree, for DEMs stored in geographic coordinates.
+METRES_PER_DEGREE_LAT = 110540.0
+METRES_PER_DEGREE_LON = 111320.0
+
+
+class Surface:
+    """Horn (1981) derivatives of one DEM block; attributes are computed on first use and cached."""
+
+    def __init__(self, padded, xres, yres):
+        # ``padded`` carries a one-cell halo; xres is a column of per-row cell widths for geographic DEMs.
+        self.padded = padded
+        self.z = padded[1:-1, 1:-1]
+        self.xres = xres
+        self.yres = yres
+        self._cache = {}
+
+    def _cell(self, dr, dc):
+        h, w = self.z.shape
+        return self.padded[1 + dr:1 + dr + h, 1 + dc:1 + dc + w]
+
+    def __getattr__(self, name):
+        if name.startswith('_') or name not in DERIVATIVES: raise AttributeError(name)
+        if name not in self._cache: self._cache[name] = DERIVATIVES[name](self)
+        return self._cache[name]
+
+    @property
+    def dzdx(self):
+        if 'dzdx' not in self._cache:
+            c = self._cell
+            self._cache['dzdx'] = ((c(-1, 1) + 2 * c(0, 1) + c(1, 1)) - (c(-1, -1) + 2 * c(0, -1) + c(1, -1))) / (8 * self.xres)
+        return self._cache['dzdx']
+
+    @property
+    def dzdy(self):
+        # Positive towards the south (increasing row), as in the raster grid.
+        if 'dzdy' not in self._cache:
+            c = self._cell
+            self._cache['dzdy'] = ((c(1, -1) + 2 * c(1, 0) + c(1, 1)) - (c(-1, -1) + 2 * c(-1, 0) + c(-1, 1))) / (8 * self.yres)
+        return self._cache['dzdy']
+
+
+def _slope_percent(s):
+    return np.hypot(s.dzdx, s.dzdy) * 100
+
+
+def _slope_degrees(s):
+    return np.degrees(np.arctan(np.hypot(s.dzdx, s.dzdy)))
+
+
+def _aspect(s):
+    # Compass bearing of the downslope direction; flat cells get -1 like richdem did.
+    aspect = np.degrees(np.arctan2(-s.dzdx, s.dzdy)) % 360
+    return np.where((s.dzdx == 0) & (s.dzdy == 0), -1, aspect)
+
+
+def _hillshade(s, azimuth=315.0, altitude=45.0):
+    zenith = math.radians(90 - altitude)
+    slope = np.arctan(np.hypot(s.dzdx, s.dzdy))
+    aspect = np.radians(np.degrees(np.arctan2(-s.dzdx, s.dzdy)) % 360)
+    shade = math.cos(zenith) * np.cos(slope) + math.sin(zenith) * np.sin(slope) * np.cos(math.radians(azimuth) - aspect)
+    return np.clip(shade, 0, 1) * 255
+
+
+def _curvature(s):
+    # Total curvature (Zevenbergen & Thorne), in 1/100 z-units like richdem's 'curvature'.
+    c = s._cell
+    d = ((c(0, -1) + c(0, 1)) / 2 - s.z) / (s.xres ** 2)
+    e = ((c(-1, 0) + c(1, 0)) / 2 - s.z) / (s.yres ** 2)
+    return -2 * (d + e) * 100
+
+
+DERIVATIVES = {
+    'slope_degrees': _slope_degrees,
+    'slope_percent': _slope_percent,
+    'aspect': _aspect,
+    'hillshade': _hillshade,
+    'curvature': _curvature,
+}
+
+
+def _cell_sizes(transform, crs, row_start, rows):
+    xres, yres = abs(transform.a), abs(transform.e)
+    if crs is None or not crs.is_geographic: return np.float32(xres), np.float32(yres)
+    lats = transform.f + transform.e * (np.arange(row_start, row_start + rows) + 0.5)
+    xres_m = xres * METRES_PER_DEGREE_LON * np.cos(np.radians(lats))
+    return np.maximum(xres_m, 1e-6).astype('float32')[:, None], np.float32(yres * METRES_PER_DEGREE_LAT)
+
+
+def _evaluate(derivative, surface):
+    values = derivative(surface) if callable(derivative) else getattr(surface, derivative)
+    values = np.asarray(values, dtype='float32')
+    return np.where(np.isfinite(values) & np.isfinite(surface.z), values, NODATA).astype('float32')
+
+
+def derive_array(dem, transform, crs, derivative, nodata=None):
+    """Single in-memory derivative of a (small) DEM array, with the same edge handling as the windowed engine."""
+    dem = dem.astype('float32')
+    if nodata is not None: dem[dem == nodata] = np.nan
+    xres, yres = _cell_sizes(transform, crs, 0, dem.shape[0])
+    return _evaluate(derivative, Surface(np.pad(dem, 1, mode='edge'), xres, yres))
+
+
+def _block_windows(width, height, block_size):
+    return [Window(col, row, min(block_size, width - col), min(block_size, height - row))
+            for row in range(0, height, block_size) for col in range(0, width, block_size)]
+
+
+class _Reader:
+    """One dataset handle per thread; GDAL handles must not be shared across threads."""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._handles = []
+        self._lock = threading.Lock()
+
+    def get(self):
+        src = getattr(self._local, 'src', None)
+        if src is None:
+            src = self._local.src = rasterio.open(self.path)
+            with self._lock: self._handles.append(src)
+        return src
+
+    def close(self):
+        for src in self._handles: src.close()
+
+
+def _read_padded(src, window):
+    """Block plus a one-cell halo; halo cells outside the raster repeat the edge."""
+    col0, row0 = max(window.col_off - 1, 0), max(window.row_off - 1, 0)
+    col1, row1 = min(window.col_off + window.width + 1, src.width), min(window.row_off + window.height + 1, src.height)
+    data = src.read(1, window=Window(col0, row0, col1 - col0, row1 - row0), out_dtype='float32')
+    if src.nodata is not None: data[data == src.nodata] = np.nan
+    pad = ((window.row_off - row0 == 0, window.row_off + window.height + 1 - row1), (window.col_off - col0 == 0, window.col_off + window.width + 1 - col1))
+    return np.pad(data, tuple((int(a), int(b)) for a, b in pad), mode='edge')
+
+
+def compute_derivatives(dem_path, outputs, block_size=BLOCK_SIZE, workers=None, progress=None):
+    """Write terrain derivatives of ``dem_path`` block by block.
+
+    ``outputs`` maps an output path to a name from ``DERIVATIVES`` or to a callable taking a
+    :class:`Surface`. Only one block (plus halo) per worker is in memory at a time, always as
+    float32. Returns ``{output_path: {"min": p2, "max": p98}}`` from a bounded random sample.
+    """
+    workers = workers or min(4, os.cpu_count() or 1)
+    reader = _Reader(dem_path)
+    with rasterio.open(dem_path) as src:
+        profile = dict(OUTPUT_PROFILE, width=src.width, height=src.height, crs=src.crs, transform=src.transform)
+        transform, crs, width, height = src.transform, src.crs, src.width, src.height
+    windows = _block_windows(width, height, block_size)
+    sample_rate = min(1.0, STATS_SAMPLE_SIZE / float(width * height))
+    samples = {path: [] for path in outputs}
+
+    def work(window):
+        padded = _read_padded(reader.get(), window)
+        xres, yres = _cell_sizes(transform, crs, window.row_off, window.height)
+        surface = Surface(padded, xres, yres)
+        return window, {path: _evaluate(derivative, surface) for path, derivative in outputs.items()}
+
+    def write(future):
+        window, results = future.result()
+        rng = np.random.default_rng(window.row_off * width + window.col_off)
+        for path, values in results.items():
+            sinks[path].write(values, 1, window=window)
+            valid = values[values != NODATA]
+            if valid.size: samples[path].append(valid[rng.random(valid.size) < sample_rate] if sample_rate < 1 else valid)
+
+    sinks = {path: rasterio.open(f"{path}.{os.getpid()}.tmp", 'w', **profile) for path in outputs}
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            pending = []
+            for done, window in enumerate(windows):
+                pending.append(executor.submit(work, window))
+                # Bounded read-ahead keeps memory flat no matter how many blocks the DEM has.
+                if len(pending) >= workers * 2: write(pending.pop(0))
+                if progress: progress((done + 1 - len(pending)) / len(windows))
+            while pending: write(pending.pop(0))
+    except BaseException:
+        for sink in sinks.values(): sink.close()
+        for path in outputs:
+            if os.path.exists(f"{path}.{os.getpid()}.tmp"): os.remove(f"{path}.{os.getpid()}.tmp")
+        raise
+    finally:
+        reader.close()
+    for path, sink in sinks.items():
+        sink.close(); os.replace(f"{path}.{os.getpid()}.tmp", path)
+    stats = {}
+    for path, parts in samples.items():
+        values = np.concatenate(parts) if parts else np.empty(0, dtype='float32')
+        stats[path] = {"min": float(np.percentile(values, 2)), "max": float(np.percentile(values, 98))} if values.size else None
+    return stats
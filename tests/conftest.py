@@ -0,0 +1,34 @@
+# conftest.py
+
+import os
+import sys
+
+import pytest
+
+# The modules live at the repository root, next to app.py.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope="session")
+def server(tmp_path_factory):
+    """``app`` imported against an empty data tree; it derives its data paths from the working directory."""
+    workdir = tmp_path_factory.mktemp("app")
+    os.environ['CATALOG_BACKGROUND_INDEX'] = '0'
+    cwd = os.getcwd(); os.chdir(workdir)
+    try:
+        import app
+    finally:
+        os.chdir(cwd)
+    return app
+
+
+def write_dem(path, size=64, crs='EPSG:4326', origin=(78.84, 10.39), cell=0.0001, data=None):
+    """A small float32 DEM; ``data`` defaults to a gentle slope."""
+    import numpy as np
+    import rasterio
+    from rasterio.transform import from_origin
+    if data is None: data = (np.arange(size, dtype='float32')[:, None] + np.arange(size, dtype='float32')[None, :]) * 0.5 + 100
+    with rasterio.open(path, 'w', driver='GTiff', width=data.shape[1], height=data.shape[0], count=1, dtype='float32', crs=crs,
+                       transform=from_origin(origin[0], origin[1], cell, cell), nodata=-9999) as dst:
+        dst.write(data.astype('float32'), 1)
+    return path
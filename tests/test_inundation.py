@@ -0,0 +1,52 @@
+# test_inundation.py
+
+import numpy as np
+import pytest
+import rasterio
+from affine import Affine
+from rasterio.crs import CRS
+
+import inundation
+
+TRANSFORM = Affine(10.0, 0, 500000.0, 0, -10.0, 1200000.0)
+CRS_UTM = CRS.from_epsg(32644)
+
+
+def _last_frame(out, dem=None, **kwargs):
+    dem = np.full((200, 200), 10.0, dtype='float32') if dem is None else dem
+    inundation.simulate(dem, TRANSFORM, CRS_UTM, str(out), duration_s=3600.0, frames=4, **kwargs)
+    with rasterio.open(str(out)) as src: return src.read(src.count)
+
+
+def test_water_spreads_from_both_inflows(tmp_path):
+    both = _last_frame(tmp_path / "both.tif", inflows=[(20, 20, 5.0), (180, 180, 0.01)])
+    alone = _last_frame(tmp_path / "alone.tif", inflows=[(180, 180, 0.01)])
+    assert both[20, 21] > 0 and both[25, 20] > 0
+    # The weak source spreads as it does alone instead of piling up in its own cell.
+    assert both[180, 180] == pytest.approx(alone[180, 180], abs=0.01)
+    assert (both[170:191, 170:191] > 0).sum() == (alone[170:191, 170:191] > 0).sum()
+
+
+def test_rain_on_still_water_does_not_route_the_whole_dem(tmp_path, monkeypatch):
+    steps = []
+    step = inundation._step
+    monkeypatch.setattr(inundation, '_step', lambda z, *args: (steps.append(z.shape), step(z, *args)))
+    # A flat plain walled in by nodata: rain ponds where it falls and nothing drains off the edges.
+    dem = np.full((200, 200), 10.0, dtype='float32'); dem[[0, -1], :] = np.nan; dem[:, [0, -1]] = np.nan
+    frame = _last_frame(tmp_path / "rain.tif", dem=dem, rainfall_mm_hr=30.0, inflows=[(20, 20, 1.0)])
+    # One probe step of the whole DEM per frame; otherwise only the cells around the inflow are routed.
+    assert sum(shape == (200, 200) for shape in steps) <= 4
+    assert len(steps) > 4
+    # Rain that fell outside the window is still credited to the frames.
+    assert frame[150, 150] == pytest.approx(0.030, abs=1e-4)
+
+
+def test_shrinking_window_zeroes_the_faces_it_gives_up():
+    window = inundation._ActiveWindow((10, 10))
+    window.include([0, 9], [0, 9])
+    qx, qy = np.ones((10, 9), dtype='float32'), np.ones((9, 10), dtype='float32')
+    active = np.zeros((10, 10), dtype=bool); active[5, 5] = True
+    window.update(active, qx, qy)
+    assert window.bounds == (4, 7, 4, 7)
+    assert qx[4:7, 4:6].all() and qx.sum() == 3 * 2
+    assert qy[4:6, 4:7].all() and qy.sum() == 2 * 3
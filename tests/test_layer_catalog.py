@@ -0,0 +1,27 @@
+# test_layer_catalog.py
+
+import os
+
+from conftest import write_dem
+from layer_catalog import LayerCatalog, list_directory, raster_layer_info
+
+
+def test_new_dem_is_listed_on_first_request(server):
+    write_dem(os.path.join(server.ELEVATION_DATA_PATH, 'fresh_upload.tif'))
+    client = server.app.test_client()
+    layers = {layer['id']: layer for layer in client.get('/api/elevation_layers').get_json()}
+    assert 'fresh_upload.tif' in layers
+    assert layers['fresh_upload.tif']['pending'] and layers['fresh_upload.tif']['stats'] is None
+    server.CATALOG._worker.join(timeout=30)
+    layers = {layer['id']: layer for layer in client.get('/api/elevation_layers').get_json()}
+    assert not layers['fresh_upload.tif'].get('pending') and layers['fresh_upload.tif']['stats']['max'] > layers['fresh_upload.tif']['stats']['min']
+
+
+def test_unreadable_raster_is_indexed_once(tmp_path):
+    (tmp_path / 'broken.tif').write_bytes(b'not a tiff')
+    calls = []
+    catalog = LayerCatalog(str(tmp_path / 'catalog.sqlite'))
+    catalog.register('raster', lambda: list_directory(str(tmp_path)), lambda path: calls.append(path) or raster_layer_info(path))
+    catalog.refresh(); catalog.refresh()
+    assert len(calls) == 1
+    assert catalog.get('raster', 'broken.tif')['error']
@@ -0,0 +1,88 @@
+# test_pointcloud.py
+
+import json
+import os
+import tracemalloc
+
+import numpy as np
+
+import pointcloud
+
+
+def _flat_buffers(cache_dir, count, seed=0):
+    """The octree input ``preprocess`` writes, for ``count`` points scattered over a 1 km square."""
+    rng = np.random.default_rng(seed)
+    positions = np.empty((count, 3), dtype=np.float32)
+    positions[:, :2] = rng.uniform(-500, 500, (count, 2)); positions[:, 2] = rng.uniform(-20, 20, count)
+    positions.tofile(os.path.join(cache_dir, "p_positions.bin"))
+    rng.integers(0, 256, (count, 3), dtype=np.uint8).tofile(os.path.join(cache_dir, "p_color_rgb_u8.bin"))
+    return {"point_count": count, "bbox": {"min": positions.min(axis=0).tolist(), "max": positions.max(axis=0).tolist()}, "color_attributes": ["rgb"],
+            "files": {"colors": {"rgb": "p_color_rgb_u8.bin"}}}
+
+
+def _nodes(cache_dir, octree):
+    with open(os.path.join(cache_dir, octree['hierarchy'])) as f: return json.load(f)['nodes']
+
+
+def test_octree_memory_is_bounded_by_the_chunk_size(tmp_path):
+    count = 1_000_000
+    meta = _flat_buffers(str(tmp_path), count)
+    tracemalloc.start()
+    try:
+        octree = pointcloud.build_octree(str(tmp_path), "p", meta, str(tmp_path / "p_positions.bin"), budget=4096, chunk_size=50_000)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    # Sorting the whole file would need a Morton code and a sort index per point: 16 MB here.
+    assert peak < 16 * count
+    nodes = _nodes(str(tmp_path), octree)
+    assert sum(node['count'] for node in nodes.values()) == count
+    assert all(f"{node_id}{digit}" in nodes for node_id, node in nodes.items() for digit in node['children'])
+    assert sorted(os.listdir(tmp_path)) == ["p_color_rgb_u8.bin", "p_octree", "p_positions.bin"]
+
+
+def test_streamed_and_in_memory_octrees_keep_every_point_once(tmp_path):
+    meta = _flat_buffers(str(tmp_path), 40_000)
+    positions = np.fromfile(tmp_path / "p_positions.bin", dtype=np.float32).reshape(-1, 3)
+    for chunk_size in (40_000, 5_000):
+        nodes = _nodes(str(tmp_path), pointcloud.build_octree(str(tmp_path), "p", meta, str(tmp_path / "p_positions.bin"), budget=1024, chunk_size=chunk_size))
+        decoded = []
+        for node_id, node in nodes.items():
+            raw = np.fromfile(tmp_path / "p_octree" / f"{node_id}.bin", dtype=np.uint8)
+            decoded.append(raw[:node['count'] * 6].view(np.uint16).reshape(-1, 3) * node['scale'] + np.array(node['min']))
+        decoded = np.concatenate(decoded)
+        assert len(decoded) == len(positions)
+        assert np.allclose(np.sort(decoded[:, 0]), np.sort(positions[:, 0]), atol=0.01)
+
+
+def test_preprocess_writes_uint16_positions_and_no_float32_buffers(tmp_path, monkeypatch):
+    rng = np.random.default_rng(1)
+    points = np.zeros(30_000, dtype=[('X', 'f8'), ('Y', 'f8'), ('Z', 'f8'), ('Red', 'u2'), ('Green', 'u2'), ('Blue', 'u2'), ('Classification', 'u1')])
+    points['X'] = rng.uniform(350000, 352000, points.size); points['Y'] = rng.uniform(1150000, 1151500, points.size); points['Z'] = rng.uniform(40, 90, points.size)
+    points['Red'] = 65535; points['Classification'] = 2
+    monkeypatch.setattr(pointcloud, 'pdal', object())
+    monkeypatch.setattr(pointcloud, 'quick_bounds', lambda path: (None, points.size))
+    monkeypatch.setattr(pointcloud, 'iter_chunks', lambda path, chunk_size: (points[i:i + chunk_size] for i in range(0, points.size, chunk_size)))
+    meta = pointcloud.preprocess("scan.las", str(tmp_path), "scan", chunk_size=7_000)
+
+    assert meta['point_count'] == points.size and meta['encoding']['position_type'] == "uint16"
+    assert not [name for name in os.listdir(tmp_path) if name.endswith(('.tmp', '_f32.bin')) or name == "scan_positions.bin"]
+    quantized = np.fromfile(tmp_path / meta['files']['positions'], dtype=np.uint16).reshape(-1, 3)
+    decoded = quantized * np.array(meta['encoding']['scale']) + np.array(meta['encoding']['offset'])
+    center = (np.array(meta['bbox']['min']) + np.array(meta['bbox']['max'])) / 2
+    original = np.stack([points['X'], points['Y'], points['Z']], axis=1) - center
+    # A 2 km extent over 65535 steps: within half a step (about 1.5 cm) on each axis; the 50 m of Z keeps millimetres.
+    assert (np.abs(decoded - original) <= np.array(meta['encoding']['scale']) / 2 + 1e-4).all()  # plus float32 rounding
+    assert meta['encoding']['scale'][2] == pointcloud.POSITION_PRECISION
+    rgb = np.fromfile(tmp_path / meta['files']['colors']['rgb'], dtype=np.uint8).reshape(-1, 3)
+    assert (rgb == [255, 0, 0]).all()
+    assert sum(node['count'] for node in _nodes(str(tmp_path), meta['octree']).values()) == points.size
+
+
+def test_pointcloud_buffers_are_not_served_outside_the_cache(server):
+    secret = os.path.join(os.path.dirname(server.CACHE_PATH), "secret.bin")
+    for path in (secret, secret + ".gz"):
+        with open(path, 'wb') as f: f.write(b"x" * 100)
+    client = server.app.test_client()
+    for url in ("/api/get_pointcloud_data/..%2fsecret.bin", "/api/get_pointcloud_data/../secret.bin", "/api/pointcloud_node/..%2f..%2fx/r"):
+        assert client.get(url, headers={"Accept-Encoding": "gzip, br"}).status_code == 404
@@ -0,0 +1,78 @@
+# test_result_cache.py
+
+import os
+import time
+
+import pytest
+
+from conftest import write_dem
+from dem_arrays import DemArrayCache
+from result_cache import DiskBudget
+
+
+def _age(path, seconds):
+    then = time.time() - seconds
+    os.utime(path, (then, then))
+
+
+def _write(path, size, age):
+    with open(path, 'wb') as f: f.write(b"x" * size)
+    _age(path, age)
+
+
+def test_budget_evicts_least_recently_used_entries(tmp_path):
+    _write(tmp_path / "old.npy", 400, 500); _write(tmp_path / "old.json", 100, 500)
+    _write(tmp_path / "middle.tif", 500, 400)
+    (tmp_path / "hash").mkdir(); _write(tmp_path / "hash" / "flowdir.tif", 500, 300); _age(tmp_path / "hash", 300)
+    _write(tmp_path / "fresh.tif", 500, 0)
+    (tmp_path / "sources").mkdir(); _write(tmp_path / "sources" / "memo.json", 500, 900); _age(tmp_path / "sources", 900)
+    _write(tmp_path / "partial.tif.123.tmp", 500, 900)
+    budget = DiskBudget(str(tmp_path), max_bytes=1000, exclude=('sources',))
+
+    assert budget.usage() == 2000
+    assert budget.evict(keep=('middle',)) == ['old', 'hash']
+    assert sorted(os.listdir(tmp_path)) == ["fresh.tif", "middle.tif", "partial.tif.123.tmp", "sources"]
+    # Entries used within the grace period stay even over budget.
+    budget.max_bytes = 0
+    assert budget.evict(keep=('middle',)) == [] and os.path.exists(tmp_path / "fresh.tif")
+
+
+def test_touch_moves_an_entry_to_the_back_of_the_queue(tmp_path):
+    for name, age in (("a.tif", 300), ("b.tif", 200)): _write(tmp_path / name, 600, age)
+    budget = DiskBudget(str(tmp_path), max_bytes=1000, grace=0)
+    budget.touch(str(tmp_path / "a.tif"))
+    assert budget.evict() == ['b']
+
+
+def test_dem_arrays_stay_within_their_budget(tmp_path):
+    cache = DemArrayCache(str(tmp_path / "arrays"), max_bytes=40 * 1000)
+    cache.budget.grace = 0
+    dems = [write_dem(str(tmp_path / f"dem{i}.tif"), size=64) for i in range(3)]  # 64 * 64 float32 = 16 KB each
+    for i, dem in enumerate(dems):
+        before = set(os.listdir(cache.root))
+        cache.get(dem)
+        for name in set(os.listdir(cache.root)) - before: _age(os.path.join(cache.root, name), 100 * (3 - i))
+    assert cache.stats()['files'] == 2 and cache.stats()['evictions'] == 1
+    assert not cache.ready(dems[0]) and cache.ready(dems[2])
+
+
+def test_borrowed_dem_arrays_are_neither_evicted_nor_dropped(tmp_path):
+    cache = DemArrayCache(str(tmp_path / "arrays"), max_attached=1, max_bytes=0)
+    cache.budget.grace = 0
+    first, second = write_dem(str(tmp_path / "first.tif")), write_dem(str(tmp_path / "second.tif"))
+    with cache.borrow(first) as dem:
+        cache.get(second)
+        assert cache.evict() and cache.ready(first) and not cache.ready(second)
+        assert cache.stats()['attached'] == 1 and cache.get(first) is dem and float(dem.data[0, 0]) == 100
+    assert cache.evict() and not cache.ready(first)
+
+
+def test_elevation_reads_do_not_decode_the_whole_dem(server, tmp_path, monkeypatch):
+    dem_path = write_dem(str(tmp_path / "sampled.tif"))
+    monkeypatch.setattr(server.JOBS, 'submit', lambda *args, **kwargs: pytest.fail("scheduled a job for a sample"))
+    with server.borrow_elevation_source(dem_path) as src:
+        assert hasattr(src, 'read')
+    assert not server.DEM_ARRAYS.ready(dem_path)
+    server.DEM_ARRAYS.materialize(dem_path)
+    with server.borrow_elevation_source(dem_path) as src:
+        assert src.data.shape == (64, 64)
@@ -0,0 +1,29 @@
+# test_tile_cache.py
+
+import os
+import time
+
+from tile_cache import TileCache
+
+
+def _tiles_on_disk(cache):
+    return {os.path.basename(path)[:-4] for _, _, path in cache._disk_entries()}
+
+
+def test_disk_store_stays_under_budget(tmp_path):
+    cache = TileCache(str(tmp_path / "tiles"), max_bytes=0, disk_bytes=10 * 1000)
+    for i in range(40):
+        cache.put(f"{i:040x}", b"x" * 1000)
+    assert sum(size for _, size, _ in cache._disk_entries()) <= 10 * 1000
+    assert cache.disk_evictions >= 30
+
+
+def test_disk_eviction_keeps_recently_read_tiles(tmp_path):
+    cache = TileCache(str(tmp_path / "tiles"), max_bytes=0, disk_bytes=5 * 1000)
+    keys = [f"{i:040x}" for i in range(5)]
+    for key in keys:
+        cache.put(key, b"x" * 1000); time.sleep(0.01)
+    assert cache.get(keys[0]) == b"x" * 1000  # a disk hit makes it the most recently used
+    cache.put(f"{99:040x}", b"x" * 1000)
+    assert keys[0] in _tiles_on_disk(cache)
+    assert keys[1] not in _tiles_on_disk(cache)
@@ -0,0 +1,152 @@
+# tile_cache.py
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+
+class _InFlight:
+    __slots__ = ('event', 'value', 'error')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class TileCache:
+    """Two-level cache of rendered tiles: a byte-bounded in-process LRU in front of a disk store.
+
+    Keys fold in the source file's mtime, so editing or regenerating a raster naturally
+    misses the old entries instead of serving stale tiles. The key doubles as a strong ETag.
+    Those dead entries age out of the disk store, which is kept under ``disk_bytes`` by deleting
+    the least recently used tiles (by mtime, refreshed on every disk hit).
+    Rendered metatiles, the images tiles are sliced from, are kept in a second byte-bounded LRU,
+    and concurrent misses anywhere in a block share one render.
+    """
+
+    def __init__(self, root, max_bytes=64 * 1024 * 1024, metatile_bytes=64 * 1024 * 1024, disk_bytes=1024 * 1024 * 1024):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._memory = OrderedDict()
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+        self.hits = {'memory': 0, 'disk': 0}
+        self.misses = 0
+        self.metatile_bytes = metatile_bytes
+        self._metatiles = OrderedDict()  # group -> (image array, PIL mode)
+        self._metatiles_held = 0
+        self._inflight = {}
+        self.renders = self.coalesced = self.metatile_hits = 0
+        self.disk_bytes = disk_bytes
+        self._disk_used = None  # measured on the first write
+        self._evicting = threading.Lock()
+        self.disk_evictions = 0
+        os.makedirs(root, exist_ok=True)
+
+    @staticmethod
+    def key(path, kind, z, x, y, params=None):
+        stat = os.stat(path)
+        raw = json.dumps([os.path.abspath(path), stat.st_mtime_ns, stat.st_size, kind, z, x, y, sorted((params or {}).items())])
+        return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        with self._lock:
+            data = self._memory.get(key)
+            if data is not None:
+                self._memory.move_to_end(key); self.hits['memory'] += 1
+                return data
+        try:
+            with open(self._disk_path(key), 'rb') as f: data = f.read()
+            os.utime(self._disk_path(key))
+        except OSError:
+            with self._lock: self.misses += 1
+            return None
+        with self._lock: self.hits['disk'] += 1
+        self._remember(key, data)
+        return data
+
+    def put(self, key, data):
+        self._remember(key, data)
+        path = self._disk_path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f: f.write(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"WARNING: Could not persist tile {key}: {e}")
+            return
+        with self._lock:
+            if self._disk_used is not None: self._disk_used += len(data)
+            over = self._disk_used is None or self._disk_used > self.disk_bytes
+        if over: self.evict_disk()
+
+    def _disk_entries(self):
+        for sub in os.scandir(self.root):
+            if not sub.is_dir(): continue
+            for entry in os.scandir(sub.path):
+                if not entry.name.endswith('.png'): continue
+                try: stat = entry.stat()
+                except OSError: continue
+                yield stat.st_mtime_ns, stat.st_size, entry.path
+
+    def evict_disk(self):
+        """Delete least recently used tiles until the disk store is under 90% of its budget; returns the bytes freed."""
+        if not self._evicting.acquire(blocking=False): return 0
+        try:
+            entries = sorted(self._disk_entries())
+            total = sum(size for _, size, _ in entries); freed = 0
+            if total > self.disk_bytes:
+                for _, size, path in entries:
+                    if total - freed <= self.disk_bytes * 0.9: break
+                    try: os.remove(path)
+                    except OSError: continue
+                    freed += size; self.disk_evictions += 1
+            with self._lock: self._disk_used = total - freed
+            return freed
+        finally:
+            self._evicting.release()
+
+    def metatile(self, group, render):
+        """The ``(image, mode)`` block for ``group``, rendered by ``render()`` once; callers arriving mid-render wait for it (or its error)."""
+        with self._lock:
+            block = self._metatiles.get(group)
+            if block is not None:
+                self._metatiles.move_to_end(group); self.metatile_hits += 1
+                return block
+            pending = self._inflight.get(group); leader = pending is None
+            if leader: pending = self._inflight[group] = _InFlight(); self.renders += 1
+            else: self.coalesced += 1
+        if not leader:
+            pending.event.wait()
+            if pending.error is not None: raise pending.error
+            return pending.value
+        try:
+            pending.value = block = render()
+            with self._lock:
+                if block[0].nbytes <= self.metatile_bytes:
+                    self._metatiles[group] = block; self._metatiles_held += block[0].nbytes
+                    while self._metatiles_held > self.metatile_bytes: self._metatiles_held -= self._metatiles.popitem(last=False)[1][0].nbytes
+            return block
+        except Exception as e:
+            pending.error = e
+            raise
+        finally:
+            with self._lock: self._inflight.pop(group, None)
+            pending.event.set()
+
+    def _remember(self, key, data):
+        if len(data) > self.max_bytes: return
+        with self._lock:
+            previous = self._memory.pop(key, None)
+            if previous is not None: self._memory_bytes -= len(previous)
+            self._memory[key] = data; self._memory_bytes += len(data)
+            while self._memory_bytes > self.max_bytes:
+                self._memory_bytes -= len(self._memory.popitem(last=False)[1])
+
+    def _disk_path(self, key):
+        return os.path.join(self.root, key[:2], f"{key}.png")
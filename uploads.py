@@ -0,0 +1,106 @@
+# uploads.py
+
+import fcntl
+import json
+import os
+import shutil
+import tempfile
+import uuid
+
+from werkzeug.utils import secure_filename
+
+MANIFEST = '.upload.json'
+PART_SUFFIX = '.part'
+COPY_CHUNK = 1024 * 1024
+
+
+class UploadError(Exception):
+    def __init__(self, message, status_code=400, received=None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.received = received
+
+
+class ChunkedUploads:
+    """Resumable multi-file uploads written straight to disk, one ``<name>.part`` file per declared file.
+
+    All state lives in the upload directory (a manifest plus the part files, whose sizes are the
+    received offsets), so any gunicorn worker can take the next chunk and an interrupted client
+    asks for the status and continues from there. A chunk must start exactly at the received offset.
+    """
+
+    def __init__(self, root, extensions, max_file_bytes, max_chunk_bytes):
+        self.root = root
+        self.extensions = tuple(extensions)
+        self.max_file_bytes = max_file_bytes
+        self.max_chunk_bytes = max_chunk_bytes
+        os.makedirs(root, exist_ok=True)
+
+    def _dir(self, upload_id):
+        try: upload_id = str(uuid.UUID(upload_id))
+        except (TypeError, ValueError): raise UploadError("Unknown upload.", 404)
+        return os.path.join(self.root, upload_id)
+
+    def _manifest(self, upload_id):
+        try:
+            with open(os.path.join(self._dir(upload_id), MANIFEST), 'r') as f: return json.load(f)
+        except (OSError, ValueError):
+            raise UploadError("Unknown or already completed upload.", 404)
+
+    def create(self, files):
+        declared = {}
+        for entry in files or []:
+            name, size = secure_filename(str(entry.get('name', ''))), entry.get('size')
+            if not name or not name.lower().endswith(self.extensions): raise UploadError(f"Unsupported file type: {entry.get('name')}")
+            if not isinstance(size, int) or size < 0 or size > self.max_file_bytes: raise UploadError(f"Invalid or too large file size for {name}.")
+            declared[name] = size
+        if not declared: raise UploadError("No files declared.")
+        upload_id = str(uuid.uuid4())
+        upload_dir = self._dir(upload_id); os.makedirs(upload_dir)
+        for name in declared: open(os.path.join(upload_dir, name + PART_SUFFIX), 'wb').close()
+        fd, tmp_path = tempfile.mkstemp(dir=upload_dir, suffix='.tmp')
+        with os.fdopen(fd, 'w') as f: json.dump({'files': declared}, f)
+        os.replace(tmp_path, os.path.join(upload_dir, MANIFEST))
+        return self.status(upload_id)
+
+    def status(self, upload_id):
+        declared = self._manifest(upload_id)['files']
+        upload_dir = self._dir(upload_id)
+        received = {name: os.path.getsize(os.path.join(upload_dir, name + PART_SUFFIX)) for name in declared}
+        # A list, in the order the files were declared, so clients can pair the sanitised names with their own files.
+        return {'upload_id': upload_id, 'files': [{'name': name, 'size': size, 'received': received[name]} for name, size in declared.items()]}
+
+    def write_chunk(self, upload_id, name, offset, stream):
+        declared = self._manifest(upload_id)['files']
+        if name not in declared: raise UploadError(f"File {name} is not part of this upload.", 404)
+        part_path = os.path.join(self._dir(upload_id), name + PART_SUFFIX)
+        with open(part_path, 'r+b') as f:
+            # The lock serialises retried/duplicated chunks of the same file across workers.
+            fcntl.flock(f, fcntl.LOCK_EX)
+            received = os.fstat(f.fileno()).st_size
+            if offset != received: raise UploadError("Chunk offset does not match the received size.", 409, received)
+            f.seek(offset)
+            written = 0
+            while True:
+                block = stream.read(COPY_CHUNK)
+                if not block: break
+                written += len(block)
+                if written > self.max_chunk_bytes or offset + written > declared[name]:
+                    f.truncate(offset); raise UploadError("Chunk is larger than allowed or than the declared file size.", 413, offset)
+                f.write(block)
+            f.flush()
+            return offset + written
+
+    def complete(self, upload_id):
+        """Verify every file arrived in full and publish the files under their own names; returns the upload directory."""
+        status = self.status(upload_id)
+        missing = [entry['name'] for entry in status['files'] if entry['received'] != entry['size']]
+        if missing: raise UploadError(f"Upload incomplete: {', '.join(missing)}", 409)
+        upload_dir = self._dir(upload_id)
+        for entry in status['files']: os.replace(os.path.join(upload_dir, entry['name'] + PART_SUFFIX), os.path.join(upload_dir, entry['name']))
+        os.remove(os.path.join(upload_dir, MANIFEST))
+        return upload_dir
+
+    def abort(self, upload_id):
+        self._manifest(upload_id)
+        shutil.rmtree(self._dir(upload_id), ignore_errors=True)
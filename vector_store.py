@@ -0,0 +1,145 @@
+# vector_store.py
+
+import hashlib
+import importlib.util
+import json
+import os
+import threading
+from collections import OrderedDict
+
+from subsystems import REGISTRY
+
+# geopandas/pandas load on the first layer read rather than at worker boot.
+gpd = REGISTRY.lazy('geopandas')
+pd = REGISTRY.lazy('pandas')
+
+if importlib.util.find_spec('pyarrow'):  # GeoParquet backend
+    STORE_FORMAT, STORE_EXTENSION = 'parquet', '.parquet'
+else:
+    STORE_FORMAT, STORE_EXTENSION = 'FlatGeobuf', '.fgb'
+
+VECTOR_EXTENSIONS = ('.shp', '.zip')
+HEIGHT_FIELDS = ["height", "Height", "HEIGHT", "relh", "building_h", "LOD"]
+SHAPEFILE_SIDECARS = ('.shp', '.dbf', '.shx', '.prj', '.cpg')
+
+
+class _StoredLayer:
+    __slots__ = ('fingerprint', 'gdf', 'meta', 'geojson')
+
+    def __init__(self, fingerprint, gdf, meta):
+        self.fingerprint = fingerprint
+        self.gdf = gdf
+        self.meta = meta
+        self.geojson = None
+
+
+class VectorLayerStore:
+    """Ingests each shapefile/zip once into an EPSG:4326 columnar copy under ``cache_dir``.
+
+    Repeat loads come from memory, or from the GeoParquet/FlatGeobuf copy after a restart,
+    so only a changed source file pays for shapefile parsing and reprojection again.
+    """
+
+    def __init__(self, source_dir, cache_dir, max_memory_layers=8):
+        self.source_dir = source_dir
+        self.cache_dir = cache_dir
+        self.max_memory_layers = max_memory_layers
+        self._paths = None
+        self._layers = OrderedDict()
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    # --- Source discovery ---
+    def _scan(self):
+        paths = {}
+        for root, _, files in os.walk(self.source_dir):
+            for fname in sorted(files):
+                if fname.lower().endswith(VECTOR_EXTENSIONS): paths.setdefault(fname, os.path.join(root, fname))
+        self._paths = paths
+        return paths
+
+    def list_files(self):
+        return sorted(self._scan().values())
+
+    def find(self, layer_filename):
+        paths = self._paths if self._paths is not None else self._scan()
+        path = paths.get(layer_filename)
+        if path is None or not os.path.exists(path): path = self._scan().get(layer_filename)
+        return path
+
+    def find_matching(self, term, extensions=VECTOR_EXTENSIONS):
+        paths = self._paths if self._paths is not None else self._scan()
+        for fname, path in sorted(paths.items()):
+            if term in fname and fname.lower().endswith(extensions) and os.path.exists(path): return path
+        return None
+
+    # --- Loading ---
+    def load(self, path):
+        return self._get(path).gdf
+
+    def info(self, path):
+        return self._get(path).meta
+
+    def geojson(self, path):
+        layer = self._get(path)
+        if layer.geojson is None: layer.geojson = layer.gdf.to_json().encode('utf-8')
+        return layer.geojson
+
+    def _get(self, path):
+        fingerprint = self._fingerprint(path)
+        with self._lock:
+            layer = self._layers.get(path)
+            if layer is not None and layer.fingerprint == fingerprint:
+                self._layers.move_to_end(path)
+                return layer
+            layer = self._read_stored(path, fingerprint) or self._ingest(path, fingerprint)
+            self._layers[path] = layer
+            while len(self._layers) > self.max_memory_layers: self._layers.popitem(last=False)
+            return layer
+
+    @staticmethod
+    def _fingerprint(path):
+        if path.lower().endswith('.shp'):
+            stem = os.path.splitext(path)[0]
+            stats = [os.stat(stem + ext) for ext in SHAPEFILE_SIDECARS if os.path.exists(stem + ext)]
+        else:
+            stats = [os.stat(path)]
+        return [max(s.st_mtime_ns for s in stats), sum(s.st_size for s in stats)]
+
+    def _stored_paths(self, path):
+        digest = hashlib.sha1(os.path.abspath(path).encode('utf-8')).hexdigest()[:8]
+        base = os.path.join(self.cache_dir, f"{os.path.splitext(os.path.basename(path))[0]}_{digest}")
+        return base + STORE_EXTENSION, base + '.json'
+
+    def _read_stored(self, path, fingerprint):
+        data_path, meta_path = self._stored_paths(path)
+        try:
+            with open(meta_path, 'r') as f: meta = json.load(f)
+            if meta.get('fingerprint') != fingerprint or meta.get('format') != STORE_FORMAT: return None
+            gdf = gpd.read_parquet(data_path) if STORE_FORMAT == 'parquet' else gpd.read_file(data_path)
+            return _StoredLayer(fingerprint, gdf, meta)
+        except Exception:
+            return None
+
+    def _ingest(self, path, fingerprint):
+        print(f"Ingesting vector layer {os.path.basename(path)} into the layer store...")
+        gdf = gpd.read_file(f"zip://{path}" if path.lower().endswith('.zip') else path)
+        for col in gdf.select_dtypes(include=['object']).columns: gdf[col] = gdf[col].fillna("")
+        if 'builtup' in os.path.basename(path).lower():
+            h_field = next((f for f in HEIGHT_FIELDS if f in gdf.columns), None)
+            if h_field: gdf[h_field] = pd.to_numeric(gdf[h_field], errors='coerce').fillna(10.0)
+        if gdf.crs is not None: gdf = gdf.to_crs(epsg=4326)
+        meta = {
+            "source": os.path.abspath(path), "fingerprint": fingerprint, "format": STORE_FORMAT,
+            "feature_count": int(len(gdf)), "bounds": [float(v) for v in gdf.total_bounds] if len(gdf) else None,
+        }
+        data_path, meta_path = self._stored_paths(path)
+        try:
+            tmp_path = f"{data_path}.{os.getpid()}.tmp"
+            if STORE_FORMAT == 'parquet': gdf.to_parquet(tmp_path)
+            else: gdf.to_file(tmp_path, driver='FlatGeobuf')
+            os.replace(tmp_path, data_path)
+            with open(meta_path, 'w') as f: json.dump(meta, f)
+        except Exception as e:
+            print(f"WARNING: Could not persist vector layer {path}: {e}")
+        return _StoredLayer(fingerprint, gdf, meta)
@@ -0,0 +1,93 @@
+# vector_tiles.py
+
+import math
+import os
+import threading
+from collections import OrderedDict
+
+import mercantile
+import numpy as np
+import shapely
+from mapbox_vector_tile import encode as mvt_encode
+
+MVT_EXTENT = 4096
+MVT_BUFFER = 64
+# Same candidates the viewer uses to pick a classification field in layer-handlers.js.
+CLASS_FIELDS = ["Name", "name", "LULC", "Layer", "layer", "TYPE", "type", "CLASS", "class", "CATEGORY", "category", "VILGNAME1"]
+
+
+def _mvt_value(value):
+    if value is None: return None
+    if isinstance(value, np.generic): value = value.item()
+    if isinstance(value, float) and not math.isfinite(value): return None
+    if isinstance(value, (bool, int, float, str)): return value
+    return str(value)
+
+
+class VectorTileIndex:
+    """STRtree over one layer's Web Mercator geometries, encoding clipped and simplified MVT tiles on demand."""
+
+    def __init__(self, gdf, layer_name, max_features=5000):
+        gdf = gdf[gdf.geometry.notna() & ~gdf.geometry.is_empty]
+        self.layer_name = layer_name
+        self.max_features = max_features
+        self.bounds = [float(v) for v in gdf.total_bounds] if len(gdf) else None
+        self.geometry_type = gdf.geometry.iloc[0].geom_type if len(gdf) else None
+        self.fields = [c for c in gdf.columns if c != gdf.geometry.name]
+        self.properties = [{k: v for k, v in ((k, _mvt_value(v)) for k, v in row.items()) if v is not None} for row in gdf[self.fields].to_dict('records')]
+        self.geometries = np.asarray(gdf.geometry.to_crs(epsg=3857).values, dtype=object)
+        # Used to keep the most visible features when a tile would exceed max_features.
+        self.weights = np.maximum(shapely.area(self.geometries), shapely.length(self.geometries))
+        self.tree = shapely.STRtree(self.geometries)
+
+    def tile(self, z, x, y):
+        left, bottom, right, top = mercantile.xy_bounds(x, y, z)
+        pixel = (right - left) / MVT_EXTENT; pad = pixel * MVT_BUFFER
+        idx = self.tree.query(shapely.box(left - pad, bottom - pad, right + pad, top + pad))
+        if idx.size:
+            # Sub-pixel features would quantize to nothing, so drop them before doing any geometry work.
+            idx = idx[self.weights[idx] >= pixel * pixel] if 'Polygon' in (self.geometry_type or '') else idx
+            if idx.size > self.max_features: idx = idx[np.argsort(self.weights[idx])[::-1][:self.max_features]]
+        geoms = shapely.simplify(self.geometries[idx], pixel, preserve_topology=True)
+        geoms = shapely.clip_by_rect(geoms, left - pad, bottom - pad, right + pad, top + pad)
+        # Quantize to the tile grid in one vectorized pass; snapping to integer coords also drops collapsed slivers.
+        scale = np.array([MVT_EXTENT / (right - left), MVT_EXTENT / (top - bottom)])
+        geoms = shapely.set_precision(shapely.transform(geoms, lambda c: (c - (left, bottom)) * scale), 1.0)
+        features = [{"geometry": g, "properties": self.properties[i]} for i, g in zip(idx, geoms) if not g.is_empty]
+        return mvt_encode([{"name": self.layer_name, "features": features}], default_options={"extents": MVT_EXTENT})
+
+    def metadata(self, sample_limit=500):
+        samples = self.properties[:1]; seen = set()
+        for field in CLASS_FIELDS:
+            if field not in self.fields: continue
+            for props in self.properties:
+                value = props.get(field)
+                if value in (None, "") or (field, value) in seen: continue
+                seen.add((field, value)); samples.append(props)
+                if len(samples) >= sample_limit: break
+        return {
+            "layer": self.layer_name, "feature_count": len(self.properties), "geometry_type": self.geometry_type, "bounds": self.bounds,
+            "fields": self.fields, "sample_properties": samples,
+        }
+
+
+class VectorTileIndexCache:
+    """Small LRU of built indexes, rebuilt when the layer file changes on disk."""
+
+    def __init__(self, loader, max_layers=8):
+        self.loader = loader
+        self.max_layers = max_layers
+        self._indexes = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, path, layer_name):
+        mtime = os.stat(path).st_mtime_ns
+        with self._lock:
+            cached = self._indexes.get(path)
+            if cached and cached[0] == mtime:
+                self._indexes.move_to_end(path)
+                return cached[1]
+            index = VectorTileIndex(self.loader(path), layer_name)
+            self._indexes[path] = (mtime, index)
+            while len(self._indexes) > self.max_layers: self._indexes.popitem(last=False)
+            return index